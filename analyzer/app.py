@@ -2,7 +2,6 @@
 from typing import Dict, Any
 import asyncio
 import logging
-import json
 import time
 import threading
 from datetime import datetime
@@ -10,6 +9,11 @@ import queue
 from .core.config import Config
 from .core.analysis_engine import AnalysisEngine
 from .core.event_publisher import EventPublisher
+from .core.api_server import create_api_app
+from .core.camera_assignment import CameraAssignment, Workload, COMMAND_TOPIC, STREAMS_KEY, RECORDINGS_KEY
+from .services.backtest_service import BacktestService
+from .services.recording_service import RecordingService
+from .services.wire_format import decode
 from kafka import KafkaConsumer
 
 
@@ -18,16 +22,45 @@ class AnalysisService:
     
     def __init__(self, config: Config = None):
         self.config = config or Config()
-        self.analysis_engine = AnalysisEngine(self.config)
         self.event_publisher = EventPublisher(self.config)
+        self.analysis_engine = AnalysisEngine(self.config, self.event_publisher)
+        # Backtests need the database; in stream mode the rule service serves them
+        self.backtest_service = None
+        if self.analysis_engine.rule_engine_service is not None:
+            self.backtest_service = BacktestService(
+                self.config.get_db_connection_params(),
+                self.analysis_engine.track_store_service,
+                schedule_timezone=self.config.schedule_timezone
+            )
         
+        # Recording only copies packets, so it runs beside analysis on every node
+        self.recording_service = RecordingService(
+            self.analysis_engine.storage_service,
+            self.event_publisher.publish_message,
+            directory=self.config.recording_dir,
+            segment_seconds=self.config.recording_segment_seconds,
+            upload_workers=self.config.recording_upload_workers
+        )
+        
+        # Nodes share the command topic as one group: commands are keyed by
+        # camera, so each node owns the cameras of its partitions
+        self.active_streams = {}
         self.kafka_consumer = KafkaConsumer(
-            'insightcore-video-commands',
             bootstrap_servers=self.config.get_kafka_config()['bootstrap_servers'],
-            value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+            group_id=self.config.command_group,
+            value_deserializer=decode
+        )
+        self.camera_assignment = CameraAssignment(
+            self.kafka_consumer,
+            self.event_publisher.redis_client,
+            {
+                'streams': Workload(STREAMS_KEY, self.start_stream, self.stop_stream, lambda: list(self.active_streams)),
+                'recordings': Workload(RECORDINGS_KEY, self.recording_service.start, self.recording_service.stop,
+                                       self.recording_service.running)
+            }
         )
+        self.kafka_consumer.subscribe([COMMAND_TOPIC], listener=self.camera_assignment)
         
-        self.active_streams = {}
         self.processing_queue = queue.Queue()
         
         logging.basicConfig(
@@ -47,11 +80,16 @@ class AnalysisService:
         command_thread.daemon = True
         command_thread.start()
         
-        # Start processing queue
+        # Files and replays are processed one at a time; each stream has its own thread
         processing_thread = threading.Thread(target=self._process_queue)
         processing_thread.daemon = True
         processing_thread.start()
         
+        # Start HTTP API for rule backtests
+        api_thread = threading.Thread(target=self._serve_api)
+        api_thread.daemon = True
+        api_thread.start()
+        
         # Keep main thread alive
         try:
             while True:
@@ -67,32 +105,69 @@ class AnalysisService:
             self.logger.info(f"Received command: {command}")
             
             if command['type'] == 'start_stream':
-                self.start_stream(command['camera_id'], command['stream_url'])
+                # The main stream is recorded; detection may run on a low-resolution substream
+                self.camera_assignment.register('streams', command['camera_id'], command['stream_url'],
+                                                analysis_url=command.get('analysis_url'))
+                self.start_stream(command['camera_id'], command['stream_url'], command.get('analysis_url'))
             elif command['type'] == 'stop_stream':
+                self.camera_assignment.unregister('streams', command['camera_id'])
                 self.stop_stream(command['camera_id'])
+            elif command['type'] == 'start_recording':
+                self.camera_assignment.register('recordings', command['camera_id'], command['stream_url'])
+                self.recording_service.start(command['camera_id'], command['stream_url'])
+            elif command['type'] == 'stop_recording':
+                self.camera_assignment.unregister('recordings', command['camera_id'])
+                self.recording_service.stop(command['camera_id'])
             elif command['type'] == 'process_file':
-                self.process_file(command['camera_id'], command['file_path'], command['start_time'])
+                self.process_file(
+                    command['camera_id'], command['file_path'], command['start_time'],
+                    command.get('video_file_id')
+                )
+            elif command['type'] == 'replay_file':
+                self.replay_file(command['camera_id'], command['video_file_id'], command.get('model_version'))
+    
+    def _serve_api(self):
+        """Serve the analyzer HTTP API; requests run on threads of their own"""
+        rule_engine_service = self.analysis_engine.rule_engine_service
+        app = create_api_app(self.backtest_service, rule_engine_service.rule_metrics if rule_engine_service else None)
+        app.run(host=self.config.api_host, port=self.config.api_port, threaded=True)
     
     def _process_queue(self):
-        """Process items from the queue"""
+        """Process video files and replays from the queue"""
         while True:
             try:
                 item = self.processing_queue.get(timeout=1)
-                if item['type'] == 'stream':
-                    self.analysis_engine.process_video_stream(item['camera_id'], item['stream_url'])
-                elif item['type'] == 'file':
-                    from datetime import datetime
+                if item['type'] == 'file':
                     self.analysis_engine.process_video_file(
                         item['camera_id'], 
                         item['file_path'], 
-                        datetime.fromisoformat(item['start_time'])
+                        datetime.fromisoformat(item['start_time']),
+                        item.get('video_file_id')
+                    )
+                elif item['type'] == 'replay':
+                    self.analysis_engine.replay_video_file(
+                        item['camera_id'],
+                        item['video_file_id'],
+                        item.get('model_version')
                     )
                 self.processing_queue.task_done()
             except queue.Empty:
                 continue
     
-    def start_stream(self, camera_id: str, stream_url: str):
-        """Start processing video stream"""
+    def _run_stream(self, stream_task: Dict[str, Any]):
+        """Process one camera's stream until it ends or is stopped"""
+        camera_id = stream_task['camera_id']
+        try:
+            self.analysis_engine.process_video_stream(
+                camera_id, stream_task['stream_url'],
+                is_active=lambda: self.active_streams.get(camera_id) is stream_task,
+                analysis_url=stream_task.get('analysis_url')
+            )
+        except Exception as e:
+            self.logger.error(f"Stream processing for camera {camera_id} failed: {e}")
+    
+    def start_stream(self, camera_id: str, stream_url: str, analysis_url: str = None):
+        """Start processing video stream, decoding ``analysis_url`` instead when given"""
         if camera_id in self.active_streams:
             self.logger.warning(f"Stream for camera {camera_id} already active")
             return
@@ -100,10 +175,14 @@ class AnalysisService:
         stream_task = {
             'type': 'stream',
             'camera_id': camera_id,
-            'stream_url': stream_url
+            'stream_url': stream_url,
+            'analysis_url': analysis_url
         }
-        self.processing_queue.put(stream_task)
         self.active_streams[camera_id] = stream_task
+        # A live stream never ends on its own, so it cannot wait in the processing queue
+        stream_thread = threading.Thread(target=self._run_stream, args=(stream_task,), name=f"stream-{camera_id}")
+        stream_thread.daemon = True
+        stream_thread.start()
         
         # Cache camera status
         self.event_publisher.cache_camera_status(camera_id, 'active')
@@ -120,22 +199,40 @@ class AnalysisService:
             
             self.logger.info(f"Stopped stream for camera {camera_id}")
     
-    def process_file(self, camera_id: str, file_path: str, start_time: str):
+    def process_file(self, camera_id: str, file_path: str, start_time: str, video_file_id: str = None):
         """Process video file"""
         file_task = {
             'type': 'file',
             'camera_id': camera_id,
             'file_path': file_path,
-            'start_time': start_time
+            'start_time': start_time,
+            'video_file_id': video_file_id
         }
         self.processing_queue.put(file_task)
         
         self.logger.info(f"Started file processing for camera {camera_id}")
     
+    def replay_file(self, camera_id: str, video_file_id: str, model_version: str = None):
+        """Re-run rules over the stored tracks of a processed video file"""
+        replay_task = {
+            'type': 'replay',
+            'camera_id': camera_id,
+            'video_file_id': video_file_id,
+            'model_version': model_version
+        }
+        self.processing_queue.put(replay_task)
+        
+        self.logger.info(f"Queued rules-only replay of video file {video_file_id} for camera {camera_id}")
+    
     def stop(self):
         """Stop the analysis service"""
         for camera_id in list(self.active_streams.keys()):
             self.stop_stream(camera_id)
+        self.recording_service.close()
+        self.analysis_engine.storage_service.close()
+        # Unsent events stay in the spool and go out on the next start
+        self.event_publisher.flush(timeout=self.config.spool_send_timeout)
+        self.event_publisher.close()
 
 
 def main():
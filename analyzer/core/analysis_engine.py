@@ -1,22 +1,34 @@
 # core/analysis_engine.py
-from typing import List, Dict, Any, Tuple
-from datetime import datetime
+from typing import List, Dict, Any, Tuple, Optional, Callable
+from datetime import datetime, timedelta
 import numpy as np
 import cv2
+import av
 from kafka import KafkaProducer
 import redis
-import json
+import threading
+import time
+import uuid
 from .config import Config
-from ..services.detection_service import DetectionService, Detection
+from ..services.detection_service import DetectionService, Detection, scale_detections
 from ..services.tracking_service import TrackingService, Track
-from ..services.rule_engine_service import RuleEngineService
 from ..services.storage_service import StorageService
+from ..services.track_store_service import TrackStoreService, TrackRecorder
+from ..services.trajectory_rule_service import Trajectories
+from ..services.static_object_service import StaticObjectService, StaticObject
+from ..services.track_state_service import TrackStatePublisher
+from ..services.checkpoint_service import TrackIdAllocator, CheckpointService
+from ..services.packet_service import PacketSource, probe_frame_shape
+from ..services.clip_service import ClipService
+from ..services.wire_format import serializer
+from .rule_service import create_rule_engine_service
+from .event_publisher import EventPublisher, REPLAY_EVENT_NAMESPACE
 
 
 class AnalysisEngine:
     """Main analysis engine that coordinates detection, tracking, and rule evaluation"""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, event_publisher: Optional[EventPublisher] = None):
         self.config = config
         
         # Initialize services
@@ -25,85 +37,298 @@ class AnalysisEngine:
             confidence_threshold=config.confidence_threshold,
             iou_threshold=config.iou_threshold
         )
-        self.tracking_service = TrackingService()
-        self.rule_engine_service = RuleEngineService(
-            db_connection_params=config.get_db_connection_params()
-        )
+        # In stream mode rules run in the rule service and this worker holds no database connection
+        self.stream_rules = config.rule_evaluation == 'stream'
+        self.rule_engine_service = None if self.stream_rules else create_rule_engine_service(config)
+        # Streams run in threads of their own and share the rule engine's connection and state
+        self._rules_lock = threading.RLock()
+        self._last_occupancy_flush = time.monotonic()
         self.storage_service = StorageService(**config.get_minio_config())
+        self.track_store_service = TrackStoreService(self.storage_service, config.model_version)
+        self.static_object_service = StaticObjectService(
+            width=config.static_model_width,
+            update_interval=config.static_update_interval
+        )
+        # Files and replays run on the queue thread beside live streams of the same
+        # cameras, so they get a rule engine and background models of their own
+        self.file_rule_engine_service = None if self.stream_rules else create_rule_engine_service(config)
+        self.file_static_object_service = StaticObjectService(
+            width=config.static_model_width,
+            update_interval=config.static_update_interval
+        )
         
-        # Initialize Kafka producer
+        # Events go through the publisher's disk spool; track states straight to Kafka
+        self.event_publisher = event_publisher or EventPublisher(config)
         self.kafka_producer = KafkaProducer(
             bootstrap_servers=config.get_kafka_config()['bootstrap_servers'],
-            value_serializer=lambda x: json.dumps(x).encode('utf-8')
+            value_serializer=serializer(config.wire_format)
         )
+        self.track_state_publisher = None
+        if self.stream_rules:
+            self.track_state_publisher = TrackStatePublisher(self.kafka_producer, config.track_state_topic)
+        
+        # Clips need the events, so only workers that evaluate rules cut them
+        self.clip_service = None
+        if config.event_clips and not self.stream_rules:
+            self.clip_service = ClipService(
+                self.storage_service,
+                self.event_publisher.publish_message,
+                pre_seconds=config.clip_pre_seconds,
+                post_seconds=config.clip_post_seconds,
+                max_uploads=config.clip_max_uploads,
+                upload_attempts=config.clip_upload_attempts
+            )
         
         # Initialize Redis client
         self.redis_client = redis.Redis(**config.get_redis_config())
+        
+        # One tracker per camera; track ids are unique across all workers and
+        # stream trackers are checkpointed so another worker can take over
+        self.trackers: Dict[str, TrackingService] = {}
+        self.track_id_allocator = TrackIdAllocator(self.redis_client, block_size=config.track_id_block_size)
+        self.checkpoint_service = CheckpointService(
+            self.redis_client,
+            interval=config.checkpoint_interval,
+            ttl=config.checkpoint_ttl
+        )
     
-    def process_frame(self, frame: np.ndarray, camera_id: str, frame_time: datetime) -> List[Dict]:
-        """Process a single frame and return detected events"""
+    def process_frame(self, frame: np.ndarray, camera_id: str, frame_time: datetime,
+                      recorder: Optional[TrackRecorder] = None, frame_index: int = 0,
+                      evaluate_rules: bool = True, frame_shape: Optional[Tuple[int, int]] = None,
+                      tracker: Optional[TrackingService] = None, offline: bool = False) -> List[Dict]:
+        """Process a single frame and return detected events
+        
+        ``frame_shape`` is the (height, width) of the camera's main stream when
+        the frame comes from its analysis substream: detections are scaled up
+        to it, so tracks, rules and events use the same pixels as zones and
+        recordings. ``tracker`` defaults to the camera's live tracker.
+        ``offline`` frames (of a video file) go through the file rule engine
+        and background models, leaving the camera's live state alone.
+        """
         # Run object detection
         detections = self.detection_service.detect_objects(frame)
+        if frame_shape is not None and tuple(frame_shape) != frame.shape[:2]:
+            detections = scale_detections(detections, frame.shape[:2], frame_shape)
+        else:
+            frame_shape = frame.shape[:2]
         
         # Update object tracking
-        tracks = self.tracking_service.track_objects(detections, frame.shape)
+        if tracker is None:
+            tracker = self.trackers.get(camera_id) or self._start_tracker(camera_id)
+        tracks = tracker.track_objects(detections, frame_shape, frame_time)
         
+        # Keep tracks for rules-only re-runs of this file
+        if recorder is not None:
+            recorder.add_frame(frame_index, frame_time, tracks)
+        
+        # The background model only runs for cameras with left-behind rules
+        static_objects = None
+        static_object_service = self.file_static_object_service if offline else self.static_object_service
+        if offline:
+            needs_static_objects = self._needs_static_objects(camera_id, self.file_rule_engine_service)
+        else:
+            with self._rules_lock:
+                needs_static_objects = self._needs_static_objects(camera_id, self.rule_engine_service)
+        if needs_static_objects:
+            # Tracks gone for longer cannot own a new object, and the tracker keeps every track it saw
+            recent_tracks = tracker.get_recent_tracks(
+                frame_time - timedelta(seconds=static_object_service.track_horizon)
+            )
+            static_objects = static_object_service.update(camera_id, frame, frame_time, recent_tracks, frame_shape)
+        
+        # Rules run in the rule service, fed by the track-state stream
+        if self.track_state_publisher is not None:
+            self.track_state_publisher.publish(camera_id, frame_time, tracks, static_objects)
+            return []
+        
+        if offline:
+            return self._evaluate_file_rules(tracker, tracks, camera_id, frame_time, evaluate_rules, static_objects)
+        with self._rules_lock:
+            return self._evaluate_rules(tracker, tracks, camera_id, frame_time, static_objects)
+    
+    def _evaluate_file_rules(self, tracker: TrackingService, tracks: List[Track], camera_id: str,
+                             frame_time: datetime, evaluate_rules: bool,
+                             static_objects: Optional[List[StaticObject]]) -> List[Dict]:
+        """Rule part of process_frame() for a video file, on the file rule engine
+        
+        Rules are passed explicitly, so the live circuit breaker and
+        activation calendars never see the file's historical frame times.
+        """
+        rules = self.file_rule_engine_service.get_rules(camera_id)
+        # Rules for offline files are evaluated over whole trajectories instead,
+        # except left-behind rules, which need the pixels
+        if not evaluate_rules:
+            if static_objects is None:
+                return []
+            rules = [rule for rule in rules if rule['rule_type'] == 'object_left_behind']
+        return self.file_rule_engine_service.check_rules(
+            tracks, camera_id, frame_time, rules,
+            history=tracker.history, static_objects=static_objects
+        )
+    
+    def _evaluate_rules(self, tracker: TrackingService, tracks: List[Track], camera_id: str,
+                        frame_time: datetime, static_objects: Optional[List[StaticObject]]) -> List[Dict]:
+        """Rule part of process_frame() for a live stream; called with the rules lock held"""
         # Check rules and generate events
-        events = self.rule_engine_service.check_rules(tracks, camera_id, frame_time)
+        events = self.rule_engine_service.check_rules(
+            tracks, camera_id, frame_time,
+            history=tracker.history, static_objects=static_objects
+        )
+        
+        # Write zone occupancy buckets in batches rather than per frame
+        now = time.monotonic()
+        if now - self._last_occupancy_flush >= self.config.occupancy_flush_interval:
+            self.rule_engine_service.flush_occupancy()
+            self._last_occupancy_flush = now
         
         return events
     
-    def process_video_stream(self, camera_id: str, stream_url: str):
-        """Process video stream from RTSP/HTTP source"""
+    def _start_tracker(self, camera_id: str, restore: bool = False) -> TrackingService:
+        """Fresh tracker for the camera, resumed from its checkpoint when ``restore`` is set"""
+        tracker = TrackingService(id_allocator=self.track_id_allocator)
+        if restore:
+            with self._rules_lock:
+                self.checkpoint_service.restore(camera_id, tracker, self.rule_engine_service)
+        self.trackers[camera_id] = tracker
+        return tracker
+    
+    def _needs_static_objects(self, camera_id: str, rule_engine_service) -> bool:
+        if self.stream_rules:
+            return self.config.stream_static_objects
+        return rule_engine_service.has_rule_type(camera_id, 'object_left_behind')
+    
+    def _finish_camera(self, camera_id: str, offline: bool = False):
+        """Write the last occupancy buckets, or tell the rule service the input ended"""
+        if self.track_state_publisher is not None:
+            self.track_state_publisher.end(camera_id)
+        elif offline:
+            self.file_rule_engine_service.flush_occupancy(camera_id, final=True)
+        else:
+            with self._rules_lock:
+                self.rule_engine_service.flush_occupancy(camera_id, final=True)
+    
+    def process_video_stream(self, camera_id: str, stream_url: str,
+                             is_active: Optional[Callable[[], bool]] = None,
+                             analysis_url: Optional[str] = None):
+        """Process video stream from RTSP/HTTP source until it ends or ``is_active`` turns false
+        
+        With ``analysis_url`` only that low-resolution substream is decoded;
+        the main stream is opened once to learn its resolution, which
+        detections are mapped to. The analysed stream is demuxed once:
+        packets are decoded for detection and kept compressed for event clips.
+        """
         print(f"Starting video stream processing for camera {camera_id}")
         
-        cap = cv2.VideoCapture(stream_url)
+        frame_shape = None
+        if analysis_url:
+            try:
+                frame_shape = probe_frame_shape(stream_url)
+                stream_url = analysis_url
+            except (av.error.FFmpegError, ValueError) as e:
+                # Events must be in main stream pixels, so decode the main stream itself
+                print(f"Failed to read main stream resolution of camera {camera_id}, analysing main stream: {e}")
+        
+        try:
+            source = PacketSource(stream_url)
+        except av.error.FFmpegError as e:
+            print(f"Failed to open stream of camera {camera_id}: {e}")
+            return
+        if self.clip_service is not None:
+            self.clip_service.open_camera(camera_id, source)
         frame_count = 0
+        # Pick up tracks and rule state where the previous worker of this camera left off
+        tracker = self._start_tracker(camera_id, restore=True)
+        frame_time = None
+        stopped = False
         
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    print(f"Failed to read frame from camera {camera_id}")
+            for packet, packet_time in source.packets():
+                # Stopped, or the camera moved to another node of the group
+                if stopped or (is_active is not None and not is_active()):
+                    print(f"Stream for camera {camera_id} is no longer assigned to this node")
                     break
                 
-                frame_count += 1
-                if frame_count % self.config.frame_skip != 0:
-                    continue
-                
-                frame_time = datetime.now()
-                
-                # Process frame
-                events = self.process_frame(frame, camera_id, frame_time)
+                frames = source.decode(packet)
+                if self.clip_service is not None:
+                    self.clip_service.add_packet(camera_id, packet, packet_time)
                 
-                # Send events to Kafka
-                for event in events:
-                    self.kafka_producer.send('insightcore-events', event)
-                    print(f"Event sent to Kafka: {event}")
-                
-                # Optional: Draw detections on frame for visualization
-                if self.config.draw_detections:
-                    detections = self.detection_service.detect_objects(frame)
-                    frame = self.detection_service.draw_detections(frame, detections)
+                for frame in frames:
+                    frame_count += 1
+                    if frame_count % self.config.frame_skip != 0:
+                        continue
+                    
+                    frame_time = datetime.now()
+                    
+                    # Process frame
+                    events = self.process_frame(frame, camera_id, frame_time, frame_shape=frame_shape, tracker=tracker)
+                    with self._rules_lock:
+                        self.checkpoint_service.maybe_save(camera_id, tracker, frame_time, self.rule_engine_service)
+                    if self.clip_service is not None:
+                        self.clip_service.attach(camera_id, frame_time, events)
+                    
+                    # Send events to Kafka
+                    for event in events:
+                        self.event_publisher.publish_event(event)
+                        print(f"Event spooled for Kafka: {event}")
                     
-                    # Display frame (optional)
-                    cv2.imshow(f'Camera {camera_id}', frame)
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        break
+                    # Optional: Draw detections on frame for visualization
+                    if self.config.draw_detections:
+                        detections = self.detection_service.detect_objects(frame)
+                        frame = self.detection_service.draw_detections(frame, detections)
+                        
+                        # Display frame (optional)
+                        cv2.imshow(f'Camera {camera_id}', frame)
+                        if cv2.waitKey(1) & 0xFF == ord('q'):
+                            stopped = True
+            else:
+                print(f"Stream of camera {camera_id} ended")
         
+        except av.error.FFmpegError as e:
+            print(f"Failed to read frame from camera {camera_id}: {e}")
         except KeyboardInterrupt:
             print(f"Stopping video stream processing for camera {camera_id}")
         finally:
-            cap.release()
+            if self.clip_service is not None:
+                self.clip_service.close_camera(camera_id, source)
+            source.close()
             cv2.destroyAllWindows()
+            # A stream restarted for the camera while this one was winding down owns
+            # the camera's tracker, checkpoint and occupancy from now on
+            with self._rules_lock:
+                owner = self.trackers.get(camera_id) is tracker
+                if owner:
+                    if frame_time is not None:
+                        self.checkpoint_service.save(camera_id, tracker, frame_time, self.rule_engine_service)
+                    self.trackers.pop(camera_id, None)
+            if owner:
+                self._finish_camera(camera_id)
     
-    def process_video_file(self, camera_id: str, file_path: str, start_time: datetime):
-        """Process video file"""
+    def process_video_file(self, camera_id: str, file_path: str, start_time: datetime,
+                           video_file_id: Optional[str] = None):
+        """Process video file
+        
+        When ``video_file_id`` is given, per-frame tracks are stored in MinIO
+        so rules can later be re-evaluated with replay_video_file(). With
+        ``offline_file_rules`` enabled, rules run once over the complete
+        trajectories after tracking ends rather than on every frame.
+        """
         print(f"Starting video file processing: {file_path}")
         
         cap = cv2.VideoCapture(file_path)
         frame_count = 0
         fps = cap.get(cv2.CAP_PROP_FPS)
+        # A file's tracks, background and rule latches have nothing to do with the
+        # previous file's or with the camera's live stream
+        tracker = TrackingService(id_allocator=self.track_id_allocator)
+        self.file_static_object_service.reset(camera_id)
+        if self.file_rule_engine_service is not None:
+            self.file_rule_engine_service.reset_state()
+        
+        # Trajectory rules need the database, so stream mode sends every frame instead
+        offline_rules = self.config.offline_file_rules and not self.stream_rules
+        recorder = None
+        if video_file_id is not None or offline_rules:
+            recorder = TrackRecorder(camera_id, video_file_id, self.config.model_version, start_time, fps)
         
         try:
             while True:
@@ -116,16 +341,73 @@ class AnalysisEngine:
                     continue
                 
                 # Calculate actual timestamp for this frame
-                frame_time = start_time + datetime.timedelta(seconds=frame_count / fps)
+                frame_time = start_time + timedelta(seconds=frame_count / fps)
                 
                 # Process frame
-                events = self.process_frame(frame, camera_id, frame_time)
+                events = self.process_frame(
+                    frame, camera_id, frame_time, recorder, frame_count,
+                    evaluate_rules=not offline_rules, tracker=tracker, offline=True
+                )
                 
                 # Send events to Kafka
                 for event in events:
-                    self.kafka_producer.send('insightcore-events', event)
-                    print(f"Event sent to Kafka: {event}")
+                    self.event_publisher.publish_event(event)
+                    print(f"Event spooled for Kafka: {event}")
         
         finally:
             cap.release()
-            print(f"Finished processing video file: {file_path}")
\ No newline at end of file
+            print(f"Finished processing video file: {file_path}")
+        
+        self.file_static_object_service.reset(camera_id)
+        if recorder is None:
+            self._finish_camera(camera_id, offline=True)
+            return
+        
+        artifact = recorder.to_artifact()
+        if offline_rules:
+            trajectories = Trajectories.from_artifact(artifact)
+            events = self.file_rule_engine_service.check_trajectories(trajectories, camera_id)
+            self.file_rule_engine_service.record_trajectory_occupancy(trajectories, camera_id)
+            for event in events:
+                self.event_publisher.publish_event(event)
+            print(f"Offline rule evaluation for {file_path}: {len(events)} events")
+        self._finish_camera(camera_id, offline=True)
+        
+        if video_file_id is not None:
+            result = self.track_store_service.save(artifact)
+            print(f"Track artifact for video file {video_file_id}: {result['status']}")
+    
+    def replay_video_file(self, camera_id: str, video_file_id: str,
+                          model_version: Optional[str] = None,
+                          rules: Optional[List[Dict]] = None) -> List[Dict]:
+        """Re-evaluate rules over stored tracks of a processed file without decoding it"""
+        if self.file_rule_engine_service is None:
+            print(f"Rules run in the rule service; not replaying video file {video_file_id}")
+            return []
+        
+        artifact = self.track_store_service.load(video_file_id, model_version)
+        if artifact is None:
+            print(f"No track artifact for video file {video_file_id}")
+            return []
+        
+        if rules is None:
+            rules = self.file_rule_engine_service.get_rules(camera_id, force_reload=True)
+        events = self.file_rule_engine_service.check_trajectories(
+            Trajectories.from_artifact(artifact), camera_id, rules
+        )
+        
+        # Replays re-find events that were already recorded for this file: they are
+        # tagged so the backend does not store them again, and their ids are
+        # deterministic so replaying the same file twice yields the same events
+        model_version = artifact.meta['model_version']
+        for event in events:
+            event['replay'] = True
+            event['model_version'] = model_version
+            event['event_id'] = str(uuid.uuid5(
+                REPLAY_EVENT_NAMESPACE,
+                f"{video_file_id}:{model_version}:{event.get('rule_id')}:{event.get('track_id')}:{event['timestamp']}"
+            ))
+        self.event_publisher.publish_events(events)
+        
+        print(f"Replayed {artifact.frame_count} frames of video file {video_file_id}: {len(events)} events")
+        return events
\ No newline at end of file
@@ -0,0 +1,57 @@
+# core/api_server.py
+from typing import Dict, Any, Optional
+from datetime import datetime
+from flask import Flask, Response, request, jsonify
+from ..services.backtest_service import BacktestService
+from ..services.condition_compiler import ConditionSyntaxError
+from ..services.schedule_service import ScheduleError
+from ..services.rule_metrics_service import RuleMetricsService
+
+
+def _parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def create_api_app(backtest_service: Optional[BacktestService],
+                   rule_metrics: Optional[RuleMetricsService] = None) -> Flask:
+    """Create the HTTP API the backend uses for synchronous analyzer requests"""
+    app = Flask(__name__)
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        return jsonify({'status': 'ok'})
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        body = rule_metrics.prometheus() if rule_metrics is not None else ''
+        return Response(body, mimetype='text/plain; version=0.0.4')
+
+    @app.route('/rules/stats', methods=['GET'])
+    def rule_stats():
+        return jsonify({'rules': rule_metrics.snapshot() if rule_metrics is not None else []})
+
+    @app.route('/backtest', methods=['POST'])
+    def backtest():
+        if backtest_service is None:
+            return jsonify({'error': 'backtests are served by the rule service'}), 503
+        payload: Dict[str, Any] = request.get_json(silent=True) or {}
+        rule = payload.get('rule')
+        camera_id = payload.get('camera_id')
+        if not rule or not camera_id or 'rule_type' not in rule:
+            return jsonify({'error': 'rule with rule_type and camera_id are required'}), 400
+
+        try:
+            start_time = _parse_datetime(payload['start_time'])
+            end_time = _parse_datetime(payload['end_time'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'start_time and end_time must be ISO 8601 timestamps'}), 400
+        if start_time >= end_time:
+            return jsonify({'error': 'start_time must be before end_time'}), 400
+
+        try:
+            result = backtest_service.run(rule, camera_id, start_time, end_time, payload.get('model_version'))
+        except (ConditionSyntaxError, ScheduleError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result)
+
+    return app
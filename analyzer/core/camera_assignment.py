@@ -0,0 +1,80 @@
+# core/camera_assignment.py
+from typing import Dict, Callable, Set, Iterable, NamedTuple
+import json
+from kafka import ConsumerRebalanceListener
+from kafka.partitioner.default import murmur2
+
+
+COMMAND_TOPIC = 'insightcore-video-commands'
+STREAMS_KEY = 'insightcore:streams'
+RECORDINGS_KEY = 'insightcore:recordings'
+
+
+def partition_for(camera_id: str, partition_count: int) -> int:
+    """Partition of the camera's commands, as chosen by the producer's default partitioner"""
+    return (murmur2(camera_id.encode('utf-8')) & 0x7fffffff) % partition_count
+
+
+class Workload(NamedTuple):
+    """Something a node runs per camera (analysis, recording) and how to start and stop it"""
+    key: str  # Redis hash of registered cameras and their start parameters
+    start: Callable[..., None]  # start(camera_id, stream_url, **other parameters)
+    stop: Callable[[str], None]
+    running: Callable[[], Iterable[str]]
+
+
+class CameraAssignment(ConsumerRebalanceListener):
+    """Keeps the per-camera work of an analyzer node in line with its share of the command topic.
+
+    Commands are keyed by camera, so all commands of a camera land on one
+    partition and the group member owning that partition runs the camera.
+    Running streams and recordings are registered in Redis; after a
+    rebalance each node stops the cameras whose partitions moved away and
+    picks up the registered cameras of the partitions it gained.
+    """
+
+    def __init__(self, consumer, redis_client, workloads: Dict[str, Workload], topic: str = COMMAND_TOPIC):
+        self.consumer = consumer
+        self.redis_client = redis_client
+        self.workloads = workloads
+        self.topic = topic
+        self.partitions: Set[int] = set()
+
+    def register(self, workload: str, camera_id: str, stream_url: str, **params):
+        """Record that the camera should be running, whichever node runs it, and how to start it"""
+        params['stream_url'] = stream_url
+        self.redis_client.hset(self.workloads[workload].key, camera_id, json.dumps(params))
+
+    def unregister(self, workload: str, camera_id: str):
+        self.redis_client.hdel(self.workloads[workload].key, camera_id)
+
+    def registered(self, workload: str) -> Dict[str, Dict[str, str]]:
+        cameras = {}
+        for camera_id, value in self.redis_client.hgetall(self.workloads[workload].key).items():
+            value = value.decode('utf-8')
+            # Entries written before start parameters were kept hold just the url
+            cameras[camera_id.decode('utf-8')] = json.loads(value) if value.startswith('{') else {'stream_url': value}
+        return cameras
+
+    def on_partitions_revoked(self, revoked):
+        # Work keeps running until the new assignment shows which of it moved
+        pass
+
+    def on_partitions_assigned(self, assigned):
+        self.partitions = {tp.partition for tp in assigned if tp.topic == self.topic}
+        partition_count = len(self.consumer.partitions_for_topic(self.topic) or ())
+        if not partition_count:
+            return
+
+        for name, workload in self.workloads.items():
+            for camera_id in list(workload.running()):
+                if partition_for(camera_id, partition_count) not in self.partitions:
+                    workload.stop(camera_id)
+
+            running = set(workload.running())
+            for camera_id, params in self.registered(name).items():
+                if camera_id not in running and partition_for(camera_id, partition_count) in self.partitions:
+                    workload.start(camera_id, **params)
+
+            print(f"Assigned command partitions {sorted(self.partitions)} of {partition_count}; "
+                  f"running {name}: {sorted(workload.running())}")
@@ -13,9 +13,80 @@ class Config:
         self.frame_skip = int(os.getenv('ANALYZER_FRAME_SKIP', 1))
         self.draw_detections = os.getenv('ANALYZER_DRAW_DETECTIONS', 'false').lower() == 'true'
         self.max_objects = int(os.getenv('ANALYZER_MAX_OBJECTS', 100))
+        self.model_version = os.getenv(
+            'ANALYZER_MODEL_VERSION',
+            os.path.splitext(os.path.basename(self.model_path))[0]
+        )
+        self.rules_cache_ttl = float(os.getenv('ANALYZER_RULES_CACHE_TTL', 5))
+        # Grid cell size (pixels) of the per-camera spatial index over rule lines and zones
+        self.rule_index_cell_size = float(os.getenv('ANALYZER_RULE_INDEX_CELL_SIZE', 64))
+        # Timezone of rule schedules that do not set their own and of hour/weekday in custom conditions
+        self.schedule_timezone = os.getenv('ANALYZER_SCHEDULE_TIMEZONE', 'UTC')
+        # Circuit breaker of runaway rules: limits per rule (0 turns a limit off; events of a
+        # track count once per minute, a rule may override the events limit in its conditions),
+        # how long a tripped rule is throttled and after how many consecutive trips it is disabled
+        self.rule_max_events_per_minute = int(os.getenv('ANALYZER_RULE_MAX_EVENTS_PER_MINUTE', 600))
+        self.rule_max_ms = float(os.getenv('ANALYZER_RULE_MAX_MS', 50))
+        self.rule_throttle_seconds = float(os.getenv('ANALYZER_RULE_THROTTLE_SECONDS', 60))
+        self.rule_max_trips = int(os.getenv('ANALYZER_RULE_MAX_TRIPS', 3))
+        # Evaluate rules for video files over whole trajectories once tracking ends
+        self.offline_file_rules = os.getenv('ANALYZER_OFFLINE_FILE_RULES', 'true').lower() == 'true'
+        # Zone occupancy time series: bucket size and how often buckets are written
+        self.occupancy_bucket_seconds = float(os.getenv('ANALYZER_OCCUPANCY_BUCKET_SECONDS', 1))
+        self.occupancy_flush_interval = float(os.getenv('ANALYZER_OCCUPANCY_FLUSH_INTERVAL', 10))
+        # Left-behind detection: background model width (pixels) and update period (seconds)
+        self.static_model_width = int(os.getenv('ANALYZER_STATIC_MODEL_WIDTH', 160))
+        self.static_update_interval = float(os.getenv('ANALYZER_STATIC_UPDATE_INTERVAL', 0.5))
+        
+        # Where rules run: 'inline' in this worker, or 'stream' to publish per-frame track
+        # states to Kafka for the separately scaled rule service (core/rule_service.py)
+        self.rule_evaluation = os.getenv('ANALYZER_RULE_EVALUATION', 'inline')
+        self.track_state_topic = os.getenv('ANALYZER_TRACK_STATE_TOPIC', 'insightcore-track-states')
+        self.rule_service_group = os.getenv('ANALYZER_RULE_SERVICE_GROUP', 'insightcore-rule-service')
+        # In stream mode, run the left-behind background model and send its objects along
+        self.stream_static_objects = os.getenv('ANALYZER_STREAM_STATIC_OBJECTS', 'false').lower() == 'true'
+        
+        # Event clips: seconds of video before and after an event, cut from a packet buffer
+        # of each stream without re-encoding and uploaded to MinIO
+        self.event_clips = os.getenv('ANALYZER_EVENT_CLIPS', 'true').lower() == 'true'
+        self.clip_pre_seconds = float(os.getenv('ANALYZER_CLIP_PRE_SECONDS', 10))
+        self.clip_post_seconds = float(os.getenv('ANALYZER_CLIP_POST_SECONDS', 5))
+        # Clips uploading at once (more are dropped) and tries of a failed clip upload
+        self.clip_max_uploads = int(os.getenv('ANALYZER_CLIP_MAX_UPLOADS', 4))
+        self.clip_upload_attempts = int(os.getenv('ANALYZER_CLIP_UPLOAD_ATTEMPTS', 3))
+        
+        # Continuous recording (start_recording commands): stream-copied local segments of
+        # segment_seconds, uploaded to MinIO by upload_workers threads
+        self.recording_dir = os.getenv('ANALYZER_RECORDING_DIR', 'recordings')
+        self.recording_segment_seconds = float(os.getenv('ANALYZER_RECORDING_SEGMENT_SECONDS', 60))
+        self.recording_upload_workers = int(os.getenv('ANALYZER_RECORDING_UPLOAD_WORKERS', 4))
+        
+        # Tracker failover: per-camera checkpoints in Redis every interval seconds, kept for ttl
+        # seconds, and blocks of globally unique track ids reserved per worker
+        self.checkpoint_interval = float(os.getenv('ANALYZER_CHECKPOINT_INTERVAL', 1.0))
+        self.checkpoint_ttl = int(os.getenv('ANALYZER_CHECKPOINT_TTL', 60))
+        self.track_id_block_size = int(os.getenv('ANALYZER_TRACK_ID_BLOCK_SIZE', 1000))
+        
+        # Kafka payloads of events and track states: 'binary' (services/wire_format.py) or 'json'
+        self.wire_format = os.getenv('ANALYZER_WIRE_FORMAT', 'binary')
+        
+        # On-disk event spool: events are written here first and sent to Kafka in batches
+        # by a background sender, so broker outages neither block frames nor lose events
+        self.spool_dir = os.getenv('ANALYZER_SPOOL_DIR', 'spool')
+        self.spool_segment_bytes = int(os.getenv('ANALYZER_SPOOL_SEGMENT_BYTES', 8 * 1024 * 1024))
+        self.spool_max_bytes = int(os.getenv('ANALYZER_SPOOL_MAX_BYTES', 1024 * 1024 * 1024))
+        self.spool_batch_size = int(os.getenv('ANALYZER_SPOOL_BATCH_SIZE', 500))
+        self.spool_send_timeout = float(os.getenv('ANALYZER_SPOOL_SEND_TIMEOUT', 30))
+        self.spool_retry_delay = float(os.getenv('ANALYZER_SPOOL_RETRY_DELAY', 5))
+        
+        # HTTP API configuration (rule backtests)
+        self.api_host = os.getenv('ANALYZER_API_HOST', '0.0.0.0')
+        self.api_port = int(os.getenv('ANALYZER_API_PORT', 8001))
         
         # Kafka configuration
         self.kafka_servers = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092').split(',')
+        # Consumer group of analyzer nodes; cameras are spread over its members by command partition
+        self.command_group = os.getenv('ANALYZER_COMMAND_GROUP', 'insightcore-analyzers')
         
         # Redis configuration
         self.redis_host = os.getenv('REDIS_HOST', 'localhost')
@@ -35,6 +106,10 @@ class Config:
         self.minio_secret_key = os.getenv('MINIO_SECRET_KEY', 'minioadmin')
         self.minio_secure = os.getenv('MINIO_SECURE', 'false').lower() == 'true'
         self.minio_bucket_name = os.getenv('MINIO_BUCKET_NAME', 'insightcore-videos')
+        # Uploads: concurrent objects, and multipart part size and parts sent in parallel per object
+        self.storage_upload_workers = int(os.getenv('ANALYZER_STORAGE_UPLOAD_WORKERS', 8))
+        self.storage_part_size = int(os.getenv('ANALYZER_STORAGE_PART_SIZE', 16 * 1024 * 1024))
+        self.storage_parallel_parts = int(os.getenv('ANALYZER_STORAGE_PARALLEL_PARTS', 4))
     
     def get_db_connection_params(self) -> Dict[str, Any]:
         """Get database connection parameters"""
@@ -52,7 +127,10 @@ class Config:
             'endpoint': self.minio_endpoint,
             'access_key': self.minio_access_key,
             'secret_key': self.minio_secret_key,
-            'secure': self.minio_secure
+            'secure': self.minio_secure,
+            'upload_workers': self.storage_upload_workers,
+            'part_size': self.storage_part_size,
+            'parallel_parts': self.storage_parallel_parts
         }
     
     def get_kafka_config(self) -> Dict[str, Any]:
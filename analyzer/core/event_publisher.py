@@ -1,58 +1,157 @@
 # core/event_publisher.py
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from kafka import KafkaProducer
 import json
+import os
+import threading
+import time
+import uuid
 import redis
 from .config import Config
+from ..services.wire_format import serializer, decode
+from ..services.spool_service import EventSpool
+from .camera_assignment import COMMAND_TOPIC
+
+
+EVENTS_TOPIC = 'insightcore-events'
+# Namespace of the deterministic ids of events found by rules-only replays
+REPLAY_EVENT_NAMESPACE = uuid.UUID('0b7d3c52-8f4e-4d1a-9a63-2e5f7c18b4d9')
 
 
 class EventPublisher:
-    """Service for publishing events to Kafka and caching in Redis"""
+    """Service for publishing events to Kafka and caching in Redis
+    
+    Events are appended to an on-disk spool and return immediately; a
+    background sender drains the spool to Kafka in batches, in order, and
+    keeps what it could not deliver until the broker is back. The Kafka
+    producer is created on first use, so the publisher starts and spools
+    while no broker is reachable.
+    """
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, spool_name: str = 'events'):
         self.config = config
+        self.encode = serializer(self.config.wire_format)
         
-        # Initialize Kafka producer
-        self.kafka_producer = KafkaProducer(
-            bootstrap_servers=config.get_kafka_config()['bootstrap_servers'],
-            value_serializer=lambda x: json.dumps(x).encode('utf-8')
-        )
+        # Kafka producer, created by _producer(); values are encoded before they reach the spool
+        self.kafka_producer: Optional[KafkaProducer] = None
+        self._producer_lock = threading.Lock()
         
         # Initialize Redis client
         self.redis_client = redis.Redis(**config.get_redis_config())
+        
+        self.spool = EventSpool(
+            os.path.join(config.spool_dir, spool_name),
+            segment_bytes=config.spool_segment_bytes,
+            max_bytes=config.spool_max_bytes
+        )
+        self._stopped = threading.Event()
+        self._sender = threading.Thread(target=self._drain_spool, daemon=True)
+        self._sender.start()
     
     def publish_event(self, event: Dict[str, Any]) -> bool:
-        """Publish a single event to Kafka"""
+        """Spool a single event for Kafka
+        
+        The event gets an ``event_id`` here, so a batch resent after a failed
+        delivery does not produce duplicates downstream.
+        """
         try:
-            self.kafka_producer.send('insightcore-events', event)
-            self.kafka_producer.flush()  # Ensure the message is sent
-            
-            # Cache event in Redis for quick access
-            event_key = f"event:{event['timestamp']}:{event.get('track_id', 'unknown')}"
-            self.redis_client.setex(
-                event_key, 
-                3600,  # Expire after 1 hour
-                json.dumps(event)
-            )
-            
+            event.setdefault('event_id', str(uuid.uuid4()))
+            key = str(event.get('camera_id', '')).encode('utf-8')
+            self.spool.append(key, self.encode(event))
             return True
         except Exception as e:
-            print(f"Error publishing event: {e}")
+            print(f"Error spooling event: {e}")
             return False
     
     def publish_events(self, events: List[Dict[str, Any]]) -> int:
-        """Publish multiple events to Kafka"""
+        """Spool multiple events for Kafka"""
         success_count = 0
         for event in events:
             if self.publish_event(event):
                 success_count += 1
         return success_count
     
+    def publish_message(self, message: Dict[str, Any]) -> bool:
+        """Spool a clip or video file message; it follows the camera's events spooled before it"""
+        try:
+            self.spool.append(str(message['camera_id']).encode('utf-8'), self.encode(message))
+            return True
+        except Exception as e:
+            print(f"Error spooling {message.get('type')} message: {e}")
+            return False
+    
+    def _producer(self) -> KafkaProducer:
+        """The Kafka producer, connecting on first use; raises while no broker is reachable"""
+        with self._producer_lock:
+            if self.kafka_producer is None:
+                self.kafka_producer = KafkaProducer(
+                    bootstrap_servers=self.config.get_kafka_config()['bootstrap_servers']
+                )
+            return self.kafka_producer
+    
+    def _drain_spool(self):
+        """Send spooled events in batches; a batch is committed only once Kafka acknowledged all of it"""
+        while not self._stopped.is_set():
+            records, position = self.spool.read_batch(self.config.spool_batch_size)
+            if not records:
+                self.spool.wait(timeout=1.0)
+                continue
+            
+            try:
+                # Keyed by camera: each camera's events stay in order on one partition
+                producer = self._producer()
+                futures = [producer.send(EVENTS_TOPIC, value, key=key or None) for key, value in records]
+                producer.flush(timeout=self.config.spool_send_timeout)
+                for future in futures:
+                    future.get(timeout=0)
+            except Exception as e:
+                print(f"Error sending {len(records)} spooled events, retrying: {e}")
+                self._stopped.wait(self.config.spool_retry_delay)
+                continue
+            
+            self.spool.commit(position)
+            self._cache_events(records)
+    
+    def _cache_events(self, records):
+        """Cache sent events in Redis for quick access"""
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for _, value in records:
+                event = decode(value)
+                if 'rule_id' not in event or event.get('replay'):
+                    continue
+                event_key = f"event:{event['timestamp']}:{event.get('track_id', 'unknown')}"
+                pipeline.setex(
+                    event_key,
+                    3600,  # Expire after 1 hour
+                    json.dumps(event)
+                )
+            pipeline.execute()
+        except Exception as e:
+            print(f"Error caching events: {e}")
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the spool is drained, e.g. before shutting down"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.spool.pending_bytes() > 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+    
+    def close(self):
+        """Stop the sender; unsent events stay in the spool for the next start"""
+        self._stopped.set()
+        self._sender.join(timeout=5)
+        self.spool.close()
+    
     def publish_command(self, command: Dict[str, Any]) -> bool:
-        """Publish a command to Kafka command topic"""
+        """Publish a command to Kafka command topic, keyed by camera so one node owns each camera"""
         try:
-            self.kafka_producer.send('insightcore-video-commands', command)
-            self.kafka_producer.flush()
+            key = command.get('camera_id')
+            producer = self._producer()
+            producer.send(COMMAND_TOPIC, self.encode(command), key=key.encode('utf-8') if key else None)
+            producer.flush()
             return True
         except Exception as e:
             print(f"Error publishing command: {e}")
@@ -0,0 +1,121 @@
+# core/rule_service.py
+from typing import Dict
+import time
+import threading
+from kafka import KafkaConsumer
+from .config import Config
+from .api_server import create_api_app
+from .event_publisher import EventPublisher
+from ..services.rule_engine_service import RuleEngineService
+from ..services.rule_metrics_service import RuleMetricsService
+from ..services.backtest_service import BacktestService
+from ..services.storage_service import StorageService
+from ..services.track_store_service import TrackStoreService
+from ..services.track_state_service import TrackStateAssembler
+from ..services.wire_format import decode
+
+
+def create_rule_engine_service(config: Config) -> RuleEngineService:
+    """Rule engine configured from the analyzer settings"""
+    return RuleEngineService(
+        db_connection_params=config.get_db_connection_params(),
+        rules_cache_ttl=config.rules_cache_ttl,
+        occupancy_bucket_seconds=config.occupancy_bucket_seconds,
+        rule_index_cell_size=config.rule_index_cell_size,
+        schedule_timezone=config.schedule_timezone,
+        rule_metrics=RuleMetricsService(
+            max_events_per_minute=config.rule_max_events_per_minute,
+            max_rule_ms=config.rule_max_ms,
+            throttle_seconds=config.rule_throttle_seconds,
+            max_trips=config.rule_max_trips
+        )
+    )
+
+
+class RuleEvaluationService:
+    """Evaluates rules over the track-state stream of analyzer workers.
+
+    Runs apart from inference (ANALYZER_RULE_EVALUATION=stream on the
+    workers) and scales by adding consumers to its group: the topic is
+    keyed by camera, so each camera is owned by one consumer at a time and
+    its frames arrive in order. Only this service talks to the database.
+    """
+
+    def __init__(self, config: Config = None):
+        self.config = config or Config()
+        self.rule_engine_service = create_rule_engine_service(self.config)
+        self.assemblers: Dict[str, TrackStateAssembler] = {}
+        self._last_occupancy_flush = time.monotonic()
+
+        self.kafka_consumer = KafkaConsumer(
+            self.config.track_state_topic,
+            bootstrap_servers=self.config.get_kafka_config()['bootstrap_servers'],
+            group_id=self.config.rule_service_group,
+            value_deserializer=decode
+        )
+        self.event_publisher = EventPublisher(self.config, spool_name='rule-service-events')
+
+        # Backtests need the database too, so the API moves here with the rules
+        storage_service = StorageService(**self.config.get_minio_config())
+        self.backtest_service = BacktestService(
+            self.config.get_db_connection_params(),
+            TrackStoreService(storage_service, self.config.model_version),
+            schedule_timezone=self.config.schedule_timezone
+        )
+
+    def start(self):
+        """Serve the API and consume track states until interrupted"""
+        api_thread = threading.Thread(target=self._serve_api)
+        api_thread.daemon = True
+        api_thread.start()
+
+        try:
+            for message in self.kafka_consumer:
+                self.handle_state(message.value)
+        except KeyboardInterrupt:
+            print("Stopping rule evaluation service")
+        finally:
+            self.rule_engine_service.flush_occupancy(final=True)
+            self.event_publisher.flush(timeout=self.config.spool_send_timeout)
+            self.event_publisher.close()
+
+    def _serve_api(self):
+        app = create_api_app(self.backtest_service, self.rule_engine_service.rule_metrics)
+        app.run(host=self.config.api_host, port=self.config.api_port, threaded=True)
+
+    def handle_state(self, state: Dict) -> int:
+        """Evaluate the camera's rules on one track-state message and publish the events"""
+        camera_id = state['camera_id']
+        if state['type'] == 'end':
+            self.assemblers.pop(camera_id, None)
+            self.rule_engine_service.flush_occupancy(camera_id, final=True)
+            return 0
+
+        assembler = self.assemblers.get(camera_id)
+        if assembler is None:
+            assembler = self.assemblers[camera_id] = TrackStateAssembler()
+        frame_time, tracks, static_objects = assembler.apply(state)
+
+        events = self.rule_engine_service.check_rules(
+            tracks, camera_id, frame_time, history=assembler.history, static_objects=static_objects
+        )
+        for event in events:
+            self.event_publisher.publish_event(event)
+            print(f"Event spooled for Kafka: {event}")
+
+        # Write zone occupancy buckets in batches rather than per frame
+        now = time.monotonic()
+        if now - self._last_occupancy_flush >= self.config.occupancy_flush_interval:
+            self.rule_engine_service.flush_occupancy()
+            self._last_occupancy_flush = now
+        return len(events)
+
+
+def main():
+    """Entry point of the standalone rule evaluation service"""
+    service = RuleEvaluationService(Config())
+    service.start()
+
+
+if __name__ == "__main__":
+    main()
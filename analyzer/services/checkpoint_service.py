@@ -0,0 +1,143 @@
+# services/checkpoint_service.py
+from typing import Dict, Any, Optional
+from datetime import datetime
+import json
+import threading
+import time
+import zlib
+import numpy as np
+from .tracking_service import Track, TrackingService, ground_points
+
+
+TRACK_ID_KEY = 'insightcore:next_track_id'
+CHECKPOINT_VERSION = 1
+
+
+class TrackIdAllocator:
+    """Hands out track ids unique across all analyzer workers.
+
+    Ids are reserved from a Redis counter in blocks, so a worker touches
+    Redis once per ``block_size`` new tracks. Ids left in a block when a
+    worker stops are skipped, never reused.
+    """
+
+    def __init__(self, redis_client, block_size: int = 1000, key: str = TRACK_ID_KEY):
+        self.redis_client = redis_client
+        self.block_size = block_size
+        self.key = key
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                self._end = int(self.redis_client.incrby(self.key, self.block_size)) + 1
+                self._next = self._end - self.block_size
+            track_id = self._next
+            self._next += 1
+            return track_id
+
+
+class CheckpointService:
+    """Periodic per-camera snapshots of tracker and rule state in Redis.
+
+    A snapshot holds the active tracks with their recent boxes and times
+    (``history_length`` samples, rounded to 0.1 px) and the rule latches of
+    the camera, compressed. The worker that picks the camera up next, after
+    a restart or a rebalance, restores it and carries on with the same
+    tracks, dwell times and track ids instead of starting from zero.
+    """
+
+    def __init__(self, redis_client, interval: float = 1.0, ttl: int = 60):
+        self.redis_client = redis_client
+        self.interval = interval
+        self.ttl = ttl
+        self._last_saved: Dict[str, float] = {}
+
+    @staticmethod
+    def _key(camera_id: str) -> str:
+        return f"camera:{camera_id}:checkpoint"
+
+    def snapshot(self, tracker: TrackingService, frame_time: datetime,
+                 rule_state: Optional[Dict[str, Any]] = None) -> bytes:
+        """Compact snapshot of the tracker's active tracks and the given rule state"""
+        length = tracker.history.length
+        tracks = []
+        for track in tracker.get_active_tracks():
+            samples = [
+                [*(round(float(value), 1) for value in bbox), round(timestamp, 3)]
+                for bbox, timestamp in zip(track.bbox_history[-length:], track.time_history[-length:])
+            ]
+            tracks.append([track.track_id, track.class_name, round(float(track.confidence), 3),
+                           track.first_seen.timestamp(), track.last_seen.timestamp(), samples])
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'saved_at': frame_time.timestamp(),
+            'tracks': tracks,
+            'rules': rule_state
+        }
+        return zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+
+    def maybe_save(self, camera_id: str, tracker: TrackingService, frame_time: datetime,
+                   rule_engine_service=None) -> bool:
+        """Save a snapshot when ``interval`` seconds have passed since the last one"""
+        now = time.monotonic()
+        if now - self._last_saved.get(camera_id, float('-inf')) < self.interval:
+            return False
+        self._last_saved[camera_id] = now
+        return self.save(camera_id, tracker, frame_time, rule_engine_service)
+
+    def save(self, camera_id: str, tracker: TrackingService, frame_time: datetime,
+             rule_engine_service=None) -> bool:
+        """Write the camera's snapshot; it expires after ``ttl`` seconds"""
+        try:
+            rule_state = rule_engine_service.export_state(camera_id) if rule_engine_service is not None else None
+            self.redis_client.setex(self._key(camera_id), self.ttl, self.snapshot(tracker, frame_time, rule_state))
+            return True
+        except Exception as e:
+            print(f"Error saving checkpoint of camera {camera_id}: {e}")
+            return False
+
+    def restore(self, camera_id: str, tracker: TrackingService, rule_engine_service=None) -> bool:
+        """Load the camera's snapshot into an empty tracker and the rule engine
+
+        Snapshots older than the tracker's inactivity timeout hold no track
+        that would still be active and are ignored.
+        """
+        try:
+            data = self.redis_client.get(self._key(camera_id))
+            if data is None:
+                return False
+            state = json.loads(zlib.decompress(data).decode('utf-8'))
+        except Exception as e:
+            print(f"Error loading checkpoint of camera {camera_id}: {e}")
+            return False
+        if state.get('version') != CHECKPOINT_VERSION:
+            return False
+        age = time.time() - state['saved_at']
+        if age > tracker.max_inactive_time:
+            return False
+
+        for track_id, class_name, confidence, first_seen, last_seen, samples in state['tracks']:
+            if not samples:
+                continue
+            samples = np.asarray(samples, dtype=np.float64)
+            bboxes = samples[:, :4]
+            track = Track(
+                track_id=track_id,
+                class_name=class_name,
+                bbox_history=[tuple(bbox) for bbox in bboxes.tolist()],
+                center_history=[((x1 + x2) / 2, (y1 + y2) / 2) for x1, y1, x2, y2 in bboxes.tolist()],
+                first_seen=datetime.fromtimestamp(first_seen),
+                last_seen=datetime.fromtimestamp(last_seen),
+                confidence=confidence,
+                time_history=samples[:, 4].tolist()
+            )
+            tracker.tracks[track_id] = track
+            tracker.history.load(track_id, ground_points(bboxes), samples[:, 4])
+
+        if rule_engine_service is not None and state.get('rules'):
+            rule_engine_service.import_state(camera_id, state['rules'])
+        print(f"Restored {len(tracker.tracks)} tracks of camera {camera_id} from a {age:.1f}s old checkpoint")
+        return True
@@ -0,0 +1,171 @@
+# services/clip_service.py
+from typing import List, Dict, Any, Callable, Optional
+from datetime import datetime, timezone
+from concurrent.futures import Future
+import queue
+import threading
+import uuid
+import av
+from .packet_service import PacketSource, PacketRingBuffer, BufferedPacket, mux_packets
+from .storage_service import StorageService, clip_prefix
+
+
+class ClipService:
+    """Cuts event clips out of per-camera buffers of compressed packets.
+
+    Every stream keeps its last ``pre_seconds + post_seconds`` of packets,
+    a few megabytes rather than decoded frames. An event opens
+    a clip from ``pre_seconds`` before to ``post_seconds`` after it; events
+    of the camera that fire while the clip is open join it. Once the
+    stream has passed the clip's end, its packets are stream-copied into an
+    in-memory MP4 on a background thread and uploaded on the storage
+    service's upload pool, and a clip message follows
+    the events on the events topic so the backend can create the
+    VideoFile and Clip rows and link the events. At most ``max_uploads``
+    clips are in flight, further clips are dropped, and a failed upload
+    is tried up to ``upload_attempts`` times in all.
+    """
+
+    def __init__(self, storage_service: StorageService, publish_message: Callable[[Dict[str, Any]], Any],
+                 pre_seconds: float = 10.0, post_seconds: float = 5.0, max_queued: int = 16,
+                 max_uploads: int = 4, upload_attempts: int = 3):
+        self.storage_service = storage_service
+        self.publish_message = publish_message
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.buffers: Dict[str, PacketRingBuffer] = {}
+        self.sources: Dict[str, PacketSource] = {}
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        # Bounded, so a slow MinIO drops clips instead of growing memory
+        self._jobs: queue.Queue = queue.Queue(maxsize=max_queued)
+        # The upload pool's queue is unbounded, so clips in flight hold a slot each
+        self._uploads = threading.BoundedSemaphore(max_uploads)
+        self.upload_attempts = upload_attempts
+        self._worker = threading.Thread(target=self._save_clips, daemon=True)
+        self._worker.start()
+
+    def open_camera(self, camera_id: str, source: PacketSource):
+        self.sources[camera_id] = source
+        self.buffers[camera_id] = PacketRingBuffer(self.pre_seconds + self.post_seconds)
+
+    def add_packet(self, camera_id: str, packet: av.Packet, packet_time: float):
+        """Buffer a packet after it was decoded; finishes the open clip once past its end"""
+        buffer = self.buffers.get(camera_id)
+        if buffer is None:
+            return
+        buffer.append(packet, packet_time)
+        pending = self.pending.get(camera_id)
+        if pending is not None and packet_time >= pending['end']:
+            self._dispatch(camera_id)
+
+    def attach(self, camera_id: str, frame_time: datetime, events: List[Dict[str, Any]]) -> Optional[str]:
+        """Give the events ids and the id of the clip that will show them"""
+        if not events or camera_id not in self.buffers:
+            return None
+        pending = self.pending.get(camera_id)
+        if pending is None:
+            timestamp = frame_time.timestamp()
+            pending = self.pending[camera_id] = {
+                'clip_id': str(uuid.uuid4()),
+                'start': timestamp - self.pre_seconds,
+                'end': timestamp + self.post_seconds,
+                'event_ids': [],
+                'label': events[0].get('rule_type') or ''
+            }
+        for event in events:
+            event.setdefault('event_id', str(uuid.uuid4()))
+            event['clip_id'] = pending['clip_id']
+            pending['event_ids'].append(event['event_id'])
+        return pending['clip_id']
+
+    def close_camera(self, camera_id: str, source: Optional[PacketSource] = None):
+        """Finish the open clip with what was received and drop the camera's buffer
+
+        Waits for queued clips, which still need the source's stream. With
+        ``source`` nothing is done once the camera was reopened on another one.
+        """
+        if source is not None and self.sources.get(camera_id) is not source:
+            return
+        if camera_id in self.pending:
+            self._dispatch(camera_id)
+        self._jobs.join()
+        self.buffers.pop(camera_id, None)
+        self.sources.pop(camera_id, None)
+
+    def _dispatch(self, camera_id: str):
+        pending = self.pending.pop(camera_id)
+        packets = self.buffers[camera_id].slice(pending['start'], pending['end'])
+        if not packets:
+            return
+        try:
+            self._jobs.put_nowait((camera_id, self.sources[camera_id], pending, packets))
+        except queue.Full:
+            print(f"Clip queue is full, dropping clip {pending['clip_id']} of camera {camera_id}")
+
+    def _save_clips(self):
+        while True:
+            camera_id, source, pending, packets = self._jobs.get()
+            try:
+                self._save_clip(camera_id, source, pending, packets)
+            except Exception as e:
+                print(f"Error saving clip {pending['clip_id']} of camera {camera_id}: {e}")
+            finally:
+                self._jobs.task_done()
+
+    def _save_clip(self, camera_id: str, source: PacketSource, pending: Dict[str, Any],
+                   packets: List[BufferedPacket]):
+        if not self._uploads.acquire(blocking=False):
+            print(f"Too many clips uploading, dropping clip {pending['clip_id']} of camera {camera_id}")
+            return
+        try:
+            data = mux_packets(source.stream, packets)
+        except Exception:
+            self._uploads.release()
+            raise
+        start_time = datetime.fromtimestamp(packets[0].time, timezone.utc)
+        end_time = datetime.fromtimestamp(packets[-1].time, timezone.utc)
+        object_name = f"{clip_prefix(camera_id)}{start_time.strftime('%Y%m%d_%H%M%S')}_{pending['clip_id']}.mp4"
+        message = {
+            'type': 'clip',
+            'clip_id': pending['clip_id'],
+            'camera_id': camera_id,
+            'event_ids': pending['event_ids'],
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'duration': round(packets[-1].time - packets[0].time, 3),
+            'storage_path': object_name,
+            'file_size': len(data),
+            'fps': source.fps,
+            'resolution': source.resolution,
+            'label': pending['label']
+        }
+        # The next clip is muxed while this one uploads
+        self._upload(data, message, 1)
+
+    def _upload(self, data: bytes, message: Dict[str, Any], attempt: int):
+        try:
+            upload = self.storage_service.submit_upload(data, message['storage_path'], content_type="video/mp4")
+        except RuntimeError as e:
+            # The upload pool is shut down
+            print(f"Error uploading clip {message['clip_id']}, dropping it: {e}")
+            self._uploads.release()
+            return
+        upload.add_done_callback(lambda future: self._clip_uploaded(future, data, message, attempt))
+
+    def _clip_uploaded(self, future: Future, data: bytes, message: Dict[str, Any], attempt: int):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'status': 'error', 'error': str(e)}
+        if result['status'] != 'uploaded':
+            if attempt < self.upload_attempts:
+                print(f"Error uploading clip {message['clip_id']} (attempt {attempt}), retrying: {result['error']}")
+                # The whole object is written again under the same name
+                self._upload(data, message, attempt + 1)
+                return
+            print(f"Error uploading clip {message['clip_id']}, dropping it: {result['error']}")
+            self._uploads.release()
+            return
+        self._uploads.release()
+        self.publish_message(message)
+        print(f"Uploaded clip {message['storage_path']} for {len(message['event_ids'])} events")
@@ -0,0 +1,316 @@
+# services/condition_compiler.py
+"""Condition language for rules with rule_type='custom'.
+
+A rule stores a boolean expression in ``conditions['expression']``, e.g.::
+
+    object_class in ("person", "bicycle") and confidence > 0.6
+        and in_zone("Pump 3") and dwell > 30 and (hour >= 22 or hour < 6)
+
+Fields (one value per track row):
+    object_class, confidence, area, dwell (seconds since the track appeared),
+    speed (pixels per second), hour (0-24, fractional), weekday (0 = Monday);
+    hour and weekday are local time in the analyzer's schedule timezone
+Functions:
+    in_zone()            - inside the rule's own zone
+    in_zone("name")      - inside a camera zone by name
+    count()              - number of tracks in the same frame
+    count("person")      - ... of a class (or a tuple of classes)
+    count("person", "Pump 3") - ... of a class inside a zone
+
+Expressions are parsed once, validated against this whitelist,
+type-checked (and/or/not take conditions, comparisons take operands of
+one type, strings only compare with == != in) and compiled into a single numpy expression over a table of feature columns,
+so evaluating a rule is one vectorized call for all tracks at once.
+"""
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import ast
+import numpy as np
+from .geometry import to_array, points_in_polygon
+from .tracking_service import Track
+
+
+# Expression types
+BOOL, NUMBER, STRING = 'condition', 'number', 'string'
+
+FIELDS = {
+    'object_class': STRING, 'confidence': NUMBER, 'area': NUMBER, 'dwell': NUMBER,
+    'speed': NUMBER, 'hour': NUMBER, 'weekday': NUMBER
+}
+
+_COMPARE_OPS = {
+    ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='
+}
+_ARITHMETIC_OPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/'}
+
+
+class ConditionSyntaxError(ValueError):
+    """Raised when a custom rule expression is invalid"""
+
+
+class CompiledCondition:
+    """A custom rule expression compiled into a vectorized predicate"""
+
+    def __init__(self, expression: str, source: str, predicate: Callable[[Dict[str, np.ndarray]], Any]):
+        self.expression = expression
+        self.source = source
+        self._predicate = predicate
+
+    def __call__(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Evaluate the predicate over a feature table and return a boolean row mask"""
+        rows = features['confidence'].shape[0]
+        return np.broadcast_to(np.asarray(self._predicate(features), dtype=bool), (rows,))
+
+
+def _literal_type(value: Any) -> str:
+    return STRING if isinstance(value, str) else NUMBER
+
+
+def _count(features: Dict[str, np.ndarray], mask: Optional[np.ndarray]) -> np.ndarray:
+    """Per-row number of rows in the same frame that satisfy mask"""
+    frame = features['frame']
+    if frame.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    selected = frame if mask is None else frame[mask]
+    return np.bincount(selected, minlength=int(frame.max()) + 1)[frame]
+
+
+class _Translator:
+    """Type-checks a parsed expression and translates it into numpy source code
+
+    Every node has a type: bool (a row mask), number or str. Boolean
+    operators only take masks and comparisons only take operands of one
+    type, so a compiled expression has no type errors. Division by a
+    constant that is zero is rejected; division by a feature that is zero
+    gives inf or nan for that row, as numpy does.
+    """
+
+    def __init__(self, zones: Dict[str, Any], default_zone: Optional[Any]):
+        self.zones = zones
+        self.default_zone = default_zone
+        self.namespace: Dict[str, Any] = {
+            '__builtins__': {},
+            '_isin': np.isin,
+            '_in_polygon': points_in_polygon,
+            '_count': _count,
+        }
+        self._zone_names: Dict[str, str] = {}
+
+    def condition(self, node: ast.AST) -> str:
+        """Source of a node that must be a condition (a row mask)"""
+        source, kind = self.translate(node)
+        if kind != BOOL:
+            raise ConditionSyntaxError(
+                f"'{ast.unparse(node)}' is a {kind}, not a condition; compare it, e.g. '{ast.unparse(node)} > 0'"
+            )
+        return source
+
+    def operand(self, node: ast.AST, kind: str) -> str:
+        """Source of a node that must be of the given type"""
+        source, actual = self.translate(node)
+        if actual != kind:
+            raise ConditionSyntaxError(f"'{ast.unparse(node)}' is a {actual}, expected a {kind}")
+        return source
+
+    def translate(self, node: ast.AST) -> Tuple[str, str]:
+        """(numpy source, type) of an expression node"""
+        if isinstance(node, ast.Expression):
+            return self.translate(node.body)
+        if isinstance(node, ast.BoolOp):
+            joiner = ' & ' if isinstance(node.op, ast.And) else ' | '
+            return '(' + joiner.join(self.condition(value) for value in node.values) + ')', BOOL
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return f'(~{self.condition(node.operand)})', BOOL
+            if isinstance(node.op, ast.USub):
+                return f'(-{self.operand(node.operand, NUMBER)})', NUMBER
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC_OPS:
+            left = self.operand(node.left, NUMBER)
+            right = self.operand(node.right, NUMBER)
+            if isinstance(node.op, ast.Div) and self._constant_zero(right):
+                raise ConditionSyntaxError("Division by zero")
+            return f'({left} {_ARITHMETIC_OPS[type(node.op)]} {right})', NUMBER
+        if isinstance(node, ast.Compare):
+            return self._compare(node), BOOL
+        if isinstance(node, ast.Name):
+            if node.id not in FIELDS:
+                raise ConditionSyntaxError(f"Unknown field '{node.id}'")
+            return f"F['{node.id}']", FIELDS[node.id]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)) \
+                and not isinstance(node.value, bool):
+            return repr(node.value), _literal_type(node.value)
+        if isinstance(node, ast.Call):
+            return self._call(node)
+        raise ConditionSyntaxError(f"Unsupported syntax: {ast.dump(node)[:60]}")
+
+    @staticmethod
+    def _constant_zero(source: str) -> bool:
+        """Whether translated source without fields or calls evaluates to zero (or divides by it)"""
+        if "F[" in source or "_" in source:
+            return False
+        try:
+            return eval(source, {'__builtins__': {}}) == 0
+        except ZeroDivisionError:
+            return True
+
+    def _compare(self, node: ast.Compare) -> str:
+        parts = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            left_source, kind = self.translate(left)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if kind == BOOL:
+                    raise ConditionSyntaxError(f"'{ast.unparse(left)}' is a condition and cannot be used with 'in'")
+                values = self._literal_set(right, kind)
+                part = f'_isin({left_source}, {values!r})'
+                parts.append(f'(~{part})' if isinstance(op, ast.NotIn) else part)
+            elif type(op) in _COMPARE_OPS:
+                right_source, right_kind = self.translate(right)
+                if right_kind != kind:
+                    raise ConditionSyntaxError(
+                        f"Cannot compare '{ast.unparse(left)}' ({kind}) with '{ast.unparse(right)}' ({right_kind})"
+                    )
+                if kind != NUMBER and not isinstance(op, (ast.Eq, ast.NotEq)):
+                    raise ConditionSyntaxError(f"Only numbers can be ordered: '{ast.unparse(left)}' is a {kind}")
+                parts.append(f'({left_source} {_COMPARE_OPS[type(op)]} {right_source})')
+            else:
+                raise ConditionSyntaxError("Only ==, !=, <, <=, >, >=, in and not in comparisons are allowed")
+            left = right
+        return parts[0] if len(parts) == 1 else '(' + ' & '.join(parts) + ')'
+
+    def _literal_set(self, node: ast.AST, kind: str) -> tuple:
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            items = [node]
+        elif isinstance(node, (ast.Tuple, ast.List)) and all(
+                isinstance(item, ast.Constant) and isinstance(item.value, (int, float, str))
+                and not isinstance(item.value, bool) for item in node.elts):
+            items = node.elts
+        else:
+            raise ConditionSyntaxError("'in' needs a string or a tuple of literals")
+        for item in items:
+            if _literal_type(item.value) != kind:
+                raise ConditionSyntaxError(f"{item.value!r} is not a {kind} like the values it is compared with")
+        return tuple(item.value for item in items)
+
+    def _call(self, node: ast.Call) -> Tuple[str, str]:
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise ConditionSyntaxError("Only in_zone(...) and count(...) calls are allowed")
+        args = node.args
+        if node.func.id == 'in_zone':
+            if len(args) > 1:
+                raise ConditionSyntaxError("in_zone takes at most one zone name")
+            return self._zone_mask(args[0] if args else None), BOOL
+        if node.func.id == 'count':
+            if len(args) > 2:
+                raise ConditionSyntaxError("count takes at most a class and a zone name")
+            masks = []
+            if args:
+                masks.append(f"_isin(F['object_class'], {self._literal_set(args[0], STRING)!r})")
+            if len(args) == 2:
+                masks.append(self._zone_mask(args[1]))
+            mask = ' & '.join(masks) if masks else 'None'
+            return f'_count(F, {mask})', NUMBER
+        raise ConditionSyntaxError(f"Unknown function '{node.func.id}'")
+
+    def _zone_mask(self, node: Optional[ast.AST]) -> str:
+        if node is None:
+            if self.default_zone is None:
+                raise ConditionSyntaxError("in_zone() needs a zone name: the rule has no zone")
+            name, polygon = '', self.default_zone
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            name = node.value
+            if name not in self.zones:
+                raise ConditionSyntaxError(f"Unknown zone '{name}'")
+            polygon = self.zones[name]
+        else:
+            raise ConditionSyntaxError("Zone names must be string literals")
+
+        variable = self._zone_names.get(name)
+        if variable is None:
+            variable = f'_zone_{len(self._zone_names)}'
+            self._zone_names[name] = variable
+            self.namespace[variable] = to_array(polygon)
+        return f"_in_polygon(F['xy'], {variable})"
+
+
+def compile_condition(expression: str, zones: Optional[Dict[str, Any]] = None,
+                      default_zone: Optional[Any] = None) -> CompiledCondition:
+    """Parse, validate and compile a custom rule expression
+
+    zones maps zone names to polygons; default_zone is the polygon used by
+    in_zone() without arguments.
+    """
+    if not isinstance(expression, str) or not expression.strip():
+        raise ConditionSyntaxError("Custom rules need a non-empty 'expression' condition")
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ConditionSyntaxError(f"Invalid expression: {e.msg}")
+
+    translator = _Translator(zones or {}, default_zone)
+    source = translator.condition(tree.body)
+    predicate = eval(compile(f'lambda F: {source}', '<rule condition>', 'eval'), translator.namespace)
+    return CompiledCondition(expression, source, predicate)
+
+
+def local_clock(start: datetime, offsets: np.ndarray, tz: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """(hour, weekday) in timezone tz of moments given as seconds after start
+
+    Live frames carry naive server-local times and offline files UTC-aware
+    start times; both are converted here, so hour and weekday conditions
+    match the same moments live and in backtests. Offsets are counted from
+    the local start, so a file spanning a DST change is off by the change.
+    """
+    if isinstance(tz, str):
+        tz = ZoneInfo(tz)
+    local = start.astimezone(tz)
+    day_seconds = local.hour * 3600 + local.minute * 60 + local.second + local.microsecond / 1e6 + offsets
+    return (day_seconds / 3600) % 24, (local.weekday() + np.floor(day_seconds / 86400)) % 7
+
+
+def features_from_tracks(tracks: List[Track], frame_time: datetime, tz: Any = 'UTC') -> Dict[str, np.ndarray]:
+    """Feature table of the tracks visible in one live frame"""
+    count = len(tracks)
+    bbox = np.array([track.bbox_history[-1] for track in tracks], dtype=np.float64).reshape(-1, 4)
+    xy = np.array([track.center_history[-1] for track in tracks], dtype=np.float64).reshape(-1, 2)
+    previous_xy = np.array([track.center_history[-2] if len(track.center_history) > 1 else track.center_history[-1]
+                            for track in tracks], dtype=np.float64).reshape(-1, 2)
+    dt = np.array([track.time_history[-1] - track.time_history[-2] if len(track.time_history) > 1 else 0.0
+                   for track in tracks], dtype=np.float64)
+    step = np.hypot(*(xy - previous_xy).T) if count else np.zeros(0)
+    hour, weekday = local_clock(frame_time, np.zeros(count), tz)
+
+    return {
+        'object_class': np.array([track.class_name for track in tracks], dtype=str),
+        'confidence': np.array([track.confidence for track in tracks], dtype=np.float64),
+        'area': (bbox[:, 2] - bbox[:, 0]) * (bbox[:, 3] - bbox[:, 1]),
+        'xy': xy,
+        'dwell': np.array([(track.last_seen - track.first_seen).total_seconds() for track in tracks],
+                          dtype=np.float64),
+        'speed': np.divide(step, dt, out=np.zeros_like(step), where=dt > 0),
+        'hour': hour,
+        'weekday': weekday,
+        'frame': np.zeros(count, dtype=np.int64),
+    }
+
+
+def features_from_trajectories(trajectories, tz: Any = 'UTC') -> Dict[str, np.ndarray]:
+    """Feature table over every row of an offline file's trajectories"""
+    bbox = trajectories.bbox
+    hour, weekday = local_clock(trajectories.start_time, trajectories.t.astype(np.float64), tz)
+    _, frame = np.unique(trajectories.t, return_inverse=True)
+    track_start = trajectories.t[trajectories.starts][trajectories.row_track]
+
+    return {
+        'object_class': np.asarray(trajectories.class_names, dtype=str)[trajectories.class_index]
+        if trajectories.class_names else np.zeros(0, dtype=str),
+        'confidence': trajectories.confidence.astype(np.float64),
+        'area': (bbox[:, 2] - bbox[:, 0]) * (bbox[:, 3] - bbox[:, 1]),
+        'xy': trajectories.xy,
+        'dwell': trajectories.t - track_start,
+        'speed': trajectories.speed(),
+        'hour': hour,
+        'weekday': weekday,
+        'frame': frame.reshape(-1).astype(np.int64),
+    }
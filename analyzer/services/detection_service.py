@@ -1,9 +1,10 @@
 # services/detection_service.py
 from typing import List, Dict, Any, Tuple
+import threading
 import numpy as np
 import cv2
 from ultralytics import YOLO
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 
 
@@ -99,6 +100,27 @@ class Detection:
     area: float
 
 
+def scale_detections(detections: List[Detection], from_shape: Tuple[int, int],
+                     to_shape: Tuple[int, int]) -> List[Detection]:
+    """Detections made on a frame of ``from_shape`` in the pixels of a frame of ``to_shape``
+
+    Used when a camera is analysed on its low-resolution substream while
+    zones, calibration and events are in main stream pixels.
+    """
+    scale_y = to_shape[0] / from_shape[0]
+    scale_x = to_shape[1] / from_shape[1]
+    return [
+        replace(
+            detection,
+            bbox=(detection.bbox[0] * scale_x, detection.bbox[1] * scale_y,
+                  detection.bbox[2] * scale_x, detection.bbox[3] * scale_y),
+            center=(detection.center[0] * scale_x, detection.center[1] * scale_y),
+            area=detection.area * scale_x * scale_y
+        )
+        for detection in detections
+    ]
+
+
 class DetectionService:
     """Service class for handling object detection logic"""
     
@@ -107,11 +129,14 @@ class DetectionService:
         self.confidence_threshold = confidence_threshold
         self.iou_threshold = iou_threshold
         self.class_names = self.model.names
+        # The model's predictor keeps per-call state, so streams of different cameras take turns
+        self._lock = threading.Lock()
     
     def detect_objects(self, frame: np.ndarray) -> List[Detection]:
         """Run YOLO object detection on frame"""
         try:
-            results = self.model(frame, conf=self.confidence_threshold, iou=self.iou_threshold)
+            with self._lock:
+                results = self.model(frame, conf=self.confidence_threshold, iou=self.iou_threshold)
             
             detections = []
             for result in results:
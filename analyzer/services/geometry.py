@@ -0,0 +1,102 @@
+# services/geometry.py
+from typing import List, Dict, Union
+import numpy as np
+
+
+PointList = Union[List[Dict[str, float]], np.ndarray]
+
+
+def to_array(points: PointList) -> np.ndarray:
+    """Convert [{'x': .., 'y': ..}, ...] rule geometry to a (K, 2) float array"""
+    if isinstance(points, np.ndarray):
+        return points.astype(np.float64).reshape(-1, 2)
+    return np.array([(point['x'], point['y']) for point in points], dtype=np.float64).reshape(-1, 2)
+
+
+def points_in_polygon(points: np.ndarray, polygon: PointList) -> np.ndarray:
+    """Ray casting test for many points against one polygon.
+
+    points: (M, 2) array; returns a boolean (M,) mask. Loops over polygon
+    edges only, so cost is O(M * K) with numpy doing the M part.
+    """
+    poly = to_array(polygon)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    inside = np.zeros(points.shape[0], dtype=bool)
+    if poly.shape[0] < 3:
+        return inside
+
+    x = points[:, 0]
+    y = points[:, 1]
+    x1, y1 = poly[-1]
+    for x2, y2 in poly:
+        if y1 != y2:
+            crosses = (y1 > y) != (y2 > y)
+            x_intersect = (x2 - x1) * (y - y1) / (y2 - y1) + x1
+            inside ^= crosses & (x < x_intersect)
+        x1, y1 = x2, y2
+    return inside
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def segments_cross_polyline(starts: np.ndarray, ends: np.ndarray, polyline: PointList) -> np.ndarray:
+    """Test movement segments start->end against every segment of a polyline.
+
+    starts, ends: (M, 2) arrays; returns a boolean (M,) mask of segments that
+    cross the polyline. Points exactly on a line segment count as lying on
+    its negative side, so a track passing through the line fires once and
+    a track sitting on it does not fire at all.
+    """
+    line = to_array(polyline)
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+    crossed = np.zeros(starts.shape[0], dtype=bool)
+
+    px, py = starts[:, 0], starts[:, 1]
+    qx, qy = ends[:, 0], ends[:, 1]
+    for (ax, ay), (bx, by) in zip(line[:-1], line[1:]):
+        side_start = _orientation(ax, ay, bx, by, px, py) > 0
+        side_end = _orientation(ax, ay, bx, by, qx, qy) > 0
+        o3 = _orientation(px, py, qx, qy, ax, ay)
+        o4 = _orientation(px, py, qx, qy, bx, by)
+        crossed |= (side_start != side_end) & (o3 * o4 <= 0)
+    return crossed
+
+
+def pack_polygons(polygons: List[PointList]) -> np.ndarray:
+    """Pack polygons into a padded (Z, V, 4) array of x1, y1, x2, y2 edges.
+
+    Padding edges are horizontal (y1 == y2) and never cross a ray, so
+    polygons with different vertex counts can be tested together.
+    """
+    arrays = [to_array(polygon) for polygon in polygons]
+    width = max([array.shape[0] for array in arrays] + [1])
+    edges = np.zeros((len(arrays), width, 4), dtype=np.float64)
+    for index, array in enumerate(arrays):
+        if array.shape[0] < 3:
+            continue
+        count = array.shape[0]
+        edges[index, :count, :2] = np.roll(array, 1, axis=0)
+        edges[index, :count, 2:] = array
+    return edges
+
+
+def points_in_polygons(points: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Ray casting test for many points against many packed polygons at once.
+
+    points: (M, 2) array, edges: output of pack_polygons(); returns a
+    boolean (M, Z) mask in a single broadcast over points x polygons x edges.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if points.shape[0] == 0 or edges.shape[0] == 0:
+        return np.zeros((points.shape[0], edges.shape[0]), dtype=bool)
+
+    x = points[:, 0, None, None]
+    y = points[:, 1, None, None]
+    x1, y1, x2, y2 = (edges[None, :, :, i] for i in range(4))
+    crosses = (y1 > y) != (y2 > y)
+    dy = np.where(crosses, y2 - y1, 1.0)
+    x_intersect = (x2 - x1) * (y - y1) / dy + x1
+    return (crosses & (x < x_intersect)).sum(axis=2) % 2 == 1
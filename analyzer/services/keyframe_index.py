@@ -0,0 +1,69 @@
+# services/keyframe_index.py
+from typing import Dict, Any, List, Tuple, Optional
+import struct
+import av
+
+
+# Segments are written as fragmented MP4: a header (ftyp, moov) and then one
+# moof+mdat fragment per group of pictures. Each fragment plays after the
+# header on its own, so any time range is the header plus a byte range.
+FRAGMENTED_MP4_OPTIONS = {'movflags': 'frag_keyframe+empty_moov+default_base_moof'}
+
+
+def top_level_boxes(path: str) -> List[Tuple[bytes, int, int, int]]:
+    """(type, offset, size, header size) of the top-level boxes of an MP4 file"""
+    boxes = []
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            size, box_type = struct.unpack('>I4s', f.read(8))
+            header_size = 8
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0]
+                header_size = 16
+            elif size == 0:
+                size = file_size - offset
+            if size < header_size:
+                break
+            boxes.append((box_type, offset, size, header_size))
+            offset += size
+    return boxes
+
+
+def build_keyframe_index(path: str) -> Optional[Dict[str, Any]]:
+    """Byte offsets of a fragmented MP4's keyframe fragments by time
+
+    Returns ``{'init_size', 'data_end', 'keyframes': [[seconds, offset], ...]}``:
+    the header is bytes ``[0, init_size)``, and a fragment starting at a
+    keyframe of ``seconds`` (presentation time from the file start) begins
+    at ``offset``; fragments end at ``data_end``. Packets are only demuxed,
+    not decoded. None for files that are not fragmented.
+    """
+    boxes = top_level_boxes(path)
+    fragments = {}  # offset of a fragment's first sample -> offset of its moof
+    moof_offset = None
+    data_end = None
+    for box_type, offset, size, header_size in boxes:
+        if box_type == b'moof':
+            moof_offset = offset
+        elif box_type == b'mdat' and moof_offset is not None:
+            fragments[offset + header_size] = moof_offset
+            data_end = offset + size
+    if not fragments:
+        return None
+
+    keyframes = []
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        for packet in container.demux(stream):
+            if packet.is_keyframe and packet.pts is not None and packet.pos in fragments:
+                keyframes.append([round(float(packet.pts * stream.time_base), 3), fragments[packet.pos]])
+    return {
+        'version': 1,
+        'init_size': min(fragments.values()),
+        'data_end': data_end,
+        'keyframes': keyframes
+    }
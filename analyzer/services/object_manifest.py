@@ -0,0 +1,109 @@
+# services/object_manifest.py
+from typing import Dict, Any, Iterator, Iterable, Optional
+from datetime import datetime
+import sqlite3
+import threading
+from .storage_service import StorageService
+
+
+class ObjectManifest:
+    """Local SQLite index of the objects in the bucket.
+
+    ``sync(prefix)`` lists only the objects named after the last one
+    indexed under the prefix, so refreshing a camera's recordings costs one
+    short listing instead of a walk over millions of keys. Queries then
+    run against the local file. Object names under the recording and clip
+    prefixes grow with time, which is what makes the incremental listing
+    complete; objects uploaded out of order (segments resumed after a
+    restart) are picked up by a ``full`` sync. Deleted objects are not
+    listed again, so callers that delete pass them to ``remove``.
+    """
+
+    def __init__(self, storage_service: StorageService, path: str):
+        self.storage_service = storage_service
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS objects (
+                object_name TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_modified TEXT,
+                etag TEXT
+            )
+        """)
+        self.connection.commit()
+
+    def sync(self, prefix: str, full: bool = False, batch_size: int = 1000) -> int:
+        """Index objects added under the prefix since the last sync; returns how many were listed"""
+        start_after = None if full else self.last_name(prefix)
+        listed = 0
+        batch = []
+        for obj in self.storage_service.iter_objects(prefix, start_after):
+            batch.append((
+                obj['object_name'], obj['size'],
+                obj['last_modified'].isoformat() if obj['last_modified'] else None,
+                obj['etag']
+            ))
+            if len(batch) >= batch_size:
+                listed += self._insert(batch)
+                batch = []
+        if batch:
+            listed += self._insert(batch)
+        return listed
+
+    def last_name(self, prefix: str) -> Optional[str]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT max(object_name) FROM objects WHERE object_name >= ? AND object_name < ?",
+                (prefix, _prefix_end(prefix))
+            ).fetchone()
+        return row[0]
+
+    def objects(self, prefix: str = "", start_after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Indexed objects under the prefix in name order, read from the index a page at a time"""
+        lower = max(prefix, start_after + '\0') if start_after is not None else prefix
+        while True:
+            with self._lock:
+                rows = self.connection.execute(
+                    "SELECT object_name, size, last_modified, etag FROM objects "
+                    "WHERE object_name >= ? AND object_name < ? ORDER BY object_name LIMIT 1000",
+                    (lower, _prefix_end(prefix))
+                ).fetchall()
+            if not rows:
+                return
+            yield from (_row_object(row) for row in rows)
+            lower = rows[-1][0] + '\0'
+
+    def remove(self, object_names: Iterable[str]):
+        with self._lock:
+            self.connection.executemany("DELETE FROM objects WHERE object_name = ?",
+                                        ((name,) for name in object_names))
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _insert(self, batch) -> int:
+        with self._lock:
+            self.connection.executemany("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)", batch)
+            self.connection.commit()
+        return len(batch)
+
+
+def _prefix_end(prefix: str) -> str:
+    """Smallest string greater than every string starting with the prefix"""
+    if not prefix:
+        return '\U0010ffff'
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _row_object(row) -> Dict[str, Any]:
+    object_name, size, last_modified, etag = row
+    return {
+        'object_name': object_name,
+        'size': size,
+        'last_modified': datetime.fromisoformat(last_modified) if last_modified else None,
+        'etag': etag
+    }
@@ -0,0 +1,283 @@
+# services/occupancy_service.py
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+import numpy as np
+from .geometry import pack_polygons, points_in_polygons
+from .tracking_service import Track
+
+
+# (zone_id, camera_id, bucket start, peak count, mean count, samples)
+OccupancyRow = Tuple[str, str, datetime, int, float, int]
+
+
+class OccupancySeries:
+    """Ring buffer of per-zone occupancy aggregated into fixed time buckets.
+
+    Slot i holds bucket number ``buckets[i]`` (-1 when empty) with the peak
+    and summed counts of every zone, so memory is fixed at ``length`` buckets
+    no matter how long a camera runs between flushes.
+    """
+
+    def __init__(self, zone_count: int, bucket_seconds: float = 1.0, length: int = 3600):
+        self.bucket_seconds = bucket_seconds
+        self.length = length
+        self.buckets = np.full(length, -1, dtype=np.int64)
+        self.peak = np.zeros((length, zone_count), dtype=np.int32)
+        self.total = np.zeros((length, zone_count), dtype=np.float64)
+        self.samples = np.zeros(length, dtype=np.int32)
+        self.dropped = 0
+
+    def add(self, timestamps: np.ndarray, counts: np.ndarray):
+        """Aggregate counts (F, Z) observed at epoch timestamps (F,)
+
+        The samples must span fewer than ``length`` buckets; older unflushed
+        buckets whose slot is reused are dropped and counted in ``dropped``.
+        """
+        if timestamps.size == 0:
+            return
+        buckets = np.floor(timestamps / self.bucket_seconds).astype(np.int64)
+        slots = buckets % self.length
+
+        # Reset slots that still hold an older bucket
+        stale = np.unique(slots[self.buckets[slots] != buckets])
+        self.dropped += int(np.count_nonzero(self.buckets[stale] >= 0))
+        self.buckets[stale] = -1
+        self.peak[stale] = 0
+        self.total[stale] = 0
+        self.samples[stale] = 0
+
+        self.buckets[slots] = buckets
+        np.maximum.at(self.peak, slots, counts)
+        np.add.at(self.total, slots, counts)
+        np.add.at(self.samples, slots, 1)
+
+    def drain(self, before_bucket: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Remove and return completed buckets, oldest first
+
+        Returns bucket numbers (B,), peaks (B, Z), means (B, Z) and samples (B,).
+        All filled buckets are returned when before_bucket is None.
+        """
+        filled = self.buckets >= 0
+        if before_bucket is not None:
+            filled &= self.buckets < before_bucket
+        slots = np.flatnonzero(filled)
+        slots = slots[np.argsort(self.buckets[slots])]
+
+        result = (
+            self.buckets[slots].copy(),
+            self.peak[slots].copy(),
+            self.total[slots] / self.samples[slots, None],
+            self.samples[slots].copy(),
+        )
+        self.buckets[slots] = -1
+        self.peak[slots] = 0
+        self.total[slots] = 0
+        self.samples[slots] = 0
+        return result
+
+
+class CameraOccupancy:
+    """Packed zone geometry, class filters and occupancy series of one camera"""
+
+    def __init__(self, camera_id: str, zones: List[Dict], bucket_seconds: float, length: int):
+        self.camera_id = camera_id
+        self.zone_ids = [str(zone['id']) for zone in zones]
+        self.zone_index = {zone_id: index for index, zone_id in enumerate(self.zone_ids)}
+        self.allowed_objects = [set(zone.get('allowed_objects') or []) for zone in zones]
+        self.edges = pack_polygons([zone['polygon'] for zone in zones])
+        self.signature = self.make_signature(zones)
+        self.series = OccupancySeries(len(zones), bucket_seconds, length)
+        self.counts = np.zeros(len(zones), dtype=np.int32)
+        self.last_bucket: Optional[int] = None
+
+    @staticmethod
+    def make_signature(zones: List[Dict]) -> tuple:
+        return tuple((str(zone['id']), str(zone['polygon']), tuple(zone.get('allowed_objects') or []))
+                     for zone in zones)
+
+    def class_mask(self, class_names: np.ndarray) -> np.ndarray:
+        """(M, Z) mask of rows whose class each zone counts (all classes when unrestricted)"""
+        unique, inverse = np.unique(class_names, return_inverse=True)
+        table = np.array([[not allowed or name in allowed for allowed in self.allowed_objects]
+                          for name in unique.tolist()], dtype=bool).reshape(len(unique), len(self.zone_ids))
+        return table[inverse.reshape(-1)]
+
+    def frame_counts(self, frame: np.ndarray, frame_count: int, xy: np.ndarray,
+                     class_names: np.ndarray) -> np.ndarray:
+        """Per-frame zone counts (F, Z) of rows with frame numbers 0..F-1"""
+        zone_count = len(self.zone_ids)
+        inside = points_in_polygons(xy, self.edges) & self.class_mask(class_names)
+        rows, zones = np.nonzero(inside)
+        return np.bincount(frame[rows] * zone_count + zones,
+                           minlength=frame_count * zone_count).reshape(frame_count, zone_count)
+
+
+class OccupancyService:
+    """Service class for counting objects in every zone of a camera.
+
+    Each frame costs one broadcast point-in-polygon test of all tracks
+    against all zones; counts are aggregated into one-second buckets that
+    are drained in bulk by flush().
+    """
+
+    def __init__(self, bucket_seconds: float = 1.0, series_length: int = 3600):
+        self.bucket_seconds = bucket_seconds
+        self.series_length = series_length
+        self.cameras: Dict[str, CameraOccupancy] = {}
+        self._pending: List[OccupancyRow] = []
+
+    def _camera(self, camera_id: str, zones: List[Dict]) -> CameraOccupancy:
+        """Per-camera state, rebuilt (after draining its series) when zones change"""
+        state = self.cameras.get(camera_id)
+        if state is not None and state.signature == CameraOccupancy.make_signature(zones):
+            return state
+        if state is not None:
+            self._pending.extend(self._rows(state, state.series.drain()))
+        state = CameraOccupancy(camera_id, zones, self.bucket_seconds, self.series_length)
+        self.cameras[camera_id] = state
+        return state
+
+    def update(self, camera_id: str, zones: List[Dict], tracks: List[Track],
+               frame_time: datetime) -> Dict[str, int]:
+        """Count the frame's tracks in every zone and return counts by zone id"""
+        state = self._camera(camera_id, zones)
+        if not state.zone_ids:
+            return {}
+
+        # The tracker can hand back the same track twice in one frame
+        unique_tracks = list({track.track_id: track for track in tracks}.values())
+        xy = np.array([track.center_history[-1] for track in unique_tracks], dtype=np.float64).reshape(-1, 2)
+        class_names = np.array([track.class_name for track in unique_tracks], dtype=str)
+        counts = state.frame_counts(np.zeros(len(unique_tracks), dtype=np.int64), 1, xy, class_names)
+
+        timestamp = frame_time.timestamp()
+        state.series.add(np.array([timestamp]), counts)
+        state.counts = counts[0]
+        state.last_bucket = int(timestamp // self.bucket_seconds)
+        return dict(zip(state.zone_ids, state.counts.tolist()))
+
+    def get_counts(self, camera_id: str) -> Dict[str, int]:
+        """Latest counts by zone id of a camera"""
+        state = self.cameras.get(camera_id)
+        if state is None:
+            return {}
+        return dict(zip(state.zone_ids, state.counts.tolist()))
+
+    def trajectory_counts(self, camera_id: str, zones: List[Dict],
+                          trajectories) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """Zone counts at every frame of offline trajectories
+
+        Returns frame offsets (F,), counts (F, Z) and the zone ids of the columns.
+        """
+        state = CameraOccupancy(camera_id, zones, self.bucket_seconds, 1)
+        times, frame = np.unique(trajectories.t, return_inverse=True)
+        frame = frame.reshape(-1).astype(np.int64)
+        if not state.zone_ids or times.size == 0:
+            return times, np.zeros((times.size, len(state.zone_ids)), dtype=np.int64), state.zone_ids
+
+        # One row per track and frame
+        _, unique_rows = np.unique(np.column_stack((frame, trajectories.row_track)), axis=0, return_index=True)
+        class_names = np.asarray(trajectories.class_names, dtype=str)[trajectories.class_index[unique_rows]] \
+            if trajectories.class_names else np.zeros(0, dtype=str)
+        counts = state.frame_counts(frame[unique_rows], times.size, trajectories.xy[unique_rows], class_names)
+        return times, counts, state.zone_ids
+
+    def record_trajectories(self, camera_id: str, zones: List[Dict], trajectories) -> int:
+        """Aggregate an offline file's occupancy into pending rows for the next flush"""
+        times, counts, zone_ids = self.trajectory_counts(camera_id, zones, trajectories)
+        if not zone_ids or times.size == 0:
+            return 0
+
+        timestamps = trajectories.start_time.timestamp() + times
+        series = OccupancySeries(len(zone_ids), self.bucket_seconds, self.series_length)
+        buckets = np.floor(timestamps / self.bucket_seconds).astype(np.int64)
+        # Feed at most one ring buffer worth of buckets at a time
+        chunk = (buckets - buckets[0]) // self.series_length
+        boundaries = np.flatnonzero(np.diff(chunk)) + 1
+        pending_before = len(self._pending)
+        for rows in np.split(np.arange(times.size), boundaries):
+            series.add(timestamps[rows], counts[rows])
+            self._pending.extend(self._rows_for(camera_id, zone_ids, series.drain()))
+        return len(self._pending) - pending_before
+
+    def flush(self, camera_id: Optional[str] = None, final: bool = False) -> List[OccupancyRow]:
+        """Drain completed buckets (all buckets when final) of one or every camera"""
+        rows, self._pending = self._pending, []
+        cameras = [self.cameras[camera_id]] if camera_id in self.cameras else \
+            ([] if camera_id is not None else list(self.cameras.values()))
+        for state in cameras:
+            before = None if final or state.last_bucket is None else state.last_bucket
+            rows.extend(self._rows(state, state.series.drain(before)))
+        return rows
+
+    def _rows(self, state: CameraOccupancy, drained) -> List[OccupancyRow]:
+        return self._rows_for(state.camera_id, state.zone_ids, drained)
+
+    def _rows_for(self, camera_id: str, zone_ids: List[str], drained) -> List[OccupancyRow]:
+        buckets, peaks, means, samples = drained
+        rows = []
+        for bucket, peak, mean, sample_count in zip(buckets.tolist(), peaks.tolist(), means.tolist(),
+                                                    samples.tolist()):
+            bucket_start = datetime.fromtimestamp(bucket * self.bucket_seconds, tz=timezone.utc)
+            for zone_id, zone_peak, zone_mean in zip(zone_ids, peak, mean):
+                rows.append((zone_id, camera_id, bucket_start, int(zone_peak), round(zone_mean, 3), sample_count))
+        return rows
+
+
+def hysteresis_mask(counts: np.ndarray, limit: int, hysteresis: int) -> np.ndarray:
+    """Over-capacity state over a count series
+
+    The state turns on when a count exceeds limit and off only once it drops
+    to limit - hysteresis or below; in between the previous state holds.
+    """
+    above = counts > limit
+    below = counts <= limit - hysteresis
+    decided = np.where(above | below, np.arange(counts.size), -1)
+    last_decision = np.maximum.accumulate(decided) if counts.size else decided
+    return np.where(last_decision >= 0, above[np.maximum(last_decision, 0)], False)
+
+
+def capacity_limit(rule: Dict) -> Tuple[int, int]:
+    """Capacity of a counting rule's zone and its hysteresis (limit 0 = unlimited)
+
+    conditions.max_objects overrides the zone's max_objects; the alarm
+    clears once the count drops to limit - conditions.hysteresis (default 1).
+    """
+    zone = rule.get('_zone') or {}
+    conditions = rule.get('conditions') or {}
+    limit = int(conditions.get('max_objects') or zone.get('max_objects') or 0)
+    hysteresis = max(1, int(conditions.get('hysteresis', 1)))
+    return limit, hysteresis
+
+
+def occupancy_event(rule: Dict, frame_time: datetime, count: int, limit: int,
+                    class_names: List[str], bboxes: np.ndarray, confidences: np.ndarray) -> Dict[str, Any]:
+    """Over-capacity event of a counting rule in the engine's event format
+
+    The event covers the objects counted in the zone: the most common class,
+    the union of their boxes and their mean confidence.
+    """
+    zone = rule['_zone']
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    if len(class_names):
+        names, occurrences = np.unique(np.asarray(class_names, dtype=str), return_counts=True)
+        object_class = str(names[np.argmax(occurrences)])
+        bbox = (*bboxes[:, :2].min(axis=0).tolist(), *bboxes[:, 2:].max(axis=0).tolist())
+        confidence = float(np.mean(confidences))
+    else:
+        object_class, bbox, confidence = 'object', (0.0, 0.0, 0.0, 0.0), 0.0
+    return {
+        'rule_id': rule['id'],
+        'camera_id': rule['camera_id'],
+        'timestamp': frame_time.isoformat(),
+        'object_class': object_class,
+        'track_id': None,
+        'bbox': bbox,
+        'confidence': confidence,
+        'severity': rule['severity'],
+        'rule_type': rule['rule_type'],
+        'zone_id': str(zone['id']),
+        'count': int(count),
+        'max_objects': limit,
+        'message': f"{count} objects in zone {zone.get('name', zone['id'])} (max {limit}) at {frame_time}"
+    }
@@ -0,0 +1,140 @@
+# services/packet_service.py
+from typing import List, Iterator, Tuple, Optional, NamedTuple
+from collections import deque
+from fractions import Fraction
+import io
+import time
+import av
+import numpy as np
+
+
+class BufferedPacket(NamedTuple):
+    """A compressed packet with its arrival time and original timestamps"""
+    time: float  # wall clock, epoch seconds
+    pts: Optional[int]
+    dts: Optional[int]
+    time_base: Fraction
+    is_keyframe: bool
+    packet: av.Packet
+
+
+class PacketSource:
+    """Demuxes a camera stream with PyAV.
+
+    Yields compressed video packets as they arrive and decodes them on
+    request, so the same connection feeds detection (decoded frames) and
+    recording or clips (packets copied as they are, without re-encoding).
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        options = {'rtsp_transport': 'tcp'} if url.startswith('rtsp') else {}
+        self.container = av.open(url, options=options, timeout=timeout)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+
+    @property
+    def fps(self) -> float:
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        return float(rate) if rate else 0.0
+
+    @property
+    def resolution(self) -> str:
+        return f"{self.stream.codec_context.width}x{self.stream.codec_context.height}"
+
+    def packets(self) -> Iterator[Tuple[av.Packet, float]]:
+        """Video packets with their arrival time; ends with the stream
+
+        The last packet is empty and only flushes the decoder.
+        """
+        for packet in self.container.demux(self.stream):
+            yield packet, time.time()
+
+    def decode(self, packet: av.Packet) -> List[np.ndarray]:
+        """BGR frames decoded from one packet (often one, none while the decoder fills up)"""
+        return [frame.to_ndarray(format='bgr24') for frame in packet.decode()]
+
+    def close(self):
+        self.container.close()
+
+
+def probe_frame_shape(url: str, timeout: float = 10.0) -> Tuple[int, int]:
+    """(height, width) of a stream's video, read from its headers without decoding"""
+    source = PacketSource(url, timeout)
+    try:
+        height, width = source.stream.codec_context.height, source.stream.codec_context.width
+    finally:
+        source.close()
+    if not height or not width:
+        raise ValueError(f"Stream {url} does not report its resolution")
+    return height, width
+
+
+class PacketRingBuffer:
+    """The last ``seconds`` of compressed packets of one camera.
+
+    Packets are dropped a whole group of pictures at a time, so the buffer
+    always starts at a keyframe and anything cut from it can be decoded.
+    A few megabytes per camera instead of hundreds for decoded frames.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.packets: deque = deque()
+        self._keyframes: deque = deque()  # arrival times of keyframes in the buffer
+
+    def append(self, packet: av.Packet, packet_time: float):
+        if packet.dts is None:
+            return
+        if packet.is_keyframe:
+            self._keyframes.append(packet_time)
+        elif not self._keyframes:
+            # Nothing decodable before the first keyframe
+            return
+        self.packets.append(BufferedPacket(packet_time, packet.pts, packet.dts, packet.time_base,
+                                           packet.is_keyframe, packet))
+
+        # Drop the oldest group while the next one still covers the window
+        cutoff = packet_time - self.seconds
+        while len(self._keyframes) > 1 and self._keyframes[1] <= cutoff:
+            self._keyframes.popleft()
+            self.packets.popleft()
+            while not self.packets[0].is_keyframe:
+                self.packets.popleft()
+
+    def slice(self, start: float, end: float) -> List[BufferedPacket]:
+        """Packets from the last keyframe at or before ``start`` up to ``end``"""
+        packets = list(self.packets)
+        first = 0
+        for index, buffered in enumerate(packets):
+            if buffered.time > start:
+                break
+            if buffered.is_keyframe:
+                first = index
+        return [buffered for buffered in packets[first:] if buffered.time <= end]
+
+    def clear(self):
+        self.packets.clear()
+        self._keyframes.clear()
+
+
+def mux_packets(template: av.video.stream.VideoStream, packets: List[BufferedPacket]) -> bytes:
+    """MP4 of the packets, stream-copied with timestamps rebased to zero
+
+    Packets keep their original timestamps in the buffer, so overlapping
+    clips can be cut from it one after another; not thread-safe.
+    """
+    output_buffer = io.BytesIO()
+    base = next((buffered.dts for buffered in packets if buffered.dts is not None), 0)
+    with av.open(output_buffer, 'w', format='mp4') as output:
+        stream = output.add_stream(template=template)
+        for buffered in packets:
+            if buffered.dts is None:
+                continue
+            # Muxing rebases the packet in place; start again from the originals
+            packet = buffered.packet
+            packet.time_base = buffered.time_base
+            packet.pts = buffered.pts - base if buffered.pts is not None else None
+            packet.dts = buffered.dts - base
+            packet.stream = stream
+            output.mux(packet)
+    return output_buffer.getvalue()
@@ -0,0 +1,225 @@
+# services/recording_service.py
+from typing import Dict, Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+import av
+from .packet_service import PacketSource
+from .keyframe_index import build_keyframe_index, FRAGMENTED_MP4_OPTIONS
+from .storage_service import StorageService, recording_prefix
+
+
+class SegmentWriter:
+    """One fragmented MP4 segment written by stream copy, with timestamps starting at zero"""
+
+    def __init__(self, path: str, source: PacketSource, start_time: float, video_file_id: str):
+        self.path = path
+        self.video_file_id = video_file_id
+        self.source = source
+        self.start_time = start_time
+        self.output = av.open(path, 'w', format='mp4', options=FRAGMENTED_MP4_OPTIONS)
+        self.stream = self.output.add_stream(template=source.stream)
+        self.base: Optional[int] = None
+        self.last_dts = 0
+
+    def write(self, packet: av.Packet):
+        if self.base is None:
+            self.base = packet.dts
+        self.last_dts = packet.dts
+        if packet.pts is not None:
+            packet.pts -= self.base
+        packet.dts -= self.base
+        packet.stream = self.stream
+        self.output.mux(packet)
+
+    def close(self) -> Dict[str, Any]:
+        """Finish the file and return its VideoFile fields"""
+        self.output.close()
+        duration = float((self.last_dts - (self.base or 0)) * self.source.stream.time_base)
+        if self.source.fps:
+            duration += 1 / self.source.fps
+        start_time = datetime.fromtimestamp(self.start_time, timezone.utc)
+        return {
+            'start_time': start_time.isoformat(),
+            'end_time': (start_time + timedelta(seconds=duration)).isoformat(),
+            'duration': round(duration, 3),
+            'file_size': os.path.getsize(self.path),
+            'fps': self.source.fps,
+            'resolution': self.source.resolution
+        }
+
+
+class RecordingService:
+    """Continuous recording of camera streams into fixed-length segments.
+
+    Each camera gets a thread that demuxes its main stream and writes the
+    packets as they are into local MP4 segments of ``segment_seconds``,
+    cut at the first keyframe after that length: no decoding and no
+    encoding, so a recording costs a fraction of an analysed stream.
+    Finished segments are uploaded to MinIO by a pool of ``upload_workers``
+    and announced with a 'video_file' message, from which the backend
+    registers VideoFile rows in batches. Segments not yet uploaded keep a
+    JSON sidecar on disk and are picked up again after a restart.
+
+    Segments are fragmented MP4 with a fragment per keyframe, uploaded
+    with a keyframe index (``<segment>.index.json``) so the backend can
+    serve any time range of a segment by fetching only its fragments.
+    """
+
+    def __init__(self, storage_service: StorageService, publish_video_file: Callable[[Dict[str, Any]], Any],
+                 directory: str = 'recordings', segment_seconds: float = 60.0, upload_workers: int = 4,
+                 reconnect_delay: float = 5.0, retry_delay: float = 10.0):
+        self.storage_service = storage_service
+        self.publish_video_file = publish_video_file
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.reconnect_delay = reconnect_delay
+        self.retry_delay = retry_delay
+        self.recordings: Dict[str, threading.Event] = {}
+        self._threads: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._uploads = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='segment-upload')
+        os.makedirs(directory, exist_ok=True)
+        self._resume_uploads()
+
+    def start(self, camera_id: str, stream_url: str):
+        """Start recording the camera; a running recording is left alone"""
+        with self._lock:
+            if camera_id in self.recordings:
+                return
+            stopped = self.recordings[camera_id] = threading.Event()
+        thread = threading.Thread(target=self._record, args=(camera_id, stream_url, stopped),
+                                  name=f'record-{camera_id}', daemon=True)
+        self._threads[camera_id] = thread
+        thread.start()
+        print(f"Started recording camera {camera_id}")
+
+    def stop(self, camera_id: str):
+        """Stop recording; the current segment is closed and uploaded"""
+        with self._lock:
+            stopped = self.recordings.pop(camera_id, None)
+        if stopped is not None:
+            stopped.set()
+            print(f"Stopping recording of camera {camera_id}")
+
+    def running(self):
+        return list(self.recordings)
+
+    def _record(self, camera_id: str, stream_url: str, stopped: threading.Event):
+        camera_directory = os.path.join(self.directory, camera_id)
+        os.makedirs(camera_directory, exist_ok=True)
+        while not stopped.is_set():
+            try:
+                source = PacketSource(stream_url)
+            except av.error.FFmpegError as e:
+                print(f"Failed to open stream of camera {camera_id} for recording: {e}")
+                stopped.wait(self.reconnect_delay)
+                continue
+
+            segment = None
+            try:
+                for packet, packet_time in source.packets():
+                    if stopped.is_set():
+                        break
+                    if packet.dts is None:
+                        continue
+                    # Segments start at keyframes so each file plays on its own
+                    if packet.is_keyframe and (segment is None or
+                                               packet_time - segment.start_time >= self.segment_seconds):
+                        if segment is not None:
+                            self._finish_segment(camera_id, segment)
+                            segment = None
+                        segment = self._new_segment(camera_directory, source, packet_time)
+                    if segment is not None:
+                        segment.write(packet)
+            except av.error.FFmpegError as e:
+                print(f"Recording of camera {camera_id} interrupted: {e}")
+            finally:
+                if segment is not None:
+                    self._finish_segment(camera_id, segment)
+                source.close()
+            if not stopped.is_set():
+                stopped.wait(self.reconnect_delay)
+        print(f"Stopped recording camera {camera_id}")
+
+    @staticmethod
+    def _new_segment(camera_directory: str, source: PacketSource, start_time: float) -> SegmentWriter:
+        video_file_id = str(uuid.uuid4())
+        name = f"{datetime.fromtimestamp(start_time, timezone.utc):%Y%m%d_%H%M%S}_{video_file_id}.mp4"
+        return SegmentWriter(os.path.join(camera_directory, name), source, start_time, video_file_id)
+
+    def _finish_segment(self, camera_id: str, segment: SegmentWriter):
+        try:
+            metadata = segment.close()
+        except av.error.FFmpegError as e:
+            print(f"Error closing segment {segment.path}: {e}")
+            return
+        name = os.path.basename(segment.path)
+        day = datetime.fromtimestamp(segment.start_time, timezone.utc).date()
+        storage_path = recording_prefix(camera_id, day) + name
+        metadata.update({
+            'type': 'video_file',
+            'video_file_id': segment.video_file_id,
+            'camera_id': camera_id,
+            'storage_path': storage_path,
+            'index_path': ''
+        })
+        try:
+            index = build_keyframe_index(segment.path)
+        except (av.error.FFmpegError, OSError) as e:
+            print(f"Error indexing segment {segment.path}: {e}")
+            index = None
+        if index is not None:
+            with open(segment.path + '.index.json', 'w') as f:
+                json.dump(index, f)
+            metadata['index_path'] = storage_path + '.index.json'
+        # The sidecar is written last: a segment with one is complete
+        with open(segment.path + '.json', 'w') as f:
+            json.dump(metadata, f)
+        self._uploads.submit(self._upload, segment.path, metadata)
+
+    def _resume_uploads(self):
+        """Queue segments left on disk by an earlier run; unfinished ones cannot be played and are removed"""
+        for path in glob.glob(os.path.join(self.directory, '*', '*.mp4')):
+            if not os.path.exists(path + '.json'):
+                os.remove(path)
+                if os.path.exists(path + '.index.json'):
+                    os.remove(path + '.index.json')
+        for sidecar in sorted(glob.glob(os.path.join(self.directory, '*', '*.mp4.json'))):
+            try:
+                with open(sidecar) as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable segment metadata {sidecar}: {e}")
+                continue
+            self._uploads.submit(self._upload, sidecar[:-len('.json')], metadata)
+
+    def _upload(self, path: str, metadata: Dict[str, Any]):
+        """Upload a segment until it succeeds, then announce it and free the disk"""
+        uploads = [(path, metadata['storage_path'])]
+        if metadata.get('index_path'):
+            uploads.append((path + '.index.json', metadata['index_path']))
+        for local_path, object_name in uploads:
+            while True:
+                result = self.storage_service.upload_video(local_path, object_name)
+                if result['status'] == 'uploaded':
+                    break
+                print(f"Error uploading {local_path}, retrying: {result['error']}")
+                time.sleep(self.retry_delay)
+        self.publish_video_file(metadata)
+        for local_path, _ in uploads:
+            os.remove(local_path)
+        os.remove(path + '.json')
+
+    def close(self):
+        """Stop all recordings and wait for their segments to upload"""
+        for camera_id in list(self.recordings):
+            self.stop(camera_id)
+        for thread in list(self._threads.values()):
+            thread.join()
+        self._uploads.shutdown(wait=True)
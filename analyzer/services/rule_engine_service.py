@@ -1,25 +1,60 @@
 # services/rule_engine_service.py
-from typing import List, Dict, Any, Tuple
-from datetime import datetime
+from typing import List, Dict, Any, Tuple, Optional
+from datetime import datetime, timezone
+import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import numpy as np
 from .detection_service import Detection
-from .tracking_service import Track
+from .tracking_service import Track, TrackHistoryBuffer
+from .geometry import points_in_polygon, segments_cross_polyline
+from .trajectory_rule_service import Trajectories, TrajectoryRuleService
+from .condition_compiler import compile_condition, features_from_tracks, ConditionSyntaxError
+from .speed_service import SpeedEstimationService, homography_from_calibration, speed_threshold, speed_mask
+from .occupancy_service import OccupancyService, capacity_limit, occupancy_event
+from .static_object_service import StaticObject
+from .spatial_index import RuleGridIndex
+from .schedule_service import RuleSchedule, ActivationCalendar, ScheduleError
+from .rule_metrics_service import RuleMetricsService
 
 
 class RuleEngineService:
     """Service class for handling rule evaluation and event generation"""
     
-    def __init__(self, db_connection_params: Dict[str, Any]):
+    def __init__(self, db_connection_params: Dict[str, Any], rules_cache_ttl: float = 5.0,
+                 occupancy_bucket_seconds: float = 1.0, rule_index_cell_size: float = 64.0,
+                 schedule_timezone: str = 'UTC', rule_metrics: Optional[RuleMetricsService] = None):
         self.db_connection_params = db_connection_params
         self.db_connection = psycopg2.connect(**db_connection_params)
+        self.rules_cache_ttl = rules_cache_ttl
+        self._rules_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+        self._zones_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+        self.rule_index_cell_size = rule_index_cell_size
+        self._rule_indexes: Dict[str, RuleGridIndex] = {}
+        # Timezone of rule schedules that do not name one and of hour/weekday in custom conditions
+        self.schedule_timezone = schedule_timezone
+        self._calendars: Dict[str, ActivationCalendar] = {}
+        self._calibration_cache: Dict[str, Tuple[float, Optional[np.ndarray]]] = {}
+        self.speed_service = SpeedEstimationService()
+        self.occupancy_service = OccupancyService(bucket_seconds=occupancy_bucket_seconds)
+        self.trajectory_rule_service = TrajectoryRuleService(self.speed_service, self.occupancy_service,
+                                                             schedule_timezone)
+        # Cost accounting and circuit breaker of live rules
+        self.rule_metrics = rule_metrics or RuleMetricsService()
+        # Tracks currently over the limit, per speed rule; events fire on entry
+        self._speeding: Dict[Any, set] = {}
+        # Zones currently over capacity, per counting rule
+        self._over_capacity: Dict[Any, bool] = {}
+        # Static objects already reported, per left-behind rule
+        self._left_behind: Dict[Any, set] = {}
     
-    def check_rules(self, tracks: List[Track], camera_id: str, frame_time: datetime) -> List[Dict]:
-        """Check if any rules are triggered by the detected objects"""
-        triggered_events = []
+    def get_rules(self, camera_id: str, force_reload: bool = False) -> List[Dict]:
+        """Get enabled rules for a camera, re-reading the database at most once per TTL"""
+        now = time.monotonic()
+        cached = self._rules_cache.get(camera_id)
+        if cached is not None and not force_reload and now - cached[0] < self.rules_cache_ttl:
+            return cached[1]
         
-        # Get rules for this camera from database
         cursor = self.db_connection.cursor(cursor_factory=RealDictCursor)
         cursor.execute("""
             SELECT * FROM events_rules
@@ -28,25 +63,277 @@ class RuleEngineService:
         rules = cursor.fetchall()
         cursor.close()
         
+        self.rule_metrics.rules_loaded(rules)
+        self.prepare_rules(rules, camera_id, force_reload=force_reload)
+        self._rule_indexes[camera_id] = RuleGridIndex(rules, self.rule_index_cell_size)
+        self._rules_cache[camera_id] = (now, rules)
+        return rules
+    
+    def get_zones(self, camera_id: str, force_reload: bool = False) -> List[Dict]:
+        """Get active zones for a camera, cached like rules"""
+        now = time.monotonic()
+        cached = self._zones_cache.get(camera_id)
+        if cached is not None and not force_reload and now - cached[0] < self.rules_cache_ttl:
+            return cached[1]
+        
+        cursor = self.db_connection.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            SELECT * FROM cameras_zones
+            WHERE camera_id = %s AND is_active = true
+        """, (camera_id,))
+        zones = cursor.fetchall()
+        cursor.close()
+        
+        self._zones_cache[camera_id] = (now, zones)
+        return zones
+    
+    def get_calibration(self, camera_id: str, force_reload: bool = False) -> Optional[np.ndarray]:
+        """Get the camera's ground-plane homography (None if uncalibrated), cached like rules"""
+        now = time.monotonic()
+        cached = self._calibration_cache.get(camera_id)
+        if cached is not None and not force_reload and now - cached[0] < self.rules_cache_ttl:
+            return cached[1]
+        
+        cursor = self.db_connection.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            SELECT ground_calibration FROM cameras_cameras
+            WHERE id = %s
+        """, (camera_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        
+        try:
+            homography = homography_from_calibration(row['ground_calibration'] if row else None)
+        except (TypeError, ValueError, KeyError) as e:
+            print(f"Ignoring invalid ground calibration of camera {camera_id}: {e}")
+            homography = None
+        self._calibration_cache[camera_id] = (now, homography)
+        return homography
+    
+    def reset_state(self):
+        """Forget per-track rule state, e.g. between independent replays"""
+        self._speeding = {}
+        self._over_capacity = {}
+        self._left_behind = {}
+
+    def export_state(self, camera_id: str) -> Dict[str, Any]:
+        """Per-rule latches of the camera's speed and counting rules, for a checkpoint
+
+        Left-behind latches are not exported: the background model restarts
+        with the worker and numbers its static objects anew.
+        """
+        rule_ids = [rule['id'] for rule in self.get_rules(camera_id)]
+        return {
+            'speeding': {str(rule_id): sorted(self._speeding[rule_id])
+                         for rule_id in rule_ids if self._speeding.get(rule_id)},
+            'over_capacity': [str(rule_id) for rule_id in rule_ids if self._over_capacity.get(rule_id)]
+        }
+
+    def import_state(self, camera_id: str, state: Dict[str, Any]):
+        """Restore latches exported by export_state() for rules the camera still has"""
+        rule_ids = {str(rule['id']): rule['id'] for rule in self.get_rules(camera_id)}
+        for rule_id, track_ids in state.get('speeding', {}).items():
+            if rule_id in rule_ids:
+                self._speeding[rule_ids[rule_id]] = set(track_ids)
+        for rule_id in state.get('over_capacity', []):
+            if rule_id in rule_ids:
+                self._over_capacity[rule_ids[rule_id]] = True
+
+    def prepare_rules(self, rules: List[Dict], camera_id: str, strict: bool = False,
+                      force_reload: bool = False) -> List[Dict]:
+        """Compile per-rule state once when rules are loaded
+        
+        Custom rule expressions are compiled into vectorized predicates and
+        stored under ``_condition``. Invalid expressions disable the rule, or
+        raise ConditionSyntaxError when ``strict`` is set. Counting rules get
+        their zone under ``_zone``. Schedules are parsed into ``_schedule``
+        (None when the rule is always active); an invalid schedule disables
+        the rule, or raises ScheduleError when ``strict`` is set.
+        """
+        for rule in rules:
+            if '_schedule' in rule:
+                continue
+            try:
+                rule['_schedule'] = RuleSchedule.parse(rule.get('schedule'), self.schedule_timezone)
+            except ScheduleError as e:
+                if strict:
+                    raise
+                print(f"Disabling rule {rule['id']}: {e}")
+                rule['_schedule'] = RuleSchedule(timezone.utc, [])
+        
+        custom_rules = [rule for rule in rules if rule['rule_type'] == 'custom' and '_condition' not in rule]
+        counting_rules = [rule for rule in rules if rule['rule_type'] == 'counting' and '_zone' not in rule]
+        if not custom_rules and not counting_rules:
+            return rules
+        
+        zones = self.get_zones(camera_id, force_reload=force_reload)
+        zones_by_name = {zone['name']: zone['polygon'] for zone in zones}
+        zones_by_id = {str(zone['id']): zone['polygon'] for zone in zones}
+        
+        for rule in counting_rules:
+            zone_id = str(rule.get('zone_id') or (rule.get('conditions') or {}).get('zone_id'))
+            rule['_zone'] = next((zone for zone in zones if str(zone['id']) == zone_id), None)
+            if rule['_zone'] is None:
+                print(f"Disabling counting rule {rule['id']}: no active zone {zone_id}")
+        
+        for rule in custom_rules:
+            conditions = rule.get('conditions') or {}
+            default_zone = conditions.get('zone_polygon') or zones_by_id.get(str(rule.get('zone_id')))
+            try:
+                rule['_condition'] = compile_condition(conditions.get('expression'), zones_by_name, default_zone)
+            except ConditionSyntaxError as e:
+                if strict:
+                    raise
+                print(f"Disabling custom rule {rule['id']}: {e}")
+                rule['_condition'] = None
+        return rules
+    
+    def check_rules(self, tracks: List[Track], camera_id: str, frame_time: datetime,
+                    rules: Optional[List[Dict]] = None,
+                    history: Optional[TrackHistoryBuffer] = None,
+                    static_objects: Optional[List[StaticObject]] = None) -> List[Dict]:
+        """Check if any rules are triggered by the detected objects
+        
+        ``rules`` overrides the camera's stored rules, e.g. for replays of draft rules.
+        Rules outside their schedule at frame_time are skipped.
+        ``history`` is the tracker's ring buffer of ground points used by speed rules.
+        ``static_objects`` are the camera's background-model blobs used by
+        object_left_behind rules; those rules are skipped without them.
+        Stored rules are accounted in ``rule_metrics``, which may throttle or
+        disable them; rules passed explicitly are always evaluated.
+        """
+        triggered_events = []
+        
+        live = rules is None
+        if live:
+            rules = self.get_rules(camera_id)
+            calendar = self._calendars.get(camera_id)
+            if calendar is None or calendar.rules is not rules:
+                calendar = self._calendars[camera_id] = ActivationCalendar(rules)
+            rules = calendar.active_rules(frame_time)
+        else:
+            self.prepare_rules(rules, camera_id)
+            rules = [rule for rule in rules if rule['_schedule'] is None or rule['_schedule'].is_active(frame_time)]
+        
+        # Feature table shared by all custom rules of this frame
+        features = None
+        # Speeds shared by all speed rules of this frame
+        speeds = None
+        
+        # Zone occupancy is recorded on every live frame and shared by counting rules
+        zone_counts = None
+        if live or any(rule['rule_type'] == 'counting' for rule in rules):
+            zone_counts = self.occupancy_service.update(camera_id, self.get_zones(camera_id), tracks, frame_time)
+        
+        # Tracks that can touch each line/zone, from the camera's spatial index
+        index = self._rule_indexes.get(camera_id) if live else None
+        candidates = index.candidates(tracks) if index is not None and len(index) else None
+        
         for rule in rules:
-            if rule['rule_type'] == 'line_crossing':
-                events = self._check_line_crossing_rule(tracks, rule, frame_time)
-                triggered_events.extend(events)
-            elif rule['rule_type'] == 'zone_violation':
-                events = self._check_zone_violation_rule(tracks, rule, frame_time)
-                triggered_events.extend(events)
-            elif rule['rule_type'] == 'behavior_detection':
-                events = self._check_behavior_rule(tracks, rule, frame_time)
-                triggered_events.extend(events)
-            elif rule['rule_type'] == 'loitering':
-                events = self._check_loitering_rule(tracks, rule, frame_time)
-                triggered_events.extend(events)
-            elif rule['rule_type'] == 'object_left_behind':
-                events = self._check_object_left_behind_rule(tracks, rule, frame_time)
-                triggered_events.extend(events)
+            if live and not self.rule_metrics.allowed(rule['id'], frame_time):
+                continue
+            started = time.perf_counter()
+            
+            rule_tracks = tracks
+            if candidates is not None and rule['id'] in index.rule_ids:
+                rule_tracks = candidates.get(rule['id'], [])
+            
+            events = []
+            try:
+                if rule['rule_type'] == 'line_crossing':
+                    events = self._check_line_crossing_rule(rule_tracks, rule, frame_time)
+                elif rule['rule_type'] == 'zone_violation':
+                    events = self._check_zone_violation_rule(rule_tracks, rule, frame_time)
+                elif rule['rule_type'] == 'behavior_detection':
+                    events = self._check_behavior_rule(tracks, rule, frame_time)
+                elif rule['rule_type'] == 'loitering':
+                    events = self._check_loitering_rule(tracks, rule, frame_time)
+                elif rule['rule_type'] == 'object_left_behind' and static_objects is not None:
+                    events = self._check_object_left_behind_rule(tracks, rule, frame_time, static_objects)
+                elif rule['rule_type'] == 'custom' and rule.get('_condition') is not None and tracks:
+                    if features is None:
+                        features = features_from_tracks(tracks, frame_time, self.schedule_timezone)
+                    events = self._check_custom_rule(tracks, rule, frame_time, features)
+                elif rule['rule_type'] == 'speed_detection' and history is not None:
+                    homography = self.get_calibration(camera_id)
+                    if speeds is None:
+                        speeds = self.speed_service.track_speeds(
+                            history, [track.track_id for track in tracks], homography
+                        )
+                    events = self._check_speed_rule(tracks, rule, frame_time, speeds, homography is not None)
+                elif rule['rule_type'] == 'counting' and rule.get('_zone') is not None:
+                    events = self._check_counting_rule(tracks, rule, frame_time, zone_counts)
+            except Exception as e:
+                # One broken rule must not stop the others or the stream
+                print(f"Error evaluating rule {rule['id']}: {e}")
+                events = []
+            
+            if live:
+                events = self.rule_metrics.record(rule, camera_id, frame_time, time.perf_counter() - started,
+                                                  len(rule_tracks), events)
+            triggered_events.extend(events)
+        
+        if live and self.rule_metrics.pending_disables():
+            self._persist_disabled_rules()
         
         return triggered_events
     
+    def _persist_disabled_rules(self):
+        """Disable rules tripped by the circuit breaker in the database, with the reason"""
+        cursor = self.db_connection.cursor()
+        for stats in self.rule_metrics.pending_disables():
+            try:
+                cursor.execute("""
+                    UPDATE events_rules
+                    SET enabled = false, disabled_reason = %s, updated_at = now()
+                    WHERE id = %s
+                """, (f"Отключено анализатором: {stats.reason}", stats.rule_id))
+                self.db_connection.commit()
+                stats.persisted = True
+            except psycopg2.Error as e:
+                self.db_connection.rollback()
+                print(f"Error disabling rule {stats.rule_id}: {e}")
+        cursor.close()
+    
+    def flush_occupancy(self, camera_id: Optional[str] = None, final: bool = False) -> int:
+        """Write completed occupancy buckets to the database in one statement"""
+        rows = self.occupancy_service.flush(camera_id, final)
+        if not rows:
+            return 0
+        
+        cursor = self.db_connection.cursor()
+        try:
+            execute_values(cursor, """
+                INSERT INTO cameras_zone_occupancy
+                    (zone_id, camera_id, timestamp, max_count, avg_count, samples)
+                VALUES %s
+            """, rows, page_size=1000)
+            self.db_connection.commit()
+        except psycopg2.Error as e:
+            self.db_connection.rollback()
+            print(f"Error writing {len(rows)} occupancy rows: {e}")
+            return 0
+        finally:
+            cursor.close()
+        return len(rows)
+    
+    def record_trajectory_occupancy(self, trajectories: Trajectories, camera_id: str) -> int:
+        """Queue the occupancy series of an offline file for the next flush"""
+        return self.occupancy_service.record_trajectories(camera_id, self.get_zones(camera_id), trajectories)
+    
+    def check_trajectories(self, trajectories: Trajectories, camera_id: str,
+                           rules: Optional[List[Dict]] = None) -> List[Dict]:
+        """Evaluate rules over complete trajectories of an offline file in one vectorized pass"""
+        if rules is None:
+            rules = self.get_rules(camera_id)
+        else:
+            self.prepare_rules(rules, camera_id)
+        homography = None
+        if any(rule['rule_type'] == 'speed_detection' for rule in rules):
+            homography = self.get_calibration(camera_id)
+        # Rule schedules are applied inside the evaluation, before edge detection
+        return self.trajectory_rule_service.evaluate(trajectories, rules, homography)
+    
     def _check_line_crossing_rule(self, tracks: List[Track], rule: Dict, frame_time: datetime) -> List[Dict]:
         """Check line crossing rule"""
         events = []
@@ -62,8 +349,7 @@ class RuleEngineService:
                 prev_center = track.center_history[-2]
                 curr_center = track.center_history[-1]
                 
-                # Check if line is crossed (simplified algorithm)
-                # In real implementation, use proper line intersection algorithm
+                # Check if the movement segment crosses the line
                 if self._line_crossed(prev_center, curr_center, line_points):
                     event = {
                         'rule_id': rule['id'],
@@ -87,13 +373,15 @@ class RuleEngineService:
         
         # Parse zone coordinates from rule conditions
         zone_polygon = rule['conditions'].get('zone_polygon', [])
-        if not zone_polygon:
+        if not zone_polygon or not tracks:
             return events
         
-        for track in tracks:
-            # Check if object is in zone (simplified point-in-polygon check)
-            center = track.center_history[-1]
-            if self._point_in_polygon(center, zone_polygon):
+        # Test all track centers against the zone at once
+        centers = np.array([track.center_history[-1] for track in tracks], dtype=np.float64)
+        in_zone = points_in_polygon(centers, zone_polygon)
+        
+        for track, inside in zip(tracks, in_zone):
+            if inside:
                 # Check allowed/forbidden objects
                 allowed_objects = rule['conditions'].get('allowed_objects', [])
                 forbidden_objects = rule['conditions'].get('forbidden_objects', [])
@@ -126,21 +414,17 @@ class RuleEngineService:
     def _check_loitering_rule(self, tracks: List[Track], rule: Dict, frame_time: datetime) -> List[Dict]:
         """Check loitering detection rule"""
         events = []
+        window = int(rule['conditions'].get('window_frames', 10))
+        loitering_distance = float(rule['conditions'].get('max_distance', 50))
         
         for track in tracks:
             # Check if object has been in same area for too long
-            if len(track.center_history) > 10:  # At least 10 frames
-                # Calculate average position
-                avg_x = sum([center[0] for center in track.center_history[-10:]]) / 10
-                avg_y = sum([center[1] for center in track.center_history[-10:]]) / 10
+            if len(track.center_history) > window:
+                # Check if movement around the average position is minimal (loitering)
+                recent = np.asarray(track.center_history[-window:], dtype=np.float64)
+                max_distance = np.hypot(*(recent - recent.mean(axis=0)).T).max()
                 
-                # Check if movement is minimal (loitering)
-                max_distance = max([
-                    np.sqrt((center[0] - avg_x)**2 + (center[1] - avg_y)**2)
-                    for center in track.center_history[-10:]
-                ])
-                
-                if max_distance < 50:  # Threshold for loitering
+                if max_distance < loitering_distance:
                     event = {
                         'rule_id': rule['id'],
                         'camera_id': rule['camera_id'],
@@ -157,38 +441,172 @@ class RuleEngineService:
         
         return events
     
-    def _check_object_left_behind_rule(self, tracks: List[Track], rule: Dict, frame_time: datetime) -> List[Dict]:
-        """Check object left behind rule"""
+    def _check_custom_rule(self, tracks: List[Track], rule: Dict, frame_time: datetime,
+                           features: Dict[str, np.ndarray]) -> List[Dict]:
+        """Check custom rule: one compiled predicate call for all tracks"""
         events = []
+        matched = rule['_condition'](features)
+        
+        for track, is_match in zip(tracks, matched):
+            if is_match:
+                event = {
+                    'rule_id': rule['id'],
+                    'camera_id': rule['camera_id'],
+                    'timestamp': frame_time.isoformat(),
+                    'object_class': track.class_name,
+                    'track_id': track.track_id,
+                    'bbox': track.bbox_history[-1],
+                    'confidence': track.confidence,
+                    'severity': rule['severity'],
+                    'rule_type': rule['rule_type'],
+                    'message': f'{track.class_name} matched condition at {frame_time}'
+                }
+                events.append(event)
+        
+        return events
+    
+    def _check_speed_rule(self, tracks: List[Track], rule: Dict, frame_time: datetime,
+                          speeds: np.ndarray, calibrated: bool) -> List[Dict]:
+        """Check speed rule: fires when a track starts exceeding the limit"""
+        events = []
+        limit = speed_threshold(rule['conditions'], calibrated)
+        if limit is None:
+            return events
+        
+        speeding = speed_mask(speeds, limit, [track.class_name for track in tracks],
+                              [track.center_history[-1] for track in tracks], rule['conditions'])
+        
+        # Only tracks seen in this frame are kept, so the set stays bounded
+        previous = self._speeding.get(rule['id'], set())
+        current = set()
+        scale, unit = (3.6, 'km/h') if calibrated else (1.0, 'px/s')
+        for track, is_speeding, speed in zip(tracks, speeding, speeds):
+            if not is_speeding:
+                continue
+            current.add(track.track_id)
+            if track.track_id not in previous:
+                event = {
+                    'rule_id': rule['id'],
+                    'camera_id': rule['camera_id'],
+                    'timestamp': frame_time.isoformat(),
+                    'object_class': track.class_name,
+                    'track_id': track.track_id,
+                    'bbox': track.bbox_history[-1],
+                    'confidence': track.confidence,
+                    'severity': rule['severity'],
+                    'rule_type': rule['rule_type'],
+                    'speed': round(float(speed) * scale, 1),
+                    'message': f'{track.class_name} moving at {speed * scale:.1f} {unit} at {frame_time}'
+                }
+                events.append(event)
+        self._speeding[rule['id']] = current
+        
+        return events
+    
+    def _check_counting_rule(self, tracks: List[Track], rule: Dict, frame_time: datetime,
+                             zone_counts: Dict[str, int]) -> List[Dict]:
+        """Check counting rule: fires when the zone goes over capacity, with hysteresis"""
+        events = []
+        limit, hysteresis = capacity_limit(rule)
+        if limit <= 0:
+            return events
+        
+        zone = rule['_zone']
+        count = zone_counts.get(str(zone['id']), 0)
+        was_over = self._over_capacity.get(rule['id'], False)
+        is_over = count > limit or (was_over and count > limit - hysteresis)
+        self._over_capacity[rule['id']] = is_over
+        
+        if is_over and not was_over:
+            allowed_objects = zone.get('allowed_objects') or []
+            counted = list({track.track_id: track for track in tracks
+                            if not allowed_objects or track.class_name in allowed_objects}.values())
+            if counted:
+                centers = np.array([track.center_history[-1] for track in counted], dtype=np.float64)
+                counted = [track for track, inside in zip(counted, points_in_polygon(centers, zone['polygon']))
+                           if inside]
+            events.append(occupancy_event(
+                rule, frame_time, count, limit,
+                [track.class_name for track in counted],
+                np.array([track.bbox_history[-1] for track in counted], dtype=np.float64),
+                np.array([track.confidence for track in counted], dtype=np.float64)
+            ))
+        
+        return events
+    
+    def has_rule_type(self, camera_id: str, rule_type: str) -> bool:
+        """Whether the camera has an enabled rule of the given type"""
+        return any(rule['rule_type'] == rule_type for rule in self.get_rules(camera_id))
+    
+    def _check_object_left_behind_rule(self, tracks: List[Track], rule: Dict, frame_time: datetime,
+                                       static_objects: List[StaticObject]) -> List[Dict]:
+        """Check object left behind rule: static objects unattended for min_duration seconds"""
+        events = []
+        min_duration = float(rule['conditions'].get('min_duration', 30))
+        zone_polygon = rule['conditions'].get('zone_polygon', [])
+        owner_classes = rule['conditions'].get('owner_classes', [])
+        
+        candidates = [static_object for static_object in static_objects
+                      if static_object.static_seconds(frame_time) >= min_duration]
+        if owner_classes:
+            candidates = [static_object for static_object in candidates
+                          if static_object.owner_class in owner_classes]
+        if zone_polygon and candidates:
+            centers = np.array([static_object.center for static_object in candidates], dtype=np.float64)
+            candidates = [static_object for static_object, inside
+                          in zip(candidates, points_in_polygon(centers, zone_polygon)) if inside]
+        
+        # Only objects still in view are kept, so the set stays bounded
+        reported = self._left_behind.get(rule['id'], set())
+        present = {static_object.object_id for static_object in static_objects}
+        reported &= present
+        visible = {track.track_id: track for track in tracks}
+        for static_object in candidates:
+            if static_object.object_id in reported:
+                continue
+            
+            # An owner standing next to the object is still attending it
+            owner = visible.get(static_object.owner_track_id)
+            if owner is not None:
+                x1, y1, x2, y2 = static_object.bbox
+                reach = max(x2 - x1, y2 - y1) * 1.5 + 50
+                distance = np.hypot(owner.center_history[-1][0] - static_object.center[0],
+                                    owner.center_history[-1][1] - static_object.center[1])
+                if distance < reach:
+                    continue
+            
+            reported.add(static_object.object_id)
+            static_seconds = static_object.static_seconds(frame_time)
+            owner_text = f' by {static_object.owner_class} #{static_object.owner_track_id}' \
+                if static_object.owner_track_id is not None else ''
+            event = {
+                'rule_id': rule['id'],
+                'camera_id': rule['camera_id'],
+                'timestamp': frame_time.isoformat(),
+                'object_class': 'unattended_object',
+                'track_id': static_object.owner_track_id,
+                'bbox': static_object.bbox,
+                'confidence': round(static_object.score, 3),
+                'severity': rule['severity'],
+                'rule_type': rule['rule_type'],
+                'static_object_id': static_object.object_id,
+                'owner_class': static_object.owner_class,
+                'static_seconds': round(static_seconds, 1),
+                'message': f'Object left{owner_text} for {static_seconds:.0f}s at {frame_time}'
+            }
+            events.append(event)
+        self._left_behind[rule['id']] = reported
         
-        # This would require tracking static objects over time
-        # For now, return empty list
         return events
     
     def _line_crossed(self, point1: Tuple[float, float], point2: Tuple[float, float], line_points: List[Dict]) -> bool:
         """Check if line is crossed between two points"""
-        # Simplified line crossing detection
-        # In real implementation, use proper line intersection algorithm
-        return False
+        return bool(segments_cross_polyline(
+            np.array([point1], dtype=np.float64),
+            np.array([point2], dtype=np.float64),
+            line_points
+        )[0])
     
     def _point_in_polygon(self, point: Tuple[float, float], polygon: List[Dict]) -> bool:
         """Check if point is inside polygon using ray casting algorithm"""
-        x, y = point
-        n = len(polygon)
-        inside = False
-        
-        p1x = polygon[0]['x']
-        p1y = polygon[0]['y']
-        for i in range(1, n + 1):
-            p2x = polygon[i % n]['x']
-            p2y = polygon[i % n]['y']
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        
-        return inside
\ No newline at end of file
+        return bool(points_in_polygon(np.array([point], dtype=np.float64), polygon)[0])
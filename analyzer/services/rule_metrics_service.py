@@ -0,0 +1,208 @@
+# services/rule_metrics_service.py
+from typing import List, Dict, Any, Optional, Set
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field, asdict
+import threading
+
+
+@dataclass
+class RuleStats:
+    """Cost counters and circuit-breaker state of one live rule"""
+    rule_id: str
+    camera_id: str
+    rule_type: str
+    evaluations: int = 0
+    seconds: float = 0.0          # total evaluation time
+    tracks_tested: int = 0
+    events: int = 0               # events emitted
+    suppressed_events: int = 0    # events dropped by the breaker
+    trips: int = 0                # consecutive windows that broke a limit
+    state: str = 'active'         # active, throttled or disabled
+    reason: Optional[str] = None
+    throttled_until: Optional[datetime] = None
+    persisted: bool = False       # the disable was written to the database
+    # Current accounting window
+    window_start: Optional[datetime] = None
+    window_evaluations: int = 0
+    window_seconds: float = 0.0
+    window_events: int = 0        # distinct firings: one per track, events without a track each
+    window_tracks: Set[Any] = field(default_factory=set)
+
+
+class RuleMetricsService:
+    """Service class for per-rule cost accounting and a runaway-rule circuit breaker.
+
+    Every evaluation of a live rule adds its time, the number of tracks it
+    tested and the events it emitted. Within each window of frame time a
+    rule may fire at most ``max_events_per_minute`` (scaled to the window)
+    times and spend at most ``max_rule_ms`` per evaluation on average.
+    Per-frame rules (zone violations, loitering, custom conditions) emit an
+    event for the same track on every frame, so within a window a track
+    counts once; events without a track count each. A rule may set its own
+    limit in ``conditions['max_events_per_minute']``.
+    Breaking a limit throttles the rule: excess events are dropped and the
+    rule is skipped for ``throttle_seconds``. A rule that trips in
+    ``max_trips`` consecutive windows is disabled until it is re-enabled.
+    A limit of 0 turns that check off.
+    """
+
+    # Average cost is only judged once a window has this many evaluations
+    MIN_COST_SAMPLES = 10
+
+    def __init__(self, max_events_per_minute: int = 600, max_rule_ms: float = 50.0,
+                 window_seconds: float = 60.0, throttle_seconds: float = 60.0, max_trips: int = 3):
+        self.max_events_per_minute = max_events_per_minute
+        self.max_rule_ms = max_rule_ms
+        self.window_seconds = window_seconds
+        self.throttle_seconds = throttle_seconds
+        self.max_trips = max_trips
+        self.stats: Dict[str, RuleStats] = {}
+        self._lock = threading.Lock()
+
+    def events_limit(self, rule: Dict) -> int:
+        """Events per minute the rule may fire: its own limit or the service default"""
+        limit = (rule.get('conditions') or {}).get('max_events_per_minute')
+        try:
+            return max(int(limit), 0) if limit is not None else self.max_events_per_minute
+        except (TypeError, ValueError):
+            return self.max_events_per_minute
+
+    def allowed(self, rule_id: Any, frame_time: datetime) -> bool:
+        """Whether the rule may be evaluated at frame_time"""
+        stats = self.stats.get(str(rule_id))
+        if stats is None or stats.state == 'active':
+            return True
+        if stats.state == 'throttled' and frame_time >= stats.throttled_until:
+            stats.state = 'active'
+            stats.throttled_until = None
+            return True
+        return False
+
+    def record(self, rule: Dict, camera_id: str, frame_time: datetime, seconds: float,
+               tracks_tested: int, events: List[Dict]) -> List[Dict]:
+        """Account one evaluation and return the events the breaker lets through"""
+        rule_id = str(rule['id'])
+        with self._lock:
+            stats = self.stats.get(rule_id)
+            if stats is None:
+                stats = self.stats[rule_id] = RuleStats(rule_id, str(camera_id), rule['rule_type'])
+
+            if stats.window_start is None or (frame_time - stats.window_start).total_seconds() >= self.window_seconds:
+                # A full window within limits ends a run of trips
+                if stats.window_start is not None:
+                    stats.trips = 0
+                self._start_window(stats, frame_time)
+
+            stats.evaluations += 1
+            stats.seconds += seconds
+            stats.tracks_tested += tracks_tested
+            stats.window_evaluations += 1
+            stats.window_seconds += seconds
+
+            limit = self.events_limit(rule)
+            max_window_events = int(limit * self.window_seconds / 60.0)
+            flooding = False
+            passed = []
+            for event in events:
+                track_id = event.get('track_id')
+                if track_id is not None and track_id in stats.window_tracks:
+                    passed.append(event)
+                    continue
+                if limit and stats.window_events >= max_window_events:
+                    flooding = True
+                    stats.suppressed_events += 1
+                    continue
+                stats.window_events += 1
+                if track_id is not None:
+                    stats.window_tracks.add(track_id)
+                passed.append(event)
+            events = passed
+            stats.events += len(events)
+
+            average_ms = stats.window_seconds * 1000.0 / stats.window_evaluations
+            if flooding:
+                self._trip(stats, frame_time, f"more than {limit} events per minute")
+            elif (self.max_rule_ms and stats.window_evaluations >= self.MIN_COST_SAMPLES
+                  and average_ms > self.max_rule_ms):
+                self._trip(stats, frame_time, f"evaluation took {average_ms:.1f} ms on average "
+                                              f"(limit {self.max_rule_ms:g} ms)")
+        return events
+
+    def _start_window(self, stats: RuleStats, frame_time: datetime):
+        stats.window_start = frame_time
+        stats.window_evaluations = 0
+        stats.window_seconds = 0.0
+        stats.window_events = 0
+        stats.window_tracks = set()
+
+    def _trip(self, stats: RuleStats, frame_time: datetime, reason: str):
+        stats.trips += 1
+        stats.reason = reason
+        if stats.trips >= self.max_trips:
+            stats.state = 'disabled'
+            stats.throttled_until = None
+            print(f"Disabling rule {stats.rule_id} of camera {stats.camera_id}: {reason}")
+        else:
+            stats.state = 'throttled'
+            stats.throttled_until = frame_time + timedelta(seconds=self.throttle_seconds)
+            print(f"Throttling rule {stats.rule_id} of camera {stats.camera_id} "
+                  f"for {self.throttle_seconds:g}s: {reason}")
+        # The next window starts after the throttle, so the trip is not counted twice
+        self._start_window(stats, stats.throttled_until or frame_time)
+
+    def pending_disables(self) -> List[RuleStats]:
+        """Disabled rules not yet written to the database"""
+        return [stats for stats in self.stats.values() if stats.state == 'disabled' and not stats.persisted]
+
+    def rules_loaded(self, rules: List[Dict]):
+        """Reset the breaker of disabled rules that were enabled again in the database"""
+        for rule in rules:
+            stats = self.stats.get(str(rule['id']))
+            if stats is not None and stats.state == 'disabled' and stats.persisted:
+                stats.state = 'active'
+                stats.reason = None
+                stats.trips = 0
+                stats.persisted = False
+                stats.window_start = None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Counters of every rule, for the JSON stats endpoint"""
+        with self._lock:
+            rows = [asdict(stats) for stats in self.stats.values()]
+        for row in rows:
+            del row['window_tracks']
+            for key in ('throttled_until', 'window_start'):
+                if row[key] is not None:
+                    row[key] = row[key].isoformat()
+        return rows
+
+    def prometheus(self) -> str:
+        """Counters of every rule in the Prometheus text exposition format"""
+        metrics = [
+            ('insightcore_rule_evaluations_total', 'counter', 'Rule evaluations', 'evaluations'),
+            ('insightcore_rule_evaluation_seconds_total', 'counter', 'Time spent evaluating the rule', 'seconds'),
+            ('insightcore_rule_tracks_tested_total', 'counter', 'Tracks tested by the rule', 'tracks_tested'),
+            ('insightcore_rule_events_total', 'counter', 'Events emitted by the rule', 'events'),
+            ('insightcore_rule_suppressed_events_total', 'counter', 'Events dropped by the circuit breaker',
+             'suppressed_events'),
+            ('insightcore_rule_trips', 'gauge', 'Consecutive windows over a limit', 'trips'),
+        ]
+        with self._lock:
+            stats_list = list(self.stats.values())
+            lines = []
+            for name, kind, description, attribute in metrics:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for stats in stats_list:
+                    lines.append(f"{name}{{{self._labels(stats)}}} {getattr(stats, attribute)}")
+            lines.append("# HELP insightcore_rule_state Circuit-breaker state of the rule")
+            lines.append("# TYPE insightcore_rule_state gauge")
+            for stats in stats_list:
+                for state in ('active', 'throttled', 'disabled'):
+                    lines.append(f'insightcore_rule_state{{{self._labels(stats)},state="{state}"}} '
+                                 f'{int(stats.state == state)}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(stats: RuleStats) -> str:
+        return f'rule_id="{stats.rule_id}",camera_id="{stats.camera_id}",rule_type="{stats.rule_type}"'
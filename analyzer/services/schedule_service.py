@@ -0,0 +1,144 @@
+# services/schedule_service.py
+"""Activation schedules of rules.
+
+A rule's ``schedule`` restricts when it is evaluated::
+
+    {"timezone": "Europe/Moscow",
+     "windows": [{"days": [0, 1, 2, 3, 4], "start": "22:00", "end": "06:00"},
+                 {"days": [5, 6], "start": "00:00", "end": "24:00"}]}
+
+Days are 0 = Monday .. 6 = Sunday (all days when omitted); a window whose
+end is not after its start runs past midnight into the next day. Rules
+without a schedule are always active.
+"""
+from typing import List, Dict, Any, Optional, Tuple, FrozenSet
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import numpy as np
+
+
+DAY_MINUTES = 24 * 60
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+
+class ScheduleError(ValueError):
+    """Raised when a rule schedule is invalid"""
+
+
+def _parse_time(value: Any) -> int:
+    """Minute of the day of an 'HH:MM' string (24:00 allowed)"""
+    if not isinstance(value, str):
+        raise ScheduleError(f"Invalid time '{value}', expected HH:MM")
+    try:
+        hours, minutes = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise ScheduleError(f"Invalid time '{value}', expected HH:MM")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > DAY_MINUTES:
+        raise ScheduleError(f"Invalid time '{value}', expected HH:MM")
+    return hours * 60 + minutes
+
+
+class RuleSchedule:
+    """A parsed schedule: weekly windows of local minutes in one timezone"""
+
+    def __init__(self, tz: tzinfo, windows: List[Tuple[FrozenSet[int], int, int]]):
+        self.tz = tz
+        self.windows = windows
+
+    @classmethod
+    def parse(cls, schedule: Optional[Dict[str, Any]], default_timezone: str = 'UTC') -> Optional['RuleSchedule']:
+        """Parse a rule's schedule JSON; None means the rule is always active"""
+        if not schedule:
+            return None
+        if not isinstance(schedule, dict):
+            raise ScheduleError("Schedule must be an object with timezone and windows")
+        if not schedule.get('windows'):
+            return None
+        if not isinstance(schedule['windows'], list):
+            raise ScheduleError("Schedule windows must be a list")
+        tz_name = schedule.get('timezone') or default_timezone
+        if not isinstance(tz_name, str):
+            raise ScheduleError(f"Invalid timezone {tz_name!r}, expected a name like 'Europe/Moscow'")
+        try:
+            tz = ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ScheduleError(f"Unknown timezone '{tz_name}'")
+
+        windows = []
+        for window in schedule['windows']:
+            if not isinstance(window, dict):
+                raise ScheduleError("Schedule windows must be objects with start and end")
+            days = window.get('days', list(range(7)))
+            if not isinstance(days, list) or not all(
+                isinstance(day, int) and not isinstance(day, bool) and 0 <= day <= 6 for day in days
+            ):
+                raise ScheduleError("Schedule days must be integers 0 (Monday) to 6 (Sunday)")
+            windows.append((frozenset(days), _parse_time(window.get('start')), _parse_time(window.get('end'))))
+        return cls(tz, windows)
+
+    def is_active(self, moment: datetime) -> bool:
+        """Whether the schedule is active at a single moment"""
+        local = moment.astimezone(self.tz)
+        return bool(self._active(np.array([local.weekday()]), np.array([local.hour * 60 + local.minute]))[0])
+
+    def active_minutes(self, epoch_minutes: np.ndarray) -> np.ndarray:
+        """Boolean mask over consecutive UTC epoch minutes"""
+        # Local offset per hour covers every DST transition
+        hours = np.unique(epoch_minutes // 60)
+        offsets = np.array([
+            datetime.fromtimestamp(int(hour) * 3600, tz=timezone.utc).astimezone(self.tz)
+            .utcoffset() // timedelta(minutes=1)
+            for hour in hours.tolist()
+        ], dtype=np.int64)
+        local = epoch_minutes + offsets[np.searchsorted(hours, epoch_minutes // 60)]
+        return self._active((local // DAY_MINUTES + EPOCH_WEEKDAY) % 7, local % DAY_MINUTES)
+
+    def _active(self, weekdays: np.ndarray, minutes: np.ndarray) -> np.ndarray:
+        active = np.zeros(weekdays.shape, dtype=bool)
+        for days, start, end in self.windows:
+            today = np.isin(weekdays, list(days))
+            if start < end:
+                active |= today & (minutes >= start) & (minutes < end)
+            else:
+                # Runs past midnight: the evening of a listed day and the next morning
+                yesterday = np.isin((weekdays - 1) % 7, list(days))
+                active |= (today & (minutes >= start)) | (yesterday & (minutes < end))
+        return active
+
+
+class ActivationCalendar:
+    """Which of a camera's rules are active at each minute of a rolling horizon.
+
+    Every minute maps to one of the distinct active-rule sets, so finding
+    the rules to evaluate for a frame is an index into two arrays; the
+    calendar is rebuilt only when a frame falls outside the horizon.
+    """
+
+    def __init__(self, rules: List[Dict], horizon_minutes: int = DAY_MINUTES):
+        self.rules = rules
+        self.horizon = horizon_minutes
+        self.scheduled = [index for index, rule in enumerate(rules) if rule.get('_schedule') is not None]
+        self.base: Optional[int] = None
+        self.pattern_ids = np.zeros(0, dtype=np.int64)
+        self.patterns: List[List[Dict]] = []
+
+    def _build(self, minute: int):
+        self.base = minute - minute % 60
+        minutes = self.base + np.arange(self.horizon, dtype=np.int64)
+        mask = np.ones((self.horizon, len(self.rules)), dtype=bool)
+        for index in self.scheduled:
+            mask[:, index] = self.rules[index]['_schedule'].active_minutes(minutes)
+
+        unique, inverse = np.unique(mask, axis=0, return_inverse=True)
+        self.pattern_ids = inverse.reshape(-1)
+        self.patterns = [[rule for rule, active in zip(self.rules, row) if active] for row in unique.tolist()]
+
+    def active_rules(self, frame_time: datetime) -> List[Dict]:
+        """Rules active at frame_time, in their original order"""
+        if not self.scheduled:
+            return self.rules
+        minute = int(frame_time.timestamp() // 60)
+        if self.base is None or not 0 <= minute - self.base < self.horizon:
+            self._build(minute)
+        return self.patterns[self.pattern_ids[minute - self.base]]
@@ -0,0 +1,120 @@
+# services/spatial_index.py
+from typing import List, Dict, Any, Optional
+import numpy as np
+from .geometry import to_array
+from .tracking_service import Track
+
+
+# Rule types whose tracks can be pre-filtered by geometry, and where the geometry lives
+INDEXED_GEOMETRY = {
+    'line_crossing': 'line_points',
+    'zone_violation': 'zone_polygon',
+}
+
+
+def rule_geometry(rule: Dict) -> Optional[np.ndarray]:
+    """(K, 2) points of an indexable rule's line or zone, None for other rules"""
+    key = INDEXED_GEOMETRY.get(rule['rule_type'])
+    if key is None:
+        return None
+    points = to_array((rule.get('conditions') or {}).get(key) or [])
+    minimum = 2 if key == 'line_points' else 3
+    return points if points.shape[0] >= minimum else None
+
+
+class RuleGridIndex:
+    """Uniform grid over the bounding boxes of a camera's rule geometry.
+
+    Every cell lists the rules whose line or zone box touches it, stored
+    as flat CSR arrays. A query maps each track's last movement segment
+    to the cells it covers and returns, per rule, only the tracks that can
+    reach its geometry. Exact line and polygon tests then run on those
+    tracks only, so cost follows the number of nearby rules rather than
+    the number of rules on the camera.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], cell_size: float = 64.0):
+        self.cell_size = float(cell_size)
+        self.rules: List[Dict[str, Any]] = []
+        boxes = []
+        for rule in rules:
+            points = rule_geometry(rule)
+            if points is None:
+                continue
+            self.rules.append(rule)
+            boxes.append((*points.min(axis=0), *points.max(axis=0)))
+        self.rule_ids = {rule['id'] for rule in self.rules}
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+        if not self.rules:
+            self.origin = np.zeros(2)
+            self.shape = (0, 0)
+            self.cell_start = np.zeros(1, dtype=np.int64)
+            self.cell_rules = np.zeros(0, dtype=np.int64)
+            return
+
+        self.origin = self.boxes[:, :2].min(axis=0)
+        columns, rows = (np.floor((self.boxes[:, 2:].max(axis=0) - self.origin) / self.cell_size)
+                         .astype(np.int64) + 1)
+        self.shape = (int(rows), int(columns))
+
+        # Cell ranges of every rule box, expanded into (cell, rule) pairs
+        low = self._cell(self.boxes[:, :2])
+        high = self._cell(self.boxes[:, 2:])
+        cells, owners = self._expand(low, high)
+        order = np.lexsort((owners, cells))
+        self.cell_rules = owners[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(rows * columns + 1))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _cell(self, points: np.ndarray) -> np.ndarray:
+        """(M, 2) column/row of points, clipped to the grid"""
+        cells = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, [self.shape[1] - 1, self.shape[0] - 1])
+
+    def _expand(self, low: np.ndarray, high: np.ndarray):
+        """Flat cell numbers of every cell in each [low, high] range, with the range's index"""
+        widths = high[:, 0] - low[:, 0] + 1
+        counts = widths * (high[:, 1] - low[:, 1] + 1)
+        owners = np.repeat(np.arange(low.shape[0]), counts)
+        offsets = np.arange(owners.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        columns = low[owners, 0] + offsets % widths[owners]
+        rows = low[owners, 1] + offsets // widths[owners]
+        return rows * self.shape[1] + columns, owners
+
+    def candidates(self, tracks: List[Track]) -> Dict[Any, List[Track]]:
+        """Tracks whose last movement can touch each rule's geometry, keyed by rule id"""
+        if not self.rules or not tracks:
+            return {}
+
+        ends = np.array([track.center_history[-1] for track in tracks], dtype=np.float64)
+        starts = np.array([track.center_history[-2] if len(track.center_history) > 1
+                           else track.center_history[-1] for track in tracks], dtype=np.float64)
+        low_points = np.minimum(starts, ends)
+        high_points = np.maximum(starts, ends)
+
+        # Segments entirely outside the grid cannot touch any rule
+        grid_end = self.origin + self.cell_size * np.array([self.shape[1], self.shape[0]])
+        inside = np.flatnonzero(((high_points >= self.origin) & (low_points < grid_end)).all(axis=1))
+        if inside.size == 0:
+            return {}
+
+        cells, segments = self._expand(self._cell(low_points[inside]), self._cell(high_points[inside]))
+        segments = inside[segments]
+        rules_per_cell = self.cell_start[cells + 1] - self.cell_start[cells]
+        pair_segments = np.repeat(segments, rules_per_cell)
+        pair_offsets = np.arange(pair_segments.size) - np.repeat(np.cumsum(rules_per_cell) - rules_per_cell,
+                                                                   rules_per_cell)
+        pair_rules = self.cell_rules[np.repeat(self.cell_start[cells], rules_per_cell) + pair_offsets]
+
+        # Keep pairs whose boxes really overlap, once per (rule, track)
+        boxes = self.boxes[pair_rules]
+        overlap = ((low_points[pair_segments] <= boxes[:, 2:]) & (high_points[pair_segments] >= boxes[:, :2])).all(axis=1)
+        pairs = np.unique(pair_rules[overlap] * len(tracks) + pair_segments[overlap])
+
+        result: Dict[Any, List[Track]] = {}
+        for rule_index, track_index in zip((pairs // len(tracks)).tolist(), (pairs % len(tracks)).tolist()):
+            result.setdefault(self.rules[rule_index]['id'], []).append(tracks[track_index])
+        return result
@@ -0,0 +1,126 @@
+# services/speed_service.py
+from typing import List, Dict, Any, Optional
+import numpy as np
+from .geometry import to_array, points_in_polygon
+from .tracking_service import TrackHistoryBuffer, ground_points
+
+
+def homography_from_points(image_points: np.ndarray, world_points: np.ndarray) -> np.ndarray:
+    """Direct linear transform from >= 4 image/ground point pairs to a 3x3 homography"""
+    rows = []
+    for (x, y), (u, v) in zip(image_points, world_points):
+        rows.append((-x, -y, -1, 0, 0, 0, u * x, u * y, u))
+        rows.append((0, 0, 0, -x, -y, -1, v * x, v * y, v))
+    _, _, vt = np.linalg.svd(np.asarray(rows, dtype=np.float64))
+    homography = vt[-1].reshape(3, 3)
+    return homography / homography[2, 2]
+
+
+def homography_from_calibration(calibration: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Ground-plane homography (pixels -> metres) from a camera's calibration JSON
+
+    Accepts either {'homography': [[...], [...], [...]]} or matching
+    {'image_points': [{'x', 'y'}, ...], 'world_points': [{'x', 'y'}, ...]}
+    lists of at least four points, world points in metres.
+    """
+    if not calibration:
+        return None
+    if calibration.get('homography'):
+        return np.asarray(calibration['homography'], dtype=np.float64).reshape(3, 3)
+
+    image_points = to_array(calibration.get('image_points', []))
+    world_points = to_array(calibration.get('world_points', []))
+    if image_points.shape[0] < 4 or image_points.shape != world_points.shape:
+        return None
+    return homography_from_points(image_points, world_points)
+
+
+def project_points(homography: Optional[np.ndarray], points: np.ndarray) -> np.ndarray:
+    """Map (..., 2) pixel points to the ground plane; identity without a homography"""
+    if homography is None:
+        return points
+    projected = points @ homography[:, :2].T + homography[:, 2]
+    return projected[..., :2] / projected[..., 2:3]
+
+
+def fitted_speed(points: np.ndarray, times: np.ndarray, valid: np.ndarray, min_samples: int = 2) -> np.ndarray:
+    """Speed of many tracks from a least-squares line fit of position over time
+
+    points (n, k, 2), times (n, k), valid (n, k). Fitting over the whole
+    window smooths out box jitter that raw frame-to-frame differences would
+    turn into speed spikes. Tracks with fewer than min_samples samples get NaN.
+    """
+    weights = valid.astype(np.float64)
+    samples = weights.sum(axis=1)
+    safe_samples = np.maximum(samples, 1)
+
+    mean_t = (times * weights).sum(axis=1) / safe_samples
+    mean_p = (points * weights[..., None]).sum(axis=1) / safe_samples[:, None]
+    dt = (times - mean_t[:, None]) * weights
+    dp = np.where(valid[..., None], points - mean_p[:, None, :], 0.0)
+
+    variance = (dt * dt).sum(axis=1)
+    covariance = (dt[..., None] * dp).sum(axis=1)
+    velocity = np.divide(covariance, variance[:, None], out=np.zeros_like(covariance),
+                         where=variance[:, None] > 0)
+    speed = np.hypot(velocity[:, 0], velocity[:, 1])
+    return np.where((samples >= max(2, min_samples)) & (variance > 0), speed, np.nan)
+
+
+def speed_threshold(conditions: Dict[str, Any], calibrated: bool) -> Optional[float]:
+    """Speed limit of a speed_detection rule in the units speeds are measured in
+
+    Calibrated cameras use 'max_speed_kmh' (converted to m/s); uncalibrated
+    ones can only use a pixel limit, 'max_speed_px'.
+    """
+    if calibrated and conditions.get('max_speed_kmh') is not None:
+        return float(conditions['max_speed_kmh']) / 3.6
+    if not calibrated and conditions.get('max_speed_px') is not None:
+        return float(conditions['max_speed_px'])
+    return None
+
+
+def speed_mask(speeds: np.ndarray, limit: float, class_names, points, conditions: Dict[str, Any]) -> np.ndarray:
+    """Rows over the limit that also match the rule's object_classes and zone_polygon filters"""
+    speeding = np.nan_to_num(speeds, nan=0.0) > limit
+    object_classes = conditions.get('object_classes', [])
+    if object_classes:
+        speeding &= np.isin(np.asarray(class_names, dtype=str), object_classes)
+    zone_polygon = conditions.get('zone_polygon', [])
+    if zone_polygon and speeding.size:
+        speeding &= points_in_polygon(np.asarray(points, dtype=np.float64).reshape(-1, 2), zone_polygon)
+    return speeding
+
+
+class SpeedEstimationService:
+    """Service class for estimating object speeds from track histories"""
+
+    def __init__(self, window: int = 8, min_samples: int = 3):
+        self.window = window
+        self.min_samples = min_samples
+
+    def track_speeds(self, history: TrackHistoryBuffer, track_ids: List[int],
+                     homography: Optional[np.ndarray] = None) -> np.ndarray:
+        """Smoothed speed of every listed track (m/s when calibrated, px/s otherwise)"""
+        if not track_ids:
+            return np.zeros(0)
+        points, times, valid = history.window(track_ids, self.window)
+        return fitted_speed(project_points(homography, points), times, valid, self.min_samples)
+
+    def trajectory_speeds(self, trajectories, homography: Optional[np.ndarray] = None) -> np.ndarray:
+        """Smoothed speed at every row of offline trajectories, matching the live ring buffer"""
+        window = self.window
+        if trajectories.row_count == 0:
+            return np.zeros(0)
+
+        # Pad the front so every row ends a window of `window` samples
+        points = project_points(homography, ground_points(trajectories.bbox))
+        points = np.concatenate((np.zeros((window - 1, 2)), points))
+        times = np.concatenate((np.zeros(window - 1), trajectories.t))
+        point_windows = np.lib.stride_tricks.sliding_window_view(points, window, axis=0).transpose(0, 2, 1)
+        time_windows = np.lib.stride_tricks.sliding_window_view(times, window)
+
+        # Sample j of the window ending at a row belongs to the same track
+        # only if the row is at least (window - 1 - j) rows into its track
+        valid = trajectories.row_position()[:, None] >= (window - 1 - np.arange(window))[None, :]
+        return fitted_speed(point_windows, time_windows, valid, self.min_samples)
@@ -0,0 +1,195 @@
+# services/spool_service.py
+from typing import List, Tuple, Optional
+import os
+import struct
+import threading
+import zlib
+
+
+RECORD_HEADER = struct.Struct('<II')  # body length, crc32 of the body
+KEY_LENGTH = struct.Struct('<H')
+SEGMENT_SUFFIX = '.seg'
+CURSOR_FILE = 'cursor'
+
+Position = Tuple[int, int]  # segment number, byte offset
+
+
+class EventSpool:
+    """Append-only on-disk queue of encoded messages, split into segment files.
+
+    Producers append (key, value) records and return at once; a sender
+    reads batches from the cursor, and commits the cursor once the batch is
+    delivered, which deletes fully sent segments. Records survive restarts:
+    the cursor file says where sending resumes and a torn record at the end
+    of the last segment is cut off on open. When the spool outgrows
+    ``max_bytes`` the oldest segments are dropped, sent or not.
+
+    One process owns a spool directory.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 8 * 1024 * 1024,
+                 max_bytes: int = 1024 * 1024 * 1024, fsync_interval: int = 100):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        self._unsynced = 0
+        self.dropped = 0
+
+        segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+        )
+        self._sizes = {segment: os.path.getsize(self._path(segment)) for segment in segments}
+        if segments:
+            self._repair(segments[-1])
+        self._writing = segments[-1] if segments else 0
+        self._file = open(self._path(self._writing), 'ab')
+        self._sizes.setdefault(self._writing, 0)
+        self._cursor = self._load_cursor()
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f'{segment:016d}{SEGMENT_SUFFIX}')
+
+    def _repair(self, segment: int):
+        """Cut a record torn by a crash off the end of the segment"""
+        with open(self._path(segment), 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset < len(data):
+            end = self._record_end(data, offset)
+            if end is None:
+                break
+            offset = end
+        if offset < len(data):
+            print(f"Spool {self.directory}: dropping {len(data) - offset} bytes of a torn record")
+            with open(self._path(segment), 'r+b') as f:
+                f.truncate(offset)
+            self._sizes[segment] = offset
+
+    @staticmethod
+    def _record_end(data: bytes, offset: int) -> Optional[int]:
+        if offset + RECORD_HEADER.size > len(data):
+            return None
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + RECORD_HEADER.size + length
+        if end > len(data) or zlib.crc32(data[offset + RECORD_HEADER.size:end]) != crc:
+            return None
+        return end
+
+    def _load_cursor(self) -> Position:
+        first = min(self._sizes)
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                segment, offset = (int(value) for value in f.read().split())
+        except (OSError, ValueError):
+            return first, 0
+        # Segments before the cursor may have been dropped for space
+        if segment < first:
+            return first, 0
+        return segment, min(offset, self._sizes.get(segment, 0))
+
+    def append(self, key: bytes, value: bytes):
+        """Add a record; it is sent after every record appended before it"""
+        body = KEY_LENGTH.pack(len(key)) + key + value
+        record = RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+        with self._lock:
+            if self._sizes[self._writing] and self._sizes[self._writing] + len(record) > self.segment_bytes:
+                self._roll()
+            self._file.write(record)
+            self._file.flush()
+            self._sizes[self._writing] += len(record)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+            self._enforce_limit()
+            self._appended.notify_all()
+
+    def _roll(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._unsynced = 0
+        self._writing += 1
+        self._sizes[self._writing] = 0
+        self._file = open(self._path(self._writing), 'ab')
+
+    def _enforce_limit(self):
+        while sum(self._sizes.values()) > self.max_bytes and len(self._sizes) > 1:
+            oldest = min(self._sizes)
+            if self._cursor[0] <= oldest:
+                self._cursor = (oldest + 1, 0)
+                self.dropped += 1
+                print(f"Spool {self.directory} is full: dropped unsent segment {oldest}")
+            self._delete(oldest)
+
+    def _delete(self, segment: int):
+        self._sizes.pop(segment, None)
+        try:
+            os.remove(self._path(segment))
+        except FileNotFoundError:
+            pass
+
+    def read_batch(self, max_records: int) -> Tuple[List[Tuple[bytes, bytes]], Position]:
+        """Up to ``max_records`` records from the cursor, and the position after them"""
+        with self._lock:
+            segment, offset = self._cursor
+            if segment == self._writing:
+                self._file.flush()
+            records = []
+            while len(records) < max_records and segment in self._sizes:
+                if offset >= self._sizes[segment]:
+                    if segment == self._writing:
+                        break
+                    segment, offset = segment + 1, 0
+                    continue
+                with open(self._path(segment), 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(self._sizes[segment] - offset)
+                position = 0
+                while len(records) < max_records and position < len(data):
+                    length, _ = RECORD_HEADER.unpack_from(data, position)
+                    body = data[position + RECORD_HEADER.size:position + RECORD_HEADER.size + length]
+                    (key_length,) = KEY_LENGTH.unpack_from(body)
+                    records.append((body[KEY_LENGTH.size:KEY_LENGTH.size + key_length],
+                                    body[KEY_LENGTH.size + key_length:]))
+                    position += RECORD_HEADER.size + length
+                offset += position
+            return records, (segment, offset)
+
+    def commit(self, position: Position):
+        """Mark records before ``position`` as sent and delete finished segments"""
+        with self._lock:
+            if position < self._cursor:
+                return
+            self._cursor = position
+            path = os.path.join(self.directory, CURSOR_FILE)
+            with open(path + '.tmp', 'w') as f:
+                f.write(f'{position[0]} {position[1]}')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+            for segment in [segment for segment in self._sizes if segment < position[0]]:
+                self._delete(segment)
+
+    def wait(self, timeout: float) -> bool:
+        """Block until a record is appended or ``timeout`` seconds pass"""
+        with self._appended:
+            if self._cursor[0] != self._writing or self._cursor[1] < self._sizes[self._writing]:
+                return True
+            return self._appended.wait(timeout)
+
+    def pending_bytes(self) -> int:
+        """Size of records not yet sent"""
+        with self._lock:
+            segment, offset = self._cursor
+            return sum(size for number, size in self._sizes.items() if number >= segment) - offset
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
@@ -0,0 +1,260 @@
+# services/static_object_service.py
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+import bisect
+import numpy as np
+import cv2
+from .tracking_service import Track
+
+
+@dataclass
+class StaticObject:
+    """A foreground blob that stopped moving and was not there before"""
+    object_id: int
+    bbox: Tuple[float, float, float, float]  # full-resolution x1, y1, x2, y2
+    first_seen: datetime                      # when the blob appeared
+    last_seen: datetime
+    score: float                              # share of the box that is static foreground
+    owner_track_id: Optional[int] = None      # track that left the object
+    owner_class: Optional[str] = None
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return ((self.bbox[0] + self.bbox[2]) / 2, (self.bbox[1] + self.bbox[3]) / 2)
+
+    def static_seconds(self, frame_time: datetime) -> float:
+        return (frame_time - self.first_seen).total_seconds()
+
+
+class BackgroundModel:
+    """Dual-rate background model of one camera at low resolution.
+
+    A fast background absorbs anything that stops moving within seconds,
+    a slow one keeps the empty scene. Pixels that differ from the slow
+    background but not from the fast one are static foreground: something
+    arrived and stayed. The slow model never learns under static foreground
+    or under objects that move by themselves, so a left object stays
+    detected until it is removed and people standing still never become
+    background. Pixels the slow model has not seen uncovered yet are
+    learned on first sight instead of being reported as ghosts.
+    All buffers are allocated once and reused on every update.
+    """
+
+    def __init__(self, frame_shape: Tuple[int, int], width: int = 160,
+                 fast_rate: float = 0.1, slow_rate: float = 0.002, threshold: float = 25.0):
+        frame_height, frame_width = frame_shape[:2]
+        self.frame_shape = (frame_height, frame_width)
+        self.width = min(width, frame_width)
+        self.height = max(1, round(frame_height * self.width / frame_width))
+        self.scale = frame_width / self.width
+        self.fast_rate = fast_rate
+        self.slow_rate = slow_rate
+        self.threshold = threshold
+
+        size = (self.height, self.width)
+        self._small = np.zeros(size + (3,), dtype=np.uint8)
+        self._gray = np.zeros(size, dtype=np.uint8)
+        self._gray_float = np.zeros(size, dtype=np.float32)
+        self._diff = np.zeros(size, dtype=np.float32)
+        self._fast_foreground = np.zeros(size, dtype=bool)
+        self._ignored = np.zeros(size, dtype=bool)
+        self._unseen = np.zeros(size, dtype=bool)
+        self._frozen = np.zeros(size, dtype=bool)
+        self._update_mask = np.zeros(size, dtype=np.uint8)
+        self.fast = np.zeros(size, dtype=np.float32)
+        self.slow = np.zeros(size, dtype=np.float32)
+        self.static = np.zeros(size, dtype=bool)
+        self.known = np.zeros(size, dtype=bool)
+        self.static_age = np.zeros(size, dtype=np.float32)
+        self.confirmed = np.zeros(size, dtype=np.uint8)
+        self.labels = np.zeros(size, dtype=np.int32)
+        self.initialized = False
+
+    def update(self, frame: np.ndarray, elapsed: float, ignore_boxes: List[Tuple[float, float, float, float]],
+               confirm_seconds: float) -> np.ndarray:
+        """Fold a frame into the model and return the confirmed static foreground mask
+
+        Pixels under ignore_boxes (full-resolution boxes of objects that move by
+        themselves) never count as static foreground.
+        """
+        cv2.resize(frame, (self.width, self.height), dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        np.copyto(self._gray_float, self._gray)
+        self._ignored.fill(False)
+        for x1, y1, x2, y2 in ignore_boxes:
+            self._ignored[max(0, int(y1 / self.scale)):int(np.ceil(y2 / self.scale)),
+                          max(0, int(x1 / self.scale)):int(np.ceil(x2 / self.scale))] = True
+        if not self.initialized:
+            np.copyto(self.fast, self._gray_float)
+            self.initialized = True
+
+        # Background that just got uncovered for the first time is taken as is
+        np.logical_or(self.known, self._ignored, out=self._unseen)
+        np.logical_not(self._unseen, out=self._unseen)
+        np.copyto(self.slow, self._gray_float, where=self._unseen)
+        np.logical_or(self.known, self._unseen, out=self.known)
+
+        np.subtract(self._gray_float, self.fast, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        np.greater(self._diff, self.threshold, out=self._fast_foreground)
+        np.subtract(self._gray_float, self.slow, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        np.greater(self._diff, self.threshold, out=self.static)
+        np.logical_and(self.static, ~self._fast_foreground, out=self.static)
+        np.logical_and(self.static, ~self._ignored, out=self.static)
+        np.logical_and(self.static, self.known, out=self.static)
+
+        # Age of continuous static foreground, reset where it ends
+        self.static_age += elapsed
+        self.static_age *= self.static
+
+        # The slow background learns everywhere except under static foreground and moving objects
+        np.logical_or(self.static, self._ignored, out=self._frozen)
+        np.logical_not(self._frozen, out=self._update_mask, casting='unsafe')
+        cv2.accumulateWeighted(self._gray_float, self.fast, self.fast_rate)
+        cv2.accumulateWeighted(self._gray_float, self.slow, self.slow_rate, mask=self._update_mask)
+
+        np.greater_equal(self.static_age, confirm_seconds, out=self.confirmed, casting='unsafe')
+        return self.confirmed
+
+
+class StaticObjectService:
+    """Service class for finding objects left behind in a camera's view.
+
+    Each camera keeps a low-resolution background model updated at most
+    every ``update_interval`` seconds, so cost per camera is bounded no
+    matter the stream resolution or frame rate. Confirmed static blobs are
+    followed across updates and linked to the track that passed closest to
+    them when they appeared.
+    """
+
+    def __init__(self, width: int = 160, update_interval: float = 0.5, confirm_seconds: float = 5.0,
+                 min_area: int = 12, link_window: float = 5.0,
+                 ignore_classes: Tuple[str, ...] = ('person', 'car', 'truck', 'bus', 'motorcycle', 'bicycle')):
+        self.width = width
+        self.update_interval = update_interval
+        self.confirm_seconds = confirm_seconds
+        self.min_area = min_area
+        self.link_window = link_window
+        self.ignore_classes = set(ignore_classes)
+        self.models: Dict[str, BackgroundModel] = {}
+        self.objects: Dict[str, List[StaticObject]] = {}
+        self._last_update: Dict[str, datetime] = {}
+        self._next_id = 1
+
+    @property
+    def track_horizon(self) -> float:
+        """Seconds back a track may have been last seen and still own a new object
+
+        A blob is reported ``confirm_seconds`` after it appeared, possibly
+        one update late, and its owner was near it within ``link_window``.
+        """
+        return self.confirm_seconds + self.update_interval + self.link_window
+
+    def reset(self, camera_id: str):
+        """Forget a camera's background, e.g. before an unrelated video file"""
+        self.models.pop(camera_id, None)
+        self.objects.pop(camera_id, None)
+        self._last_update.pop(camera_id, None)
+
+    def update(self, camera_id: str, frame: np.ndarray, frame_time: datetime,
+               tracks: List[Track], frame_shape: Optional[Tuple[int, int]] = None) -> List[StaticObject]:
+        """Update the camera's model if due and return its current static objects
+
+        ``tracks`` should include tracks inactive for up to ``track_horizon``
+        seconds so objects can be linked to whoever left them; older ones only
+        cost time. ``frame_shape`` is the resolution track
+        boxes are in when it differs from the frame's (a substream frame with
+        main stream boxes); the frame is resized to the model either way.
+        """
+        last_update = self._last_update.get(camera_id)
+        if last_update is not None and (frame_time - last_update).total_seconds() < self.update_interval:
+            return self.objects.get(camera_id, [])
+
+        frame_shape = tuple(frame_shape or frame.shape[:2])
+        model = self.models.get(camera_id)
+        if model is None or model.frame_shape != frame_shape:
+            model = BackgroundModel(frame_shape, self.width)
+            self.models[camera_id] = model
+            self.objects[camera_id] = []
+        elapsed = 0.0 if last_update is None else (frame_time - last_update).total_seconds()
+        self._last_update[camera_id] = frame_time
+
+        visible = [track for track in tracks if track.last_seen == frame_time]
+        ignore_boxes = [track.bbox_history[-1] for track in visible if track.class_name in self.ignore_classes]
+        confirmed = model.update(frame, elapsed, ignore_boxes, self.confirm_seconds)
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(confirmed, labels=model.labels, connectivity=8)
+        blobs = []
+        for label in range(1, count):
+            x, y, w, h, area = stats[label]
+            if area < self.min_area:
+                continue
+            age = float(model.static_age[y:y + h, x:x + w].max())
+            bbox = tuple(float(value * model.scale) for value in (x, y, x + w, y + h))
+            blobs.append((bbox, age, float(area) / float(w * h)))
+
+        self.objects[camera_id] = self._match(self.objects.get(camera_id, []), blobs, frame_time, tracks)
+        return self.objects[camera_id]
+
+    def _match(self, previous: List[StaticObject], blobs: List[Tuple], frame_time: datetime,
+               tracks: List[Track]) -> List[StaticObject]:
+        """Carry object identities over to overlapping blobs; unmatched blobs become new objects"""
+        objects = []
+        unmatched = list(previous)
+        for bbox, age, score in blobs:
+            overlaps = [_iou(bbox, static_object.bbox) for static_object in unmatched]
+            best = int(np.argmax(overlaps)) if overlaps else -1
+            if best >= 0 and overlaps[best] > 0.3:
+                static_object = unmatched.pop(best)
+                static_object.bbox = bbox
+                static_object.last_seen = frame_time
+                static_object.score = score
+            else:
+                static_object = StaticObject(
+                    object_id=self._next_id,
+                    bbox=bbox,
+                    first_seen=frame_time - timedelta(seconds=age),
+                    last_seen=frame_time,
+                    score=score
+                )
+                self._next_id += 1
+                self._link_owner(static_object, tracks)
+            objects.append(static_object)
+        return objects
+
+    def _link_owner(self, static_object: StaticObject, tracks: List[Track]):
+        """Link the object to the track that was closest to it when it appeared"""
+        appeared = static_object.first_seen.timestamp()
+        center = np.array(static_object.center)
+        x1, y1, x2, y2 = static_object.bbox
+        max_distance = max(100.0, 2 * np.hypot(x2 - x1, y2 - y1))
+
+        best_distance = max_distance
+        for track in tracks:
+            if track.class_name not in self.ignore_classes or not track.time_history:
+                continue
+            # Histories grow with the track, so only the samples near the appearance are read
+            first = bisect.bisect_left(track.time_history, appeared - self.link_window)
+            last = bisect.bisect_right(track.time_history, appeared + self.link_window)
+            if first == last:
+                continue
+            # Center and time histories end together; restored tracks may have more centers
+            offset = len(track.center_history) - len(track.time_history)
+            centers = np.asarray(track.center_history[offset + first:offset + last], dtype=np.float64)
+            distance = float(np.hypot(*(centers - center).T).min())
+            if distance < best_distance:
+                best_distance = distance
+                static_object.owner_track_id = track.track_id
+                static_object.owner_class = track.class_name
+
+
+def _iou(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union
@@ -1,21 +1,75 @@
 # services/storage_service.py
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Union, BinaryIO, Iterator
+from concurrent.futures import ThreadPoolExecutor, Future
 import minio
-from datetime import datetime
+import certifi
+import urllib3
+from datetime import date, timedelta
+import io
+import itertools
+import mimetypes
 import os
+import threading
+import time
+
+
+# A file path, bytes in memory, or a readable buffer
+UploadSource = Union[str, bytes, BinaryIO]
+
+
+# Object layout: recordings/<camera>/<YYYYMMDD>/<YYYYMMDD_HHMMSS>_<id>.mp4 and
+# clips/<camera>/<YYYYMMDD_HHMMSS>_<id>.mp4. Names sort by time within a
+# camera, so a camera's day is one prefix and listings can resume after a name.
+def recording_prefix(camera_id: str, day: Optional[date] = None) -> str:
+    if day is None:
+        return f"recordings/{camera_id}/"
+    return f"recordings/{camera_id}/{day:%Y%m%d}/"
+
+
+def clip_prefix(camera_id: str, day: Optional[date] = None) -> str:
+    if day is None:
+        return f"clips/{camera_id}/"
+    return f"clips/{camera_id}/{day:%Y%m%d}"
+
+
+OBJECT_PREFIXES = {
+    'recordings': recording_prefix,
+    'clips': clip_prefix
+}
 
 
 class StorageService:
-    """Service class for handling video storage operations"""
+    """Service class for handling video storage operations
+    
+    Uploads run on a pool of ``upload_workers`` threads (submit_upload,
+    upload_batch) and objects larger than ``part_size`` go up as multipart
+    uploads of ``parallel_parts`` parts at a time. The HTTP connection pool
+    is sized for both, so concurrent uploads do not wait for connections.
+    """
     
-    def __init__(self, minio_endpoint: str, access_key: str, secret_key: str, secure: bool = False):
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, secure: bool = False,
+                 upload_workers: int = 8, part_size: int = 16 * 1024 * 1024, parallel_parts: int = 4):
+        http_client = urllib3.PoolManager(
+            timeout=urllib3.Timeout(connect=300, read=300),
+            maxsize=upload_workers * parallel_parts + 4,
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+        )
         self.minio_client = minio.Minio(
-            minio_endpoint,
+            endpoint,
             access_key=access_key,
             secret_key=secret_key,
-            secure=secure
+            secure=secure,
+            http_client=http_client
         )
+        self.part_size = part_size
+        self.parallel_parts = parallel_parts
+        self.upload_pool = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='storage-upload')
         self.bucket_name = os.getenv('MINIO_BUCKET_NAME', 'insightcore-videos')
+        # object name -> (url, expiry as time.time()); urls are reused until near expiry
+        self._presigned: Dict[str, Tuple[str, float]] = {}
+        self._presigned_lock = threading.Lock()
         
         # Create bucket if it doesn't exist
         try:
@@ -24,30 +78,128 @@ class StorageService:
         except Exception as e:
             print(f"Error creating bucket: {e}")
     
-    def upload_video(self, file_path: str, object_name: Optional[str] = None) -> Dict[str, Any]:
-        """Upload video file to MinIO storage"""
+    def upload_video(self, file_path: str, object_name: Optional[str] = None,
+                     content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Upload a file from disk to MinIO storage, in parallel parts when it is large"""
         if object_name is None:
             object_name = f"videos/{os.path.basename(file_path)}"
         
+        started = time.perf_counter()
         try:
             result = self.minio_client.fput_object(
                 self.bucket_name,
                 object_name,
                 file_path,
-                content_type="video/mp4"
+                content_type=content_type or _content_type(object_name),
+                part_size=self.part_size,
+                num_parallel_uploads=self.parallel_parts
             )
+            return _uploaded(result, object_name, os.path.getsize(file_path), started)
+        except Exception as e:
             return {
-                'status': 'uploaded',
+                'status': 'failed',
                 'object_name': object_name,
-                'etag': result.etag,
-                'version_id': result.version_id
+                'error': str(e)
             }
+    
+    def upload_bytes(self, data: bytes, object_name: str,
+                     content_type: str = "application/octet-stream") -> Dict[str, Any]:
+        """Upload an in-memory object to MinIO storage"""
+        return self.upload_stream(io.BytesIO(data), object_name, len(data), content_type)
+    
+    def upload_stream(self, stream: BinaryIO, object_name: str, length: int = -1,
+                      content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Upload from a readable buffer without a temporary file
+        
+        With ``length`` -1 the stream is read to its end in parts of
+        ``part_size``, so its size need not be known up front.
+        """
+        started = time.perf_counter()
+        position = stream.tell() if stream.seekable() else 0
+        try:
+            result = self.minio_client.put_object(
+                self.bucket_name,
+                object_name,
+                stream,
+                length=length,
+                content_type=content_type or _content_type(object_name),
+                part_size=self.part_size,
+                num_parallel_uploads=self.parallel_parts
+            )
+            size = length if length >= 0 else (stream.tell() - position if stream.seekable() else 0)
+            return _uploaded(result, object_name, size, started)
         except Exception as e:
             return {
                 'status': 'failed',
+                'object_name': object_name,
                 'error': str(e)
             }
     
+    def submit_upload(self, source: UploadSource, object_name: str,
+                      content_type: Optional[str] = None) -> Future:
+        """Upload on the worker pool; the future holds the same result as the upload_* methods"""
+        if isinstance(source, str):
+            return self.upload_pool.submit(self.upload_video, source, object_name, content_type)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        return self.upload_pool.submit(self._upload_buffer, source, object_name, content_type)
+    
+    def upload_batch(self, uploads: List[Tuple[UploadSource, str]], attempts: int = 3,
+                     content_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Upload (source, object_name) pairs concurrently on the worker pool
+        
+        Failed uploads are retried up to ``attempts`` times in all. Every
+        attempt writes the whole object under the same name, so a retry
+        after a partial failure leaves no duplicates. Results come back in
+        the order of ``uploads``, each with its size, time, throughput in
+        bytes per second and number of attempts.
+        """
+        sources = [io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+                   for source, _ in uploads]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(uploads)
+        pending = list(range(len(uploads)))
+        for attempt in range(1, attempts + 1):
+            futures = [(index, self.submit_upload(sources[index], uploads[index][1], content_type))
+                       for index in pending]
+            pending = []
+            for index, future in futures:
+                results[index] = future.result()
+                results[index]['attempts'] = attempt
+                if results[index]['status'] != 'uploaded':
+                    pending.append(index)
+            if not pending:
+                break
+        
+        uploaded = [result for result in results if result['status'] == 'uploaded']
+        if uploaded:
+            size = sum(result['size'] for result in uploaded)
+            seconds = max(result['seconds'] for result in uploaded)
+            print(f"Uploaded {len(uploaded)}/{len(results)} objects, {size / 1e6:.1f} MB "
+                  f"at {size / 1e6 / max(seconds, 1e-6):.1f} MB/s")
+        return results
+    
+    def _upload_buffer(self, stream: BinaryIO, object_name: str, content_type: Optional[str]) -> Dict[str, Any]:
+        """Upload a buffer from its start, so a retry sends the whole object again"""
+        if not stream.seekable():
+            return self.upload_stream(stream, object_name, -1, content_type)
+        length = stream.seek(0, io.SEEK_END)
+        stream.seek(0)
+        return self.upload_stream(stream, object_name, length, content_type)
+    
+    def download_bytes(self, object_name: str) -> Optional[bytes]:
+        """Download an object from MinIO storage into memory"""
+        response = None
+        try:
+            response = self.minio_client.get_object(self.bucket_name, object_name)
+            return response.read()
+        except Exception as e:
+            print(f"Error downloading object {object_name}: {e}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+    
     def download_video(self, object_name: str, file_path: str) -> Dict[str, Any]:
         """Download video file from MinIO storage"""
         try:
@@ -68,15 +220,42 @@ class StorageService:
     
     def get_presigned_url(self, object_name: str, expires_hours: int = 24) -> Dict[str, Any]:
         """Generate presigned URL for video access"""
+        result = self.get_presigned_urls([object_name], expires_hours)
+        if result['status'] != 'success':
+            return result
+        return {
+            'status': 'success',
+            'presigned_url': result['urls'][object_name]
+        }
+    
+    def get_presigned_urls(self, object_names: List[str], expires_hours: int = 24,
+                           refresh_margin: float = 0.1) -> Dict[str, Any]:
+        """Presigned URLs for many objects at once
+        
+        A URL is reused until less than ``refresh_margin`` of its lifetime
+        is left, so repeated listings only sign objects they have not seen.
+        """
+        lifetime = expires_hours * 3600
+        now = time.time()
+        urls = {}
         try:
-            presigned_url = self.minio_client.presigned_get_object(
-                self.bucket_name,
-                object_name,
-                expires=datetime.timedelta(hours=expires_hours)
-            )
+            with self._presigned_lock:
+                for object_name in object_names:
+                    cached = self._presigned.get(object_name)
+                    if cached is None or cached[1] - now < lifetime * refresh_margin:
+                        url = self.minio_client.presigned_get_object(
+                            self.bucket_name,
+                            object_name,
+                            expires=timedelta(seconds=lifetime)
+                        )
+                        cached = self._presigned[object_name] = (url, now + lifetime)
+                    urls[object_name] = cached[0]
+                # Drop expired entries so the cache stays as large as what is in use
+                if len(self._presigned) > 2 * len(urls) + 10000:
+                    self._presigned = {name: entry for name, entry in self._presigned.items() if entry[1] > now}
             return {
                 'status': 'success',
-                'presigned_url': presigned_url
+                'urls': urls
             }
         except Exception as e:
             return {
@@ -101,28 +280,73 @@ class StorageService:
                 'error': str(e)
             }
     
-    def list_videos(self, prefix: str = "videos/") -> Dict[str, Any]:
-        """List all video files in storage"""
+    def list_videos(self, prefix: str = "videos/", start_after: Optional[str] = None,
+                    limit: int = 1000) -> Dict[str, Any]:
+        """List one page of video files in storage
+        
+        ``next_token`` is the ``start_after`` of the next page, None after the last one.
+        """
         try:
-            objects = self.minio_client.list_objects(
-                self.bucket_name,
-                prefix=prefix,
-                recursive=True
-            )
-            video_list = []
-            for obj in objects:
-                video_list.append({
-                    'object_name': obj.object_name,
-                    'size': obj.size,
-                    'last_modified': obj.last_modified,
-                    'etag': obj.etag
-                })
+            videos = list(itertools.islice(self.iter_objects(prefix, start_after), limit))
             return {
                 'status': 'success',
-                'videos': video_list
+                'videos': videos,
+                'next_token': videos[-1]['object_name'] if len(videos) == limit else None
             }
         except Exception as e:
             return {
                 'status': 'failed',
                 'error': str(e)
-            }
\ No newline at end of file
+            }
+    
+    def iter_objects(self, prefix: str = "", start_after: Optional[str] = None,
+                     recursive: bool = True) -> Iterator[Dict[str, Any]]:
+        """Objects under the prefix in name order, fetched from MinIO a page at a time
+        
+        Nothing is held beyond the current page, so a listing of millions of
+        objects can be consumed incrementally and resumed with
+        ``start_after`` set to the last name seen. Errors are raised.
+        """
+        objects = self.minio_client.list_objects(
+            self.bucket_name,
+            prefix=prefix,
+            recursive=recursive,
+            start_after=start_after
+        )
+        for obj in objects:
+            yield {
+                'object_name': obj.object_name,
+                'size': obj.size,
+                'last_modified': obj.last_modified,
+                'etag': obj.etag
+            }
+    
+    def iter_camera_objects(self, kind: str, camera_id: str, start_day: date,
+                            end_day: date) -> Iterator[Dict[str, Any]]:
+        """Recordings or clips of a camera from ``start_day`` to ``end_day`` inclusive, one day prefix at a time"""
+        prefix = OBJECT_PREFIXES[kind]
+        day = start_day
+        while day <= end_day:
+            yield from self.iter_objects(prefix(camera_id, day))
+            day += timedelta(days=1)
+    
+    def close(self):
+        """Wait for queued uploads"""
+        self.upload_pool.shutdown(wait=True)
+
+
+def _content_type(object_name: str) -> str:
+    return mimetypes.guess_type(object_name)[0] or "application/octet-stream"
+
+
+def _uploaded(result, object_name: str, size: int, started: float) -> Dict[str, Any]:
+    seconds = time.perf_counter() - started
+    return {
+        'status': 'uploaded',
+        'object_name': object_name,
+        'etag': result.etag,
+        'version_id': result.version_id,
+        'size': size,
+        'seconds': round(seconds, 3),
+        'throughput': size / seconds if seconds > 0 else 0.0
+    }
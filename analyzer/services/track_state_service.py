@@ -0,0 +1,135 @@
+# services/track_state_service.py
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+from collections import Counter
+import numpy as np
+from .tracking_service import Track, TrackHistoryBuffer, ground_points
+from .static_object_service import StaticObject
+
+
+TRACK_STATE_TOPIC = 'insightcore-track-states'
+
+
+def encode_track_state(camera_id: str, frame_time: datetime, tracks: List[Track],
+                       static_objects: Optional[List[StaticObject]] = None) -> Dict[str, Any]:
+    """Compact per-frame message: only this frame's boxes of every track, rounded to 0.1 px
+
+    A track matched by several detections of the frame is listed once per
+    detection, each with the box it appended.
+    """
+    appearances = Counter(track.track_id for track in tracks)
+    seen: Counter = Counter()
+    rows = []
+    for track in tracks:
+        seen[track.track_id] += 1
+        bbox = track.bbox_history[seen[track.track_id] - appearances[track.track_id] - 1]
+        rows.append([track.track_id, track.class_name, round(float(track.confidence), 3),
+                     *(round(float(value), 1) for value in bbox)])
+    state = {
+        'type': 'frame',
+        'camera_id': camera_id,
+        'time': frame_time.isoformat(),
+        'tracks': rows
+    }
+    if static_objects is not None:
+        state['static_objects'] = [
+            [static_object.object_id, *(round(value, 1) for value in static_object.bbox),
+             static_object.first_seen.isoformat(), round(static_object.score, 3),
+             static_object.owner_track_id, static_object.owner_class]
+            for static_object in static_objects
+        ]
+    return state
+
+
+class TrackStatePublisher:
+    """Publishes track states of inference workers for a separate rule service.
+
+    Messages are keyed by camera, so every camera's frames land on one
+    partition in order and one rule-service consumer owns the camera.
+    """
+
+    def __init__(self, kafka_producer, topic: str = TRACK_STATE_TOPIC):
+        self.kafka_producer = kafka_producer
+        self.topic = topic
+
+    def publish(self, camera_id: str, frame_time: datetime, tracks: List[Track],
+                static_objects: Optional[List[StaticObject]] = None):
+        self.kafka_producer.send(self.topic, encode_track_state(camera_id, frame_time, tracks, static_objects),
+                                 key=camera_id.encode('utf-8'))
+
+    def end(self, camera_id: str):
+        """Tell the rule service a stream or file of the camera is over"""
+        self.kafka_producer.send(self.topic, {'type': 'end', 'camera_id': camera_id},
+                                 key=camera_id.encode('utf-8'))
+
+
+class TrackStateAssembler:
+    """Rebuilds tracks of one camera from its track-state messages.
+
+    Box, center and time histories and the ground-point ring buffer grow
+    exactly as they do in the inference worker's tracker, so rules see the
+    same state they would see inline. Tracks unseen for
+    ``max_inactive_time`` seconds are dropped.
+    """
+
+    def __init__(self, max_inactive_time: float = 30.0, history_length: int = 32):
+        self.max_inactive_time = max_inactive_time
+        self.tracks: Dict[int, Track] = {}
+        self.history = TrackHistoryBuffer(length=history_length)
+
+    def apply(self, state: Dict[str, Any]) -> Tuple[datetime, List[Track], Optional[List[StaticObject]]]:
+        """Fold one frame message in and return its time, tracks and static objects"""
+        frame_time = datetime.fromisoformat(state['time'])
+        timestamp = frame_time.timestamp()
+
+        frame_tracks = []
+        for track_id, class_name, confidence, x1, y1, x2, y2 in state['tracks']:
+            track = self.tracks.get(track_id)
+            if track is None:
+                track = Track(
+                    track_id=track_id,
+                    class_name=class_name,
+                    bbox_history=[],
+                    center_history=[],
+                    first_seen=frame_time,
+                    last_seen=frame_time,
+                    confidence=confidence,
+                    time_history=[]
+                )
+                self.tracks[track_id] = track
+            track.bbox_history.append((x1, y1, x2, y2))
+            track.center_history.append(((x1 + x2) / 2, (y1 + y2) / 2))
+            track.time_history.append(timestamp)
+            track.last_seen = frame_time
+            track.confidence = confidence
+            frame_tracks.append(track)
+
+        for track_id, track in list(self.tracks.items()):
+            if (frame_time - track.last_seen).total_seconds() > self.max_inactive_time:
+                del self.tracks[track_id]
+                self.history.release(track_id)
+
+        unique_tracks = list({track.track_id: track for track in frame_tracks}.values())
+        if unique_tracks:
+            self.history.push(
+                [track.track_id for track in unique_tracks],
+                ground_points([track.bbox_history[-1] for track in unique_tracks]),
+                np.full(len(unique_tracks), timestamp)
+            )
+
+        static_objects = None
+        if 'static_objects' in state:
+            static_objects = [
+                StaticObject(
+                    object_id=object_id,
+                    bbox=(x1, y1, x2, y2),
+                    first_seen=datetime.fromisoformat(first_seen),
+                    last_seen=frame_time,
+                    score=score,
+                    owner_track_id=owner_track_id,
+                    owner_class=owner_class
+                )
+                for object_id, x1, y1, x2, y2, first_seen, score, owner_track_id, owner_class
+                in state['static_objects']
+            ]
+        return frame_time, frame_tracks, static_objects
@@ -0,0 +1,212 @@
+# services/track_store_service.py
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+import io
+import json
+import numpy as np
+from .tracking_service import Track, TrackHistoryBuffer, ground_points
+from .storage_service import StorageService
+
+
+TRACK_ARTIFACT_VERSION = 1
+
+
+@dataclass
+class TrackArtifact:
+    """Columnar per-frame track data for one processed video file.
+
+    Every row is one track observed in one frame; rows are ordered by frame.
+    """
+    frame_index: np.ndarray   # int32 (N,)
+    offset: np.ndarray        # float64 (N,) seconds from start_time
+    track_id: np.ndarray      # int64 (N,)
+    class_index: np.ndarray   # int16 (N,) index into class_names
+    confidence: np.ndarray    # float32 (N,)
+    bbox: np.ndarray          # float32 (N, 4) x1, y1, x2, y2
+    class_names: List[str]
+    meta: Dict[str, Any]
+
+    @property
+    def start_time(self) -> datetime:
+        return datetime.fromisoformat(self.meta['start_time'])
+
+    @property
+    def frame_count(self) -> int:
+        return int(np.unique(self.frame_index).size)
+
+
+class TrackRecorder:
+    """Accumulates per-frame track observations while a file is processed"""
+
+    def __init__(self, camera_id: str, video_file_id: str, model_version: str,
+                 start_time: datetime, fps: float):
+        self.meta = {
+            'version': TRACK_ARTIFACT_VERSION,
+            'camera_id': camera_id,
+            'video_file_id': video_file_id,
+            'model_version': model_version,
+            'start_time': start_time.isoformat(),
+            'fps': fps,
+        }
+        self.start_time = start_time
+        self.class_names: List[str] = []
+        self._class_lookup: Dict[str, int] = {}
+        self._frame_index: List[int] = []
+        self._offset: List[float] = []
+        self._track_id: List[int] = []
+        self._class_index: List[int] = []
+        self._confidence: List[float] = []
+        self._bbox: List[Tuple[float, float, float, float]] = []
+
+    def add_frame(self, frame_index: int, frame_time: datetime, tracks: List[Track]):
+        """Record the tracks visible in a single frame"""
+        offset = (frame_time - self.start_time).total_seconds()
+        for track in tracks:
+            class_index = self._class_lookup.get(track.class_name)
+            if class_index is None:
+                class_index = len(self.class_names)
+                self._class_lookup[track.class_name] = class_index
+                self.class_names.append(track.class_name)
+
+            self._frame_index.append(frame_index)
+            self._offset.append(offset)
+            self._track_id.append(track.track_id)
+            self._class_index.append(class_index)
+            self._confidence.append(track.confidence)
+            self._bbox.append(track.bbox_history[-1])
+
+    def to_artifact(self) -> TrackArtifact:
+        """Freeze recorded rows into a columnar artifact"""
+        return TrackArtifact(
+            frame_index=np.asarray(self._frame_index, dtype=np.int32),
+            offset=np.asarray(self._offset, dtype=np.float64),
+            track_id=np.asarray(self._track_id, dtype=np.int64),
+            class_index=np.asarray(self._class_index, dtype=np.int16),
+            confidence=np.asarray(self._confidence, dtype=np.float32),
+            bbox=np.asarray(self._bbox, dtype=np.float32).reshape(-1, 4),
+            class_names=list(self.class_names),
+            meta=dict(self.meta)
+        )
+
+
+class TrackStoreService:
+    """Service class for persisting and replaying per-file track artifacts in MinIO"""
+
+    def __init__(self, storage_service: StorageService, model_version: str):
+        self.storage_service = storage_service
+        self.model_version = model_version
+
+    @staticmethod
+    def object_name(video_file_id: str, model_version: str) -> str:
+        """MinIO object name of the artifact for a file and model version"""
+        return f"tracks/{video_file_id}/{model_version}.npz"
+
+    @staticmethod
+    def serialize(artifact: TrackArtifact) -> bytes:
+        """Encode an artifact as a compressed NPZ archive"""
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            frame_index=artifact.frame_index,
+            offset=artifact.offset,
+            track_id=artifact.track_id,
+            class_index=artifact.class_index,
+            confidence=artifact.confidence,
+            bbox=artifact.bbox,
+            class_names=np.asarray(artifact.class_names, dtype=str),
+            meta=np.asarray(json.dumps(artifact.meta))
+        )
+        return buffer.getvalue()
+
+    @staticmethod
+    def deserialize(data: bytes) -> TrackArtifact:
+        """Decode an artifact produced by serialize()"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            return TrackArtifact(
+                frame_index=archive['frame_index'],
+                offset=archive['offset'],
+                track_id=archive['track_id'],
+                class_index=archive['class_index'],
+                confidence=archive['confidence'],
+                bbox=archive['bbox'],
+                class_names=[str(name) for name in archive['class_names']],
+                meta=json.loads(str(archive['meta']))
+            )
+
+    def save(self, artifact: TrackArtifact) -> Dict[str, Any]:
+        """Upload an artifact keyed by its video file and model version"""
+        object_name = self.object_name(artifact.meta['video_file_id'], artifact.meta['model_version'])
+        return self.storage_service.upload_bytes(
+            self.serialize(artifact),
+            object_name,
+            content_type="application/x-npz"
+        )
+
+    def load(self, video_file_id: str, model_version: Optional[str] = None) -> Optional[TrackArtifact]:
+        """Download the artifact for a video file, or None if it was never recorded"""
+        data = self.storage_service.download_bytes(
+            self.object_name(video_file_id, model_version or self.model_version)
+        )
+        if data is None:
+            return None
+        return self.deserialize(data)
+
+    @staticmethod
+    def iter_frames(artifact: TrackArtifact,
+                    history: Optional[TrackHistoryBuffer] = None) -> Iterator[Tuple[datetime, List[Track]]]:
+        """Replay an artifact as (frame_time, tracks) pairs in frame order.
+
+        Track histories are rebuilt incrementally, so rules see the same
+        bbox/center history they saw during the original run. When given,
+        ``history`` is filled with ground points like the live tracker does.
+        """
+        if artifact.frame_index.size == 0:
+            return
+
+        start_time = artifact.start_time
+        centers = np.column_stack((
+            (artifact.bbox[:, 0] + artifact.bbox[:, 2]) / 2,
+            (artifact.bbox[:, 1] + artifact.bbox[:, 3]) / 2
+        )).tolist()
+        bboxes = artifact.bbox.tolist()
+        grounds = ground_points(artifact.bbox)
+        track_ids = artifact.track_id.tolist()
+        class_index = artifact.class_index.tolist()
+        confidence = artifact.confidence.tolist()
+        offsets = artifact.offset.tolist()
+
+        boundaries = np.flatnonzero(np.diff(artifact.frame_index)) + 1
+        starts = [0] + boundaries.tolist()
+        ends = boundaries.tolist() + [artifact.frame_index.size]
+
+        tracks: Dict[int, Track] = {}
+        for start, end in zip(starts, ends):
+            frame_time = start_time + timedelta(seconds=offsets[start])
+            timestamp = frame_time.timestamp()
+            frame_tracks = []
+            for row in range(start, end):
+                track = tracks.get(track_ids[row])
+                if track is None:
+                    track = Track(
+                        track_id=track_ids[row],
+                        class_name=artifact.class_names[class_index[row]],
+                        bbox_history=[],
+                        center_history=[],
+                        first_seen=frame_time,
+                        last_seen=frame_time,
+                        confidence=confidence[row],
+                        time_history=[]
+                    )
+                    tracks[track_ids[row]] = track
+                track.bbox_history.append(tuple(bboxes[row]))
+                track.center_history.append(tuple(centers[row]))
+                track.time_history.append(timestamp)
+                track.last_seen = frame_time
+                track.confidence = confidence[row]
+                frame_tracks.append(track)
+            if history is not None:
+                unique_ids, unique_rows = np.unique(artifact.track_id[start:end], return_index=True)
+                history.push(unique_ids.tolist(), grounds[start + unique_rows],
+                             np.full(unique_ids.size, timestamp))
+            yield frame_time, frame_tracks
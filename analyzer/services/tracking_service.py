@@ -1,7 +1,7 @@
 # services/tracking_service.py
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Callable
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import numpy as np
 from .detection_service import Detection
 
@@ -17,19 +17,126 @@ class Track:
     last_seen: datetime
     confidence: float
     is_active: bool = True
+    time_history: List[float] = field(default_factory=list)  # frame timestamps (epoch seconds)
+
+
+class TrackHistoryBuffer:
+    """Fixed-size ring buffer of recent ground points of every active track.
+    
+    Each track owns a slot of ``length`` samples of (x, y, t), where (x, y)
+    is the bottom center of its box (the point touching the ground). Slots
+    are reused, so kinematics of all tracks can be computed with array
+    operations without walking per-track history lists.
+    """
+    
+    def __init__(self, length: int = 32, capacity: int = 128):
+        self.length = length
+        self.points = np.zeros((capacity, length, 2), dtype=np.float64)
+        self.times = np.zeros((capacity, length), dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.heads = np.zeros(capacity, dtype=np.int64)
+        self.slots: Dict[int, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+    
+    def _slot(self, track_id: int) -> int:
+        slot = self.slots.get(track_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self.counts[slot] = 0
+            self.heads[slot] = 0
+            self.slots[track_id] = slot
+        return slot
+    
+    def _grow(self):
+        capacity = self.counts.size
+        self.points = np.concatenate((self.points, np.zeros_like(self.points)))
+        self.times = np.concatenate((self.times, np.zeros_like(self.times)))
+        self.counts = np.concatenate((self.counts, np.zeros_like(self.counts)))
+        self.heads = np.concatenate((self.heads, np.zeros_like(self.heads)))
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+    
+    def push(self, track_ids: List[int], points: np.ndarray, times: np.ndarray):
+        """Append one sample per track (track ids must be unique)"""
+        if not track_ids:
+            return
+        slots = np.array([self._slot(track_id) for track_id in track_ids], dtype=np.int64)
+        heads = self.heads[slots]
+        self.points[slots, heads] = points
+        self.times[slots, heads] = times
+        self.heads[slots] = (heads + 1) % self.length
+        self.counts[slots] = np.minimum(self.counts[slots] + 1, self.length)
+    
+    def release(self, track_id: int):
+        """Free the slot of a track that is no longer active"""
+        slot = self.slots.pop(track_id, None)
+        if slot is not None:
+            self._free.append(slot)
+    
+    def window(self, track_ids: List[int], size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Latest ``size`` samples of each track, oldest first
+        
+        Returns points (n, size, 2), times (n, size) and a validity mask
+        (n, size); tracks without a slot get no valid samples.
+        """
+        size = min(size, self.length)
+        known = np.array([track_id in self.slots for track_id in track_ids], dtype=bool)
+        slots = np.array([self.slots.get(track_id, 0) for track_id in track_ids], dtype=np.int64)
+        
+        positions = (self.heads[slots, None] - size + np.arange(size)[None, :]) % self.length
+        points = self.points[slots[:, None], positions]
+        times = self.times[slots[:, None], positions]
+        available = np.where(known, np.minimum(self.counts[slots], size), 0)
+        valid = np.arange(size)[None, :] >= (size - available)[:, None]
+        return points, times, valid
+    
+    def load(self, track_id: int, points: np.ndarray, times: np.ndarray):
+        """Fill the slot of a track with samples, oldest first (restoring a checkpoint)"""
+        slot = self._slot(track_id)
+        count = min(len(times), self.length)
+        self.points[slot, :count] = np.asarray(points, dtype=np.float64).reshape(-1, 2)[-count:]
+        self.times[slot, :count] = np.asarray(times, dtype=np.float64)[-count:]
+        self.counts[slot] = count
+        self.heads[slot] = count % self.length
+    
+    def clear(self):
+        """Release every slot"""
+        self.slots = {}
+        self._free = list(range(self.counts.size - 1, -1, -1))
+
+
+def ground_points(bboxes: np.ndarray) -> np.ndarray:
+    """Bottom centers of (n, 4) x1, y1, x2, y2 boxes"""
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    return np.column_stack(((bboxes[:, 0] + bboxes[:, 2]) / 2, bboxes[:, 3]))
 
 
 class TrackingService:
     """Service class for handling object tracking logic"""
     
-    def __init__(self, max_inactive_time: int = 30):  # 30 seconds timeout
+    def __init__(self, max_inactive_time: int = 30, history_length: int = 32,  # 30 seconds timeout
+                 id_allocator: Optional[Callable[[], int]] = None):
         self.tracks: Dict[int, Track] = {}
         self.next_track_id = 1
         self.max_inactive_time = max_inactive_time
+        self.history = TrackHistoryBuffer(length=history_length)
+        # Source of track ids shared by all workers; without one ids are local from 1
+        self.id_allocator = id_allocator
     
-    def track_objects(self, detections: List[Detection], frame_shape: Tuple[int, int]) -> List[Track]:
+    def _new_track_id(self) -> int:
+        if self.id_allocator is not None:
+            return self.id_allocator()
+        track_id = self.next_track_id
+        self.next_track_id += 1
+        return track_id
+    
+    def track_objects(self, detections: List[Detection], frame_shape: Tuple[int, int],
+                      frame_time: Optional[datetime] = None) -> List[Track]:
         """Simple object tracking using bounding box matching"""
         current_tracks = []
+        current_time = frame_time or datetime.now()
+        timestamp = current_time.timestamp()
         
         for detection in detections:
             # Find closest existing track
@@ -53,38 +160,52 @@ class TrackingService:
                 track = self.tracks[best_match]
                 track.bbox_history.append(detection.bbox)
                 track.center_history.append(detection.center)
-                track.last_seen = datetime.now()
+                track.time_history.append(timestamp)
+                track.last_seen = current_time
                 track.confidence = max(track.confidence, detection.confidence)
                 current_tracks.append(track)
             else:
                 # Create new track
                 new_track = Track(
-                    track_id=self.next_track_id,
+                    track_id=self._new_track_id(),
                     class_name=detection.class_name,
                     bbox_history=[detection.bbox],
                     center_history=[detection.center],
-                    first_seen=datetime.now(),
-                    last_seen=datetime.now(),
-                    confidence=detection.confidence
+                    first_seen=current_time,
+                    last_seen=current_time,
+                    confidence=detection.confidence,
+                    time_history=[timestamp]
                 )
-                self.tracks[self.next_track_id] = new_track
+                self.tracks[new_track.track_id] = new_track
                 current_tracks.append(new_track)
-                self.next_track_id += 1
         
         # Deactivate old tracks
-        current_time = datetime.now()
         for track_id, track in list(self.tracks.items()):
-            if (current_time - track.last_seen).seconds > self.max_inactive_time:
+            if track.is_active and (current_time - track.last_seen).seconds > self.max_inactive_time:
                 track.is_active = False
+                self.history.release(track_id)
         
         # Keep only active tracks
         active_tracks = [track for track in current_tracks if track.is_active]
+        
+        # Record this frame's ground points of every track in one write
+        unique_tracks = list({track.track_id: track for track in active_tracks}.values())
+        if unique_tracks:
+            self.history.push(
+                [track.track_id for track in unique_tracks],
+                ground_points([track.bbox_history[-1] for track in unique_tracks]),
+                np.full(len(unique_tracks), timestamp)
+            )
         return active_tracks
     
     def get_all_tracks(self) -> List[Track]:
         """Get all current tracks"""
         return list(self.tracks.values())
     
+    def get_recent_tracks(self, since: datetime) -> List[Track]:
+        """Active tracks and inactive ones last seen at or after ``since``"""
+        return [track for track in self.tracks.values() if track.is_active or track.last_seen >= since]
+    
     def get_active_tracks(self) -> List[Track]:
         """Get only active tracks"""
         return [track for track in self.tracks.values() if track.is_active]
@@ -92,4 +213,5 @@ class TrackingService:
     def reset_tracks(self):
         """Reset all tracks"""
         self.tracks = {}
-        self.next_track_id = 1
\ No newline at end of file
+        self.next_track_id = 1
+        self.history.clear()
\ No newline at end of file
@@ -0,0 +1,309 @@
+# services/trajectory_rule_service.py
+from typing import List, Dict, Tuple, Optional
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+import numpy as np
+from .geometry import points_in_polygon, segments_cross_polyline
+from .track_store_service import TrackArtifact
+from .condition_compiler import features_from_trajectories
+from .speed_service import SpeedEstimationService, speed_threshold, speed_mask
+from .occupancy_service import OccupancyService, capacity_limit, hysteresis_mask, occupancy_event
+
+
+@dataclass
+class Trajectories:
+    """Complete trajectories of every track in a file.
+
+    Rows of all tracks are concatenated, grouped by track and ordered by
+    time inside each track, so per-track (time x xy) arrays are contiguous
+    slices and whole-file features are single numpy expressions.
+    """
+    track_ids: np.ndarray     # (N,) track id per track
+    starts: np.ndarray        # (N,) first row of each track
+    lengths: np.ndarray       # (N,) number of rows of each track
+    row_track: np.ndarray     # (M,) track number (0..N-1) of each row
+    t: np.ndarray             # (M,) seconds from start_time
+    xy: np.ndarray            # (M, 2) box centers
+    bbox: np.ndarray          # (M, 4) x1, y1, x2, y2
+    confidence: np.ndarray    # (M,)
+    class_index: np.ndarray   # (M,) index into class_names
+    class_names: List[str]
+    start_time: datetime
+
+    @classmethod
+    def from_artifact(cls, artifact: TrackArtifact) -> 'Trajectories':
+        """Regroup a frame-ordered artifact by track"""
+        order = np.lexsort((artifact.offset, artifact.track_id))
+        track_id = artifact.track_id[order]
+        bbox = artifact.bbox[order].astype(np.float64)
+
+        boundaries = np.flatnonzero(np.diff(track_id)) + 1
+        starts = np.concatenate(([0], boundaries)).astype(np.int64) if track_id.size else np.zeros(0, dtype=np.int64)
+        lengths = np.diff(np.append(starts, track_id.size))
+
+        return cls(
+            track_ids=track_id[starts],
+            starts=starts,
+            lengths=lengths,
+            row_track=np.repeat(np.arange(starts.size), lengths),
+            t=artifact.offset[order],
+            xy=np.column_stack(((bbox[:, 0] + bbox[:, 2]) / 2, (bbox[:, 1] + bbox[:, 3]) / 2)),
+            bbox=bbox,
+            confidence=artifact.confidence[order],
+            class_index=artifact.class_index[order],
+            class_names=list(artifact.class_names),
+            start_time=artifact.start_time
+        )
+
+    @property
+    def row_count(self) -> int:
+        return int(self.t.size)
+
+    def track_xy(self, track_number: int) -> np.ndarray:
+        """(time x xy) trajectory of a single track"""
+        start = self.starts[track_number]
+        return self.xy[start:start + self.lengths[track_number]]
+
+    def first_rows(self) -> np.ndarray:
+        """Boolean (M,) mask of the first row of every track"""
+        mask = np.zeros(self.row_count, dtype=bool)
+        mask[self.starts] = True
+        return mask
+
+    def row_position(self) -> np.ndarray:
+        """Index of each row within its own track"""
+        return np.arange(self.row_count) - np.repeat(self.starts, self.lengths)
+
+    def previous(self, values: np.ndarray) -> np.ndarray:
+        """Shift values one row back inside each track; first rows keep their own value"""
+        shifted = np.empty_like(values)
+        if values.shape[0]:
+            shifted[1:] = values[:-1]
+            shifted[self.starts] = values[self.starts]
+        return shifted
+
+    def class_mask(self, class_names: List[str]) -> np.ndarray:
+        """Boolean (M,) mask of rows whose class is in class_names"""
+        wanted = [index for index, name in enumerate(self.class_names) if name in class_names]
+        return np.isin(self.class_index, wanted)
+
+    def speed(self) -> np.ndarray:
+        """Per-row speed in pixels per second from finite differences"""
+        step = self.xy - self.previous(self.xy)
+        dt = self.t - self.previous(self.t)
+        distance = np.hypot(step[:, 0], step[:, 1])
+        return np.divide(distance, dt, out=np.zeros_like(distance), where=dt > 0)
+
+    def dwell(self, mask: np.ndarray) -> np.ndarray:
+        """Seconds each row has spent continuously inside mask since its track entered it"""
+        entered = self.rising_edges(mask)
+        entry_row = np.maximum.accumulate(np.where(entered, np.arange(self.row_count), 0))
+        return np.where(mask, self.t - self.t[entry_row], 0.0)
+
+    def occupancy(self, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Number of rows inside mask at every distinct frame time, as (times, counts)"""
+        times, frame_of_row = np.unique(self.t, return_inverse=True)
+        counts = np.bincount(frame_of_row[mask], minlength=times.size)
+        return times, counts
+
+    def rising_edges(self, mask: np.ndarray) -> np.ndarray:
+        """Rows where mask turns on within a track (including a track's first row)"""
+        return mask & ~(self.previous(mask) & ~self.first_rows())
+
+
+def schedule_mask(rule: Dict, start_time: datetime, offsets: np.ndarray) -> Optional[np.ndarray]:
+    """Whether the rule's schedule is active at each moment (seconds after start_time); None without a schedule"""
+    schedule = rule.get('_schedule')
+    if schedule is None:
+        return None
+    minutes = np.floor((start_time.timestamp() + offsets) / 60).astype(np.int64)
+    unique, inverse = np.unique(minutes, return_inverse=True)
+    return schedule.active_minutes(unique)[inverse.reshape(-1)]
+
+
+def gate(mask: np.ndarray, active: Optional[np.ndarray]) -> np.ndarray:
+    return mask if active is None else mask & active
+
+
+class TrajectoryRuleService:
+    """Service class for evaluating rules over whole trajectories of an offline file.
+
+    Semantics follow the live RuleEngineService, except that state-like
+    conditions (being in a forbidden zone, loitering) fire once when they
+    start instead of on every frame they hold.
+    """
+
+    def __init__(self, speed_service: Optional[SpeedEstimationService] = None,
+                 occupancy_service: Optional[OccupancyService] = None, timezone: str = 'UTC'):
+        self.speed_service = speed_service or SpeedEstimationService()
+        self.occupancy_service = occupancy_service or OccupancyService()
+        # Timezone of the hour and weekday fields of custom conditions
+        self.timezone = timezone
+
+    def evaluate(self, trajectories: Trajectories, rules: List[Dict],
+                 homography: Optional[np.ndarray] = None) -> List[Dict]:
+        """Evaluate all rules for all tracks at once and return events ordered by time
+
+        homography is the camera's ground-plane calibration used by speed rules.
+        Rules with a ``_schedule`` (see RuleEngineService.prepare_rules) only
+        see the rows inside their schedule.
+        """
+        events = []
+        if trajectories.row_count == 0:
+            return events
+
+        # Feature table shared by all custom rules of this file
+        features = None
+        speeds = None
+
+        for rule in rules:
+            try:
+                # The schedule gates the condition before edge detection, as in the live engine,
+                # so an episode that starts before a window opens fires on its first frame inside it
+                active = schedule_mask(rule, trajectories.start_time, trajectories.t)
+                if rule['rule_type'] == 'line_crossing':
+                    events.extend(self._check_line_crossing_rule(trajectories, rule, active))
+                elif rule['rule_type'] == 'zone_violation':
+                    events.extend(self._check_zone_violation_rule(trajectories, rule, active))
+                elif rule['rule_type'] == 'loitering':
+                    events.extend(self._check_loitering_rule(trajectories, rule, active))
+                elif rule['rule_type'] == 'custom' and rule.get('_condition') is not None:
+                    if features is None:
+                        features = features_from_trajectories(trajectories, self.timezone)
+                    events.extend(self._check_custom_rule(trajectories, rule, features, active))
+                elif rule['rule_type'] == 'speed_detection':
+                    if speeds is None:
+                        speeds = self.speed_service.trajectory_speeds(trajectories, homography)
+                    events.extend(self._check_speed_rule(trajectories, rule, speeds, homography is not None, active))
+                elif rule['rule_type'] == 'counting' and rule.get('_zone') is not None:
+                    events.extend(self._check_counting_rule(trajectories, rule))
+            except Exception as e:
+                # One broken rule must not stop the others
+                print(f"Error evaluating rule {rule['id']} over trajectories: {e}")
+
+        events.sort(key=lambda event: event['timestamp'])
+        return events
+
+    def _check_line_crossing_rule(self, trajectories: Trajectories, rule: Dict,
+                                  active: Optional[np.ndarray] = None) -> List[Dict]:
+        """Rows whose movement since the previous row crosses the rule line"""
+        line_points = rule['conditions'].get('line_points', [])
+        if len(line_points) < 2:
+            return []
+
+        crossed = gate(segments_cross_polyline(trajectories.previous(trajectories.xy), trajectories.xy, line_points),
+                       active)
+        return self._make_events(trajectories, rule, np.flatnonzero(crossed), 'crossed line')
+
+    def _check_zone_violation_rule(self, trajectories: Trajectories, rule: Dict,
+                                   active: Optional[np.ndarray] = None) -> List[Dict]:
+        """Entries of forbidden objects into the rule zone"""
+        zone_polygon = rule['conditions'].get('zone_polygon', [])
+        forbidden_objects = rule['conditions'].get('forbidden_objects', [])
+        if not zone_polygon or not forbidden_objects:
+            return []
+
+        violating = points_in_polygon(trajectories.xy, zone_polygon) & trajectories.class_mask(forbidden_objects)
+        rows = np.flatnonzero(trajectories.rising_edges(gate(violating, active)))
+        return self._make_events(trajectories, rule, rows, 'in forbidden zone')
+
+    def _check_loitering_rule(self, trajectories: Trajectories, rule: Dict,
+                              active: Optional[np.ndarray] = None) -> List[Dict]:
+        """Starts of periods where the last window of centers stays within a small radius"""
+        window = int(rule['conditions'].get('window_frames', 10))
+        max_distance = float(rule['conditions'].get('max_distance', 50))
+        if trajectories.row_count < window:
+            return []
+
+        # windows[i] holds rows i .. i + window - 1 and ends at row i + window - 1
+        windows = np.lib.stride_tricks.sliding_window_view(trajectories.xy, window, axis=0)
+        mean = windows.mean(axis=2, keepdims=True)
+        spread = np.sqrt(((windows - mean) ** 2).sum(axis=1)).max(axis=1)
+
+        loitering = np.zeros(trajectories.row_count, dtype=bool)
+        loitering[window - 1:] = spread < max_distance
+        # The live rule needs more than `window` points of history
+        loitering &= trajectories.row_position() >= window
+
+        rows = np.flatnonzero(trajectories.rising_edges(gate(loitering, active)))
+        return self._make_events(trajectories, rule, rows, 'loitering detected')
+
+    def _check_custom_rule(self, trajectories: Trajectories, rule: Dict,
+                           features: Dict[str, np.ndarray], active: Optional[np.ndarray] = None) -> List[Dict]:
+        """Starts of periods where the rule's compiled condition holds"""
+        matched = gate(rule['_condition'](features), active)
+        rows = np.flatnonzero(trajectories.rising_edges(matched))
+        return self._make_events(trajectories, rule, rows, 'matched condition')
+
+    def _check_speed_rule(self, trajectories: Trajectories, rule: Dict,
+                          speeds: np.ndarray, calibrated: bool, active: Optional[np.ndarray] = None) -> List[Dict]:
+        """Starts of periods where a track moves faster than the rule limit"""
+        limit = speed_threshold(rule['conditions'], calibrated)
+        if limit is None:
+            return []
+
+        class_names = np.asarray(trajectories.class_names, dtype=str)[trajectories.class_index] \
+            if trajectories.class_names else np.zeros(0, dtype=str)
+        speeding = speed_mask(speeds, limit, class_names, trajectories.xy, rule['conditions'])
+        rows = np.flatnonzero(trajectories.rising_edges(gate(speeding, active)))
+        events = self._make_events(trajectories, rule, rows, 'speeding')
+
+        scale, unit = (3.6, 'km/h') if calibrated else (1.0, 'px/s')
+        for event, row in zip(events, rows.tolist()):
+            speed = float(speeds[row]) * scale
+            frame_time = trajectories.start_time + timedelta(seconds=float(trajectories.t[row]))
+            event['speed'] = round(speed, 1)
+            event['message'] = f"{event['object_class']} moving at {speed:.1f} {unit} at {frame_time}"
+        return events
+
+    def _check_counting_rule(self, trajectories: Trajectories, rule: Dict) -> List[Dict]:
+        """Frames where the rule zone goes over capacity, with the live engine's hysteresis"""
+        limit, hysteresis = capacity_limit(rule)
+        if limit <= 0:
+            return []
+
+        zone = rule['_zone']
+        times, counts, _ = self.occupancy_service.trajectory_counts(rule['camera_id'], [zone], trajectories)
+        over = gate(hysteresis_mask(counts[:, 0], limit, hysteresis),
+                    schedule_mask(rule, trajectories.start_time, times))
+        starts = np.flatnonzero(over & ~np.concatenate(([False], over[:-1])))
+        if starts.size == 0:
+            return []
+
+        allowed_objects = zone.get('allowed_objects') or []
+        counted = points_in_polygon(trajectories.xy, zone['polygon'])
+        if allowed_objects:
+            counted &= trajectories.class_mask(allowed_objects)
+
+        events = []
+        for frame in starts.tolist():
+            rows = np.flatnonzero(counted & (trajectories.t == times[frame]))
+            # One row per track, as in the live count
+            rows = rows[np.unique(trajectories.row_track[rows], return_index=True)[1]]
+            frame_time = trajectories.start_time + timedelta(seconds=float(times[frame]))
+            events.append(occupancy_event(
+                rule, frame_time, int(counts[frame, 0]), limit,
+                [trajectories.class_names[index] for index in trajectories.class_index[rows].tolist()],
+                trajectories.bbox[rows], trajectories.confidence[rows]
+            ))
+        return events
+
+    def _make_events(self, trajectories: Trajectories, rule: Dict, rows: np.ndarray, action: str) -> List[Dict]:
+        """Build event dicts in the live engine's format for the given rows"""
+        events = []
+        for row in rows.tolist():
+            frame_time = trajectories.start_time + timedelta(seconds=float(trajectories.t[row]))
+            class_name = trajectories.class_names[trajectories.class_index[row]]
+            events.append({
+                'rule_id': rule['id'],
+                'camera_id': rule['camera_id'],
+                'timestamp': frame_time.isoformat(),
+                'object_class': class_name,
+                'track_id': int(trajectories.track_ids[trajectories.row_track[row]]),
+                'bbox': tuple(trajectories.bbox[row].tolist()),
+                'confidence': float(trajectories.confidence[row]),
+                'severity': rule['severity'],
+                'rule_type': rule['rule_type'],
+                'message': f'{class_name} {action} at {frame_time}'
+            })
+        return events
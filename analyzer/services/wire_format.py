@@ -0,0 +1,307 @@
+# services/wire_format.py
+"""Binary Kafka payloads for events and track states.
+
+Every message starts with a 4-byte header: magic b'IC', schema version
+and message type. Numbers use fixed little-endian struct layouts, UUIDs
+are sent as 16 raw bytes and timestamps as integer microseconds, so an
+event takes about a third of its JSON size and track states a fraction
+of that. Anything else (commands) stays JSON, and decode() accepts JSON
+payloads too, so producers and consumers can be upgraded independently.
+The backend keeps a copy of the decoders in events/wire_format.py; both
+must change together and bump VERSION on any layout change.
+"""
+from typing import Dict, Any, Tuple, Callable
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+import json
+import struct
+import uuid
+import numpy as np
+
+
+MAGIC = b'IC'
+VERSION = 1
+
+EVENT = 1
+TRACK_STATE = 2
+TRACK_STATE_END = 3
+
+HEADER = struct.Struct('<2sBB')
+# timestamp (us), utc offset (min), track id, bbox, confidence, severity, rule type, flags
+EVENT_FIXED = struct.Struct('<qhq4ffBBB')
+# timestamp (us), utc offset (min), track count, static object count
+TRACK_STATE_FIXED = struct.Struct('<qhIH')
+TRACK_ROW = np.dtype([('track_id', '<i8'), ('class_index', '<u2'), ('confidence', '<f4'), ('bbox', '<f4', (4,))])
+STATIC_ROW = np.dtype([('object_id', '<i8'), ('bbox', '<f4', (4,)), ('first_seen', '<i8'), ('score', '<f4'),
+                       ('owner_track_id', '<i8'), ('owner_class_index', '<i2')])
+
+SEVERITIES = ['low', 'medium', 'high', 'critical']
+RULE_TYPES = ['line_crossing', 'zone_violation', 'behavior_detection', 'loitering', 'object_left_behind',
+              'speed_detection', 'counting', 'custom']
+UNKNOWN = 255
+NAIVE = -32768  # utc offset marker of timestamps without a timezone
+
+# Event flags
+NO_TRACK = 1
+
+# Tags of extra event fields
+TAG_NONE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_TRUE, TAG_FALSE = range(6)
+
+EVENT_FIELDS = {'rule_id', 'camera_id', 'timestamp', 'object_class', 'track_id', 'bbox', 'confidence',
+                'severity', 'rule_type', 'message'}
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+ONE_MINUTE = timedelta(minutes=1)
+
+
+def _pack_time(value: Any) -> Tuple[int, int]:
+    moment = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        offset = NAIVE
+        delta = moment - NAIVE_EPOCH
+    else:
+        offset = moment.utcoffset() // ONE_MINUTE
+        delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds, offset
+
+
+def _unpack_time(micros: int, offset: int) -> datetime:
+    moment = EPOCH + timedelta(microseconds=micros)
+    if offset == NAIVE:
+        return moment.replace(tzinfo=None)
+    return moment.astimezone(timezone(timedelta(minutes=offset)))
+
+
+def _pack_str(value: Any) -> bytes:
+    data = str(value).encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+
+@lru_cache(maxsize=256)
+def _pack_class(value: str) -> bytes:
+    return _pack_str(value)
+
+
+def _unpack_str(data: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = struct.unpack_from('<H', data, offset)
+    offset += 2
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+@lru_cache(maxsize=4096)
+def _pack_id(value: Any) -> bytes:
+    """UUIDs as 16 raw bytes, anything else as a string"""
+    try:
+        return b'\x01' + uuid.UUID(str(value)).bytes
+    except ValueError:
+        return b'\x00' + _pack_str(value)
+
+
+def _unpack_id(data: bytes, offset: int) -> Tuple[str, int]:
+    if data[offset] == 1:
+        return str(uuid.UUID(bytes=data[offset + 1:offset + 17])), offset + 17
+    return _unpack_str(data, offset + 1)
+
+
+def _pack_value(value: Any) -> bytes:
+    if value is None:
+        return bytes((TAG_NONE,))
+    if isinstance(value, bool):
+        return bytes((TAG_TRUE if value else TAG_FALSE,))
+    if isinstance(value, (int, np.integer)):
+        return struct.pack('<Bq', TAG_INT, int(value))
+    if isinstance(value, (float, np.floating)):
+        return struct.pack('<Bd', TAG_FLOAT, float(value))
+    return bytes((TAG_STR,)) + _pack_str(value)
+
+
+def _unpack_value(data: bytes, offset: int) -> Tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+    if tag == TAG_NONE:
+        return None, offset
+    if tag in (TAG_TRUE, TAG_FALSE):
+        return tag == TAG_TRUE, offset
+    if tag == TAG_INT:
+        return struct.unpack_from('<q', data, offset)[0], offset + 8
+    if tag == TAG_FLOAT:
+        return struct.unpack_from('<d', data, offset)[0], offset + 8
+    return _unpack_str(data, offset)
+
+
+SEVERITY_CODES = {value: code for code, value in enumerate(SEVERITIES)}
+RULE_TYPE_CODES = {value: code for code, value in enumerate(RULE_TYPES)}
+
+
+def pack_event(event: Dict[str, Any]) -> bytes:
+    micros, offset = _pack_time(event['timestamp'])
+    track_id = event.get('track_id')
+    severity = SEVERITY_CODES.get(event['severity'], UNKNOWN)
+    rule_type = RULE_TYPE_CODES.get(event['rule_type'], UNKNOWN)
+    parts = [
+        HEADER.pack(MAGIC, VERSION, EVENT),
+        EVENT_FIXED.pack(micros, offset, track_id if track_id is not None else 0, *event['bbox'],
+                         event['confidence'], severity, rule_type, NO_TRACK if track_id is None else 0),
+        _pack_id(str(event['rule_id'])),
+        _pack_id(str(event['camera_id'])),
+        _pack_class(event['object_class']),
+        _pack_str(event.get('message', '')),
+    ]
+    # Enum values outside the known lists travel as extra fields
+    extras = {key: value for key, value in event.items() if key not in EVENT_FIELDS} \
+        if len(event) > len(EVENT_FIELDS) or severity == UNKNOWN or rule_type == UNKNOWN else {}
+    if severity == UNKNOWN:
+        extras['severity'] = event['severity']
+    if rule_type == UNKNOWN:
+        extras['rule_type'] = event['rule_type']
+    parts.append(bytes((len(extras),)))
+    for key, value in extras.items():
+        parts.append(_pack_str(key))
+        parts.append(_pack_value(value))
+    return b''.join(parts)
+
+
+def unpack_event(data: bytes) -> Dict[str, Any]:
+    offset = HEADER.size
+    micros, utc_offset, track_id, x1, y1, x2, y2, confidence, severity, rule_type, flags = \
+        EVENT_FIXED.unpack_from(data, offset)
+    offset += EVENT_FIXED.size
+    rule_id, offset = _unpack_id(data, offset)
+    camera_id, offset = _unpack_id(data, offset)
+    object_class, offset = _unpack_str(data, offset)
+    message, offset = _unpack_str(data, offset)
+    event = {
+        'rule_id': rule_id,
+        'camera_id': camera_id,
+        'timestamp': _unpack_time(micros, utc_offset).isoformat(),
+        'object_class': object_class,
+        'track_id': None if flags & NO_TRACK else track_id,
+        # float32 on the wire: round away the representation noise
+        'bbox': [round(x1, 2), round(y1, 2), round(x2, 2), round(y2, 2)],
+        'confidence': round(confidence, 4),
+        'severity': SEVERITIES[severity] if severity != UNKNOWN else None,
+        'rule_type': RULE_TYPES[rule_type] if rule_type != UNKNOWN else None,
+        'message': message,
+    }
+    count = data[offset]
+    offset += 1
+    for _ in range(count):
+        key, offset = _unpack_str(data, offset)
+        event[key], offset = _unpack_value(data, offset)
+    return event
+
+
+def pack_track_state(state: Dict[str, Any]) -> bytes:
+    if state['type'] == 'end':
+        return HEADER.pack(MAGIC, VERSION, TRACK_STATE_END) + _pack_id(state['camera_id'])
+
+    tracks = state['tracks']
+    static_objects = state.get('static_objects')
+    class_names = list(dict.fromkeys([row[1] for row in tracks] +
+                                     [row[8] for row in static_objects or [] if row[8] is not None]))
+    class_index = {name: index for index, name in enumerate(class_names)}
+
+    track_rows = np.zeros(len(tracks), dtype=TRACK_ROW)
+    if tracks:
+        track_rows['track_id'] = [row[0] for row in tracks]
+        track_rows['class_index'] = [class_index[row[1]] for row in tracks]
+        track_rows['confidence'] = [row[2] for row in tracks]
+        track_rows['bbox'] = [row[3:7] for row in tracks]
+
+    micros, offset = _pack_time(state['time'])
+    parts = [
+        HEADER.pack(MAGIC, VERSION, TRACK_STATE),
+        TRACK_STATE_FIXED.pack(micros, offset, len(tracks),
+                               len(static_objects) if static_objects is not None else 0xFFFF),
+        _pack_id(state['camera_id']),
+        bytes((len(class_names),)),
+        *(_pack_str(name) for name in class_names),
+        track_rows.tobytes(),
+    ]
+    if static_objects:
+        static_rows = np.zeros(len(static_objects), dtype=STATIC_ROW)
+        static_rows['object_id'] = [row[0] for row in static_objects]
+        static_rows['bbox'] = [row[1:5] for row in static_objects]
+        static_rows['first_seen'] = [_pack_time(row[5])[0] for row in static_objects]
+        static_rows['score'] = [row[6] for row in static_objects]
+        static_rows['owner_track_id'] = [-1 if row[7] is None else row[7] for row in static_objects]
+        static_rows['owner_class_index'] = [-1 if row[8] is None else class_index[row[8]] for row in static_objects]
+        parts.append(static_rows.tobytes())
+    return b''.join(parts)
+
+
+def unpack_track_state(data: bytes) -> Dict[str, Any]:
+    message_type = data[3]
+    offset = HEADER.size
+    if message_type == TRACK_STATE_END:
+        camera_id, _ = _unpack_id(data, offset)
+        return {'type': 'end', 'camera_id': camera_id}
+
+    micros, utc_offset, track_count, static_count = TRACK_STATE_FIXED.unpack_from(data, offset)
+    offset += TRACK_STATE_FIXED.size
+    camera_id, offset = _unpack_id(data, offset)
+    class_count = data[offset]
+    offset += 1
+    class_names = []
+    for _ in range(class_count):
+        name, offset = _unpack_str(data, offset)
+        class_names.append(name)
+
+    frame_time = _unpack_time(micros, utc_offset)
+    track_rows = np.frombuffer(data, dtype=TRACK_ROW, count=track_count, offset=offset)
+    offset += track_rows.nbytes
+    state = {
+        'type': 'frame',
+        'camera_id': camera_id,
+        'time': frame_time.isoformat(),
+        'tracks': [
+            [track_id, class_names[class_index], confidence, *bbox]
+            for track_id, class_index, confidence, bbox in zip(
+                track_rows['track_id'].tolist(), track_rows['class_index'].tolist(),
+                np.round(track_rows['confidence'].astype(np.float64), 3).tolist(),
+                np.round(track_rows['bbox'].astype(np.float64), 1).tolist()
+            )
+        ]
+    }
+    if static_count != 0xFFFF:
+        static_rows = np.frombuffer(data, dtype=STATIC_ROW, count=static_count, offset=offset)
+        state['static_objects'] = [
+            [object_id, *bbox, _unpack_time(first_seen, utc_offset).isoformat(), score,
+             None if owner_track_id < 0 else owner_track_id,
+             None if owner_class_index < 0 else class_names[owner_class_index]]
+            for object_id, bbox, first_seen, score, owner_track_id, owner_class_index in zip(
+                static_rows['object_id'].tolist(), np.round(static_rows['bbox'].astype(np.float64), 1).tolist(),
+                static_rows['first_seen'].tolist(), np.round(static_rows['score'].astype(np.float64), 3).tolist(),
+                static_rows['owner_track_id'].tolist(), static_rows['owner_class_index'].tolist()
+            )
+        ]
+    return state
+
+
+def encode(message: Dict[str, Any]) -> bytes:
+    """Binary payload of an event or track state; JSON for anything else"""
+    if message.get('type') in ('frame', 'end') and 'camera_id' in message:
+        return pack_track_state(message)
+    if 'rule_id' in message and 'timestamp' in message:
+        return pack_event(message)
+    return json.dumps(message).encode('utf-8')
+
+
+def decode(data: bytes) -> Dict[str, Any]:
+    """Decode a binary or JSON payload"""
+    if data[:2] != MAGIC:
+        return json.loads(data.decode('utf-8'))
+    if data[2] != VERSION:
+        raise ValueError(f"Unsupported wire format version {data[2]}")
+    if data[3] == EVENT:
+        return unpack_event(data)
+    if data[3] in (TRACK_STATE, TRACK_STATE_END):
+        return unpack_track_state(data)
+    raise ValueError(f"Unknown message type {data[3]}")
+
+
+def serializer(wire_format: str) -> Callable[[Dict[str, Any]], bytes]:
+    """Kafka value_serializer for the configured wire format ('binary' or 'json')"""
+    if wire_format == 'json':
+        return lambda message: json.dumps(message).encode('utf-8')
+    return encode
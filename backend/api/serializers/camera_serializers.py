@@ -2,8 +2,9 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from cameras.models import Camera, Zone, Line
+from cameras.models import Camera, Zone, Line, ZoneOccupancy
 from events.models import Rule
+from .event_serializers import validate_rule_schedule
 from videos.models import VideoFile, Clip, VideoAnnotation
 
 
@@ -15,11 +16,15 @@ class CameraSerializer(serializers.ModelSerializer):
         labels = {
             'name': _('Название'),
             'rtsp_url': _('RTSP URL'),
+            'analysis_url': _('URL потока для анализа'),
             'location': _('Местоположение'),
             'status': _('Статус'),
             'snapshot': _('Снимок'),
             'vendor': _('Производитель'),
             'stream_settings': _('Настройки потока'),
+            'ground_calibration': _('Калибровка плоскости земли'),
+            'retention_days': _('Срок хранения записей'),
+            'retention_keep_events': _('Хранить записи событий'),
             'created_at': _('Дата создания'),
             'updated_at': _('Дата обновления'),
         }
@@ -45,6 +50,19 @@ class ZoneSerializer(serializers.ModelSerializer):
         }
 
 
+class ZoneOccupancySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ZoneOccupancy
+        fields = ['timestamp', 'max_count', 'avg_count', 'samples']
+        # Добавляем метки полей на русском языке
+        labels = {
+            'timestamp': _('Время'),
+            'max_count': _('Максимум объектов'),
+            'avg_count': _('Среднее количество объектов'),
+            'samples': _('Кадров'),
+        }
+
+
 class LineSerializer(serializers.ModelSerializer):
     class Meta:
         model = Line
@@ -64,6 +82,9 @@ class LineSerializer(serializers.ModelSerializer):
 
 
 class RuleSerializer(serializers.ModelSerializer):
+    def validate_schedule(self, value):
+        return validate_rule_schedule(value)
+
     class Meta:
         model = Rule
         fields = '__all__'
@@ -75,14 +96,36 @@ class RuleSerializer(serializers.ModelSerializer):
             'zone': _('Зона'),
             'line': _('Линия'),
             'conditions': _('Условия'),
+            'schedule': _('Расписание'),
             'severity': _('Уровень серьезности'),
             'enabled': _('Активно'),
+            'disabled_reason': _('Причина отключения'),
             'description': _('Описание'),
             'created_at': _('Дата создания'),
             'updated_at': _('Дата обновления'),
         }
 
 
+class RuleDraftSerializer(serializers.ModelSerializer):
+    """Черновик правила для бэктеста: только поля, которые читает анализатор"""
+
+    def validate_schedule(self, value):
+        return validate_rule_schedule(value)
+
+    class Meta:
+        model = Rule
+        fields = ['camera', 'rule_type', 'zone', 'line', 'conditions', 'schedule', 'severity']
+        labels = {
+            'camera': _('Камера'),
+            'rule_type': _('Тип правила'),
+            'zone': _('Зона'),
+            'line': _('Линия'),
+            'conditions': _('Условия'),
+            'schedule': _('Расписание'),
+            'severity': _('Уровень серьезности'),
+        }
+
+
 class VideoFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoFile
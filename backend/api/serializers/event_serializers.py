@@ -1,9 +1,51 @@
 # serializers/event_serializers.py
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from events.models import Event, Rule
 
 
+def _schedule_minute(value) -> int:
+    """Минута суток времени 'ЧЧ:ММ' (допускается 24:00)"""
+    try:
+        hours, minutes = (int(part) for part in value.split(':'))
+    except (AttributeError, ValueError):
+        raise serializers.ValidationError(f"Неверное время {value!r}, ожидается ЧЧ:ММ")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise serializers.ValidationError(f"Неверное время {value!r}, ожидается ЧЧ:ММ")
+    return hours * 60 + minutes
+
+
+def validate_rule_schedule(schedule):
+    """Проверить расписание правила так же, как его разбирает анализатор"""
+    if not schedule:
+        return schedule
+    if not isinstance(schedule, dict):
+        raise serializers.ValidationError("Расписание должно быть объектом с полями timezone и windows")
+    windows = schedule.get('windows')
+    if windows and not isinstance(windows, list):
+        raise serializers.ValidationError("Окна расписания (windows) должны быть списком")
+    timezone_name = schedule.get('timezone')
+    if timezone_name:
+        if not isinstance(timezone_name, str):
+            raise serializers.ValidationError("Часовой пояс должен быть названием вида 'Europe/Moscow'")
+        try:
+            ZoneInfo(timezone_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError(f"Неизвестный часовой пояс '{timezone_name}'")
+    for window in windows or []:
+        if not isinstance(window, dict):
+            raise serializers.ValidationError("Окно расписания должно быть объектом с полями start и end")
+        days = window.get('days', list(range(7)))
+        if not isinstance(days, list) or not all(
+            isinstance(day, int) and not isinstance(day, bool) and 0 <= day <= 6 for day in days
+        ):
+            raise serializers.ValidationError("Дни окна - целые числа от 0 (понедельник) до 6 (воскресенье)")
+        _schedule_minute(window.get('start'))
+        _schedule_minute(window.get('end'))
+    return schedule
+
+
 class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
@@ -28,6 +70,9 @@ class EventSerializer(serializers.ModelSerializer):
 
 
 class RuleSerializer(serializers.ModelSerializer):
+    def validate_schedule(self, value):
+        return validate_rule_schedule(value)
+
     class Meta:
         model = Rule
         fields = '__all__'
@@ -39,8 +84,10 @@ class RuleSerializer(serializers.ModelSerializer):
             'zone': _('Зона'),
             'line': _('Линия'),
             'conditions': _('Условия'),
+            'schedule': _('Расписание'),
             'severity': _('Уровень серьезности'),
             'enabled': _('Активно'),
+            'disabled_reason': _('Причина отключения'),
             'description': _('Описание'),
             'created_at': _('Дата создания'),
             'updated_at': _('Дата обновления'),
@@ -2,12 +2,40 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from videos.models import VideoFile, Clip, VideoAnnotation
+from ..services.presigned_url_service import PresignedUrlService
 
 
-class VideoFileSerializer(serializers.ModelSerializer):
+class PresignedUrlListSerializer(serializers.ListSerializer):
+    """Список, для всех объектов которого ссылки выдаются одним вызовом сервиса"""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.context['presigned_urls'] = PresignedUrlService.get_urls(
+            self.child.storage_path(item) for item in items
+        )
+        return super().to_representation(items)
+
+
+class PresignedUrlMixin(serializers.Serializer):
+    """Поле url с подписанной ссылкой на объект в MinIO"""
+    url = serializers.SerializerMethodField(label=_('Ссылка для просмотра'))
+
+    def storage_path(self, obj) -> str:
+        return obj.storage_path
+
+    def get_url(self, obj):
+        storage_path = self.storage_path(obj)
+        urls = self.context.get('presigned_urls')
+        if urls is not None and storage_path in urls:
+            return urls[storage_path]
+        return PresignedUrlService.get_url(storage_path)
+
+
+class VideoFileSerializer(PresignedUrlMixin, serializers.ModelSerializer):
     class Meta:
         model = VideoFile
         fields = '__all__'
+        list_serializer_class = PresignedUrlListSerializer
         # Добавляем метки полей на русском языке
         labels = {
             'camera': _('Камера'),
@@ -15,18 +43,22 @@ class VideoFileSerializer(serializers.ModelSerializer):
             'end_time': _('Время окончания'),
             'duration': _('Длительность'),
             'storage_path': _('Путь к файлу'),
+            'index_path': _('Индекс ключевых кадров'),
             'file_size': _('Размер файла'),
             'fps': _('Кадры в секунду'),
             'resolution': _('Разрешение'),
+            'sprite': _('Спрайт превью'),
+            'sprite_info': _('Параметры спрайта'),
             'created_at': _('Дата создания'),
             'updated_at': _('Дата обновления'),
         }
 
 
-class ClipSerializer(serializers.ModelSerializer):
+class ClipSerializer(PresignedUrlMixin, serializers.ModelSerializer):
     class Meta:
         model = Clip
         fields = '__all__'
+        list_serializer_class = PresignedUrlListSerializer
         # Добавляем метки полей на русском языке
         labels = {
             'video_file': _('Видео файл'),
@@ -40,6 +72,10 @@ class ClipSerializer(serializers.ModelSerializer):
             'updated_at': _('Дата обновления'),
         }
 
+    def storage_path(self, obj) -> str:
+        # Ссылка ведет на файл клипа; начало и конец клипа задают смещения
+        return obj.video_file.storage_path
+
 
 class VideoAnnotationSerializer(serializers.ModelSerializer):
     class Meta:
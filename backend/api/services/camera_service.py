@@ -1,8 +1,9 @@
 # services/camera_service.py
 from typing import List, Optional, Dict, Any
+from datetime import datetime
 from django.db.models import QuerySet
 from django.contrib.auth.models import User
-from cameras.models import Camera, Zone, Line
+from cameras.models import Camera, Zone, Line, ZoneOccupancy
 from events.models import Rule
 from videos.models import VideoFile
 from events.models import Event
@@ -44,6 +45,13 @@ class CameraService:
         """Получить зоны для определенной камеры"""
         return Zone.objects.filter(camera_id=camera_id)
     
+    @staticmethod
+    def get_zone_occupancy(zone_id: int, start_time: datetime, end_time: datetime) -> QuerySet[ZoneOccupancy]:
+        """Получить временной ряд заполненности зоны за период"""
+        return ZoneOccupancy.objects.filter(
+            zone_id=zone_id, timestamp__gte=start_time, timestamp__lt=end_time
+        ).order_by('timestamp')
+    
     @staticmethod
     def get_camera_lines(camera_id: int) -> QuerySet[Line]:
         """Получить линии для определенной камеры"""
@@ -0,0 +1,239 @@
+# services/event_ingest_service.py
+from typing import List, Dict, Any, Iterable, Tuple
+from datetime import datetime
+import json
+import uuid
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from events.models import Event, Rule
+from cameras.models import Camera
+from videos.models import VideoFile, Clip
+
+
+# Пространство имен детерминированных ID событий: повторное чтение тех же
+# сообщений Kafka дает те же ID, и вставка пропускает уже записанные строки
+EVENT_ID_NAMESPACE = uuid.UUID('6f1c2f4e-5b0c-4c59-9d0e-3a1b7c2d9e10')
+
+SEVERITIES = {'low', 'medium', 'high', 'critical'}
+
+COPY_COLUMNS = ('id', 'rule_id', 'camera_id', 'timestamp', 'object_class', 'track_id', 'bbox',
+                'confidence', 'severity', 'resolved', 'created_at', 'updated_at')
+
+
+class EventIngestService:
+    """Класс сервиса для пакетной записи событий анализатора из Kafka в базу"""
+
+    @staticmethod
+    def event_id(topic: str, partition: int, offset: int) -> uuid.UUID:
+        """ID события по его позиции в Kafka"""
+        return uuid.uuid5(EVENT_ID_NAMESPACE, f'{topic}:{partition}:{offset}')
+
+    @staticmethod
+    def payload_event_id(payload: Dict[str, Any], topic: str, partition: int, offset: int) -> uuid.UUID:
+        """ID события: присвоенный анализатором при записи в спул, иначе по позиции в Kafka
+
+        Анализатор может повторно отправить пачку событий после сбоя связи;
+        собственный ID события делает такую повторную отправку безопасной.
+        """
+        try:
+            return uuid.UUID(str(payload['event_id']))
+        except (KeyError, ValueError):
+            return EventIngestService.event_id(topic, partition, offset)
+
+    @staticmethod
+    def build_events(records: Iterable[Tuple[str, int, int, Dict[str, Any]]]) -> Tuple[List[Event], int]:
+        """Преобразовать сообщения (topic, partition, offset, событие) в несохраненные Event
+
+        События неизвестных правил (удаленных или черновиков бэктеста),
+        события повторных прогонов правил по сохраненным трекам (replay: они
+        повторяют уже записанные события файла) и некорректные сообщения
+        пропускаются. Возвращает события и число пропущенных.
+        """
+        received = list(records)
+        records = [record for record in received if not record[3].get('replay')]
+        rule_ids = set()
+        for _, _, _, payload in records:
+            try:
+                rule_ids.add(uuid.UUID(str(payload.get('rule_id'))))
+            except (ValueError, AttributeError):
+                continue
+        rules = {
+            rule['id']: rule
+            for rule in Rule.objects.filter(id__in=rule_ids).values('id', 'camera_id', 'severity')
+        }
+
+        events = []
+        skipped = len(received) - len(records)
+        now = timezone.now()
+        for topic, partition, offset, payload in records:
+            try:
+                rule = rules.get(uuid.UUID(str(payload['rule_id'])))
+                if rule is None:
+                    skipped += 1
+                    continue
+                timestamp = datetime.fromisoformat(payload['timestamp'])
+                if timezone.is_naive(timestamp):
+                    timestamp = timezone.make_aware(timestamp, timezone.get_default_timezone())
+                track_id = payload.get('track_id')
+                severity = payload.get('severity')
+                events.append(Event(
+                    id=EventIngestService.payload_event_id(payload, topic, partition, offset),
+                    rule_id=rule['id'],
+                    camera_id=rule['camera_id'],
+                    timestamp=timestamp,
+                    object_class=str(payload.get('object_class', ''))[:100],
+                    # Счетные правила срабатывают на зону, а не на трек
+                    track_id='' if track_id is None else str(track_id),
+                    bbox=[float(value) for value in payload['bbox']],
+                    confidence=min(max(float(payload.get('confidence', 0.0)), 0.0), 1.0),
+                    severity=severity if severity in SEVERITIES else rule['severity'],
+                    created_at=now,
+                    updated_at=now
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Пропущено некорректное событие {topic}:{partition}:{offset}: {e}")
+                skipped += 1
+        return events, skipped
+
+    @staticmethod
+    def build_clips(records: Iterable[Tuple[str, int, int, Dict[str, Any]]]
+                    ) -> List[Tuple[VideoFile, Clip, List[uuid.UUID]]]:
+        """Преобразовать сообщения о клипах событий в несохраненные VideoFile и Clip
+
+        Клип анализатора - отдельный MP4-файл, поэтому он занимает VideoFile
+        целиком. Возвращает файл, клип и ID показанных в нем событий.
+        """
+        records = list(records)
+        cameras = EventIngestService._existing_cameras(records)
+
+        clips = []
+        for topic, partition, offset, payload in records:
+            try:
+                camera_id = uuid.UUID(str(payload['camera_id']))
+                if camera_id not in cameras:
+                    continue
+                clip_id = uuid.UUID(str(payload['clip_id']))
+                # ID файла выводится из ID клипа, чтобы повторная доставка его не дублировала
+                video_file = EventIngestService._video_file(
+                    payload, uuid.uuid5(EVENT_ID_NAMESPACE, f'clip:{clip_id}'), camera_id
+                )
+                clip = Clip(
+                    id=clip_id,
+                    video_file=video_file,
+                    start_offset=0.0,
+                    end_offset=video_file.duration,
+                    label=str(payload.get('label', ''))[:255]
+                )
+                event_ids = [uuid.UUID(str(event_id)) for event_id in payload.get('event_ids', [])]
+                clips.append((video_file, clip, event_ids))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Пропущен некорректный клип {topic}:{partition}:{offset}: {e}")
+        return clips
+
+    @staticmethod
+    def build_video_files(records: Iterable[Tuple[str, int, int, Dict[str, Any]]]) -> List[VideoFile]:
+        """Преобразовать сообщения о сегментах непрерывной записи в несохраненные VideoFile
+
+        ID файла присваивает анализатор, поэтому повторно отправленный
+        после перезапуска сегмент не дублируется.
+        """
+        records = list(records)
+        cameras = EventIngestService._existing_cameras(records)
+
+        video_files = []
+        for topic, partition, offset, payload in records:
+            try:
+                camera_id = uuid.UUID(str(payload['camera_id']))
+                if camera_id not in cameras:
+                    continue
+                video_files.append(EventIngestService._video_file(
+                    payload, uuid.UUID(str(payload['video_file_id'])), camera_id
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Пропущен некорректный сегмент записи {topic}:{partition}:{offset}: {e}")
+        return video_files
+
+    @staticmethod
+    def _existing_cameras(records: List[Tuple[str, int, int, Dict[str, Any]]]) -> set:
+        """ID камер из сообщений, которые есть в базе"""
+        camera_ids = set()
+        for _, _, _, payload in records:
+            try:
+                camera_ids.add(uuid.UUID(str(payload.get('camera_id'))))
+            except ValueError:
+                continue
+        return set(Camera.objects.filter(id__in=camera_ids).values_list('id', flat=True))
+
+    @staticmethod
+    def _video_file(payload: Dict[str, Any], video_file_id: uuid.UUID, camera_id: uuid.UUID) -> VideoFile:
+        """Несохраненный VideoFile по описанию файла, загруженного анализатором в MinIO"""
+        return VideoFile(
+            id=video_file_id,
+            camera_id=camera_id,
+            start_time=datetime.fromisoformat(payload['start_time']),
+            end_time=datetime.fromisoformat(payload['end_time']),
+            duration=float(payload['duration']),
+            storage_path=str(payload['storage_path'])[:500],
+            index_path=str(payload.get('index_path') or '')[:500],
+            file_size=int(payload['file_size']),
+            fps=float(payload.get('fps') or 0.0),
+            resolution=str(payload.get('resolution', ''))[:20]
+        )
+
+    @staticmethod
+    def write_events(events: List[Event], copy_threshold: int = None,
+                     clips: List[Tuple[VideoFile, Clip, List[uuid.UUID]]] = (),
+                     video_files: List[VideoFile] = ()) -> int:
+        """Записать события, клипы и сегменты записи одной транзакцией READ COMMITTED
+
+        Небольшие пачки пишутся через bulk_create, крупные - через COPY во
+        временную таблицу. В обоих случаях уже записанные ID пропускаются,
+        поэтому повторная доставка сообщений не создает дубликатов. Клип
+        приходит после своих событий, поэтому события к этому моменту уже
+        записаны и привязываются к нему.
+        """
+        if not events and not clips and not video_files:
+            return 0
+        if copy_threshold is None:
+            copy_threshold = settings.EVENT_INGEST_COPY_THRESHOLD
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # Должно быть первым запросом транзакции; настройки docker
+                # по умолчанию включают serializable
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+            if len(events) >= copy_threshold:
+                EventIngestService._copy_events(events)
+            elif events:
+                Event.objects.bulk_create(events, batch_size=1000, ignore_conflicts=True)
+            if video_files:
+                VideoFile.objects.bulk_create(video_files, batch_size=1000, ignore_conflicts=True)
+            if clips:
+                VideoFile.objects.bulk_create([video_file for video_file, _, _ in clips], ignore_conflicts=True)
+                Clip.objects.bulk_create([clip for _, clip, _ in clips], ignore_conflicts=True)
+                for _, clip, event_ids in clips:
+                    Event.objects.filter(id__in=event_ids, clip__isnull=True).update(clip=clip)
+        return len(events)
+
+    @staticmethod
+    def _copy_events(events: List[Event]):
+        """COPY событий во временную таблицу и перенос с пропуском существующих ID"""
+        columns = ', '.join(COPY_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TEMP TABLE events_ingest ON COMMIT DROP AS
+                SELECT {columns} FROM events_events WITH NO DATA
+            """)
+            with cursor.cursor.copy(f"COPY events_ingest ({columns}) FROM STDIN") as copy:
+                for event in events:
+                    copy.write_row((
+                        event.id, event.rule_id, event.camera_id, event.timestamp, event.object_class,
+                        event.track_id, json.dumps(event.bbox), event.confidence, event.severity,
+                        False, event.created_at, event.updated_at
+                    ))
+            cursor.execute(f"""
+                INSERT INTO events_events ({columns})
+                SELECT {columns} FROM events_ingest
+                ON CONFLICT (id) DO NOTHING
+            """)
@@ -1,8 +1,10 @@
 # services/event_service.py
 from typing import List, Dict, Any, Optional
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import QuerySet
 from datetime import datetime, timedelta
+import requests
 from events.models import Event, Rule
 from cameras.models import Camera
 from alerts.models import Alert
@@ -92,4 +94,39 @@ class EventService:
             camera_name = event.camera.name
             stats['events_by_camera'][camera_name] = stats['events_by_camera'].get(camera_name, 0) + 1
         
-        return stats
\ No newline at end of file
+        return stats
+    
+    @staticmethod
+    def backtest_rule(rule_data: Dict[str, Any], camera_id: Any,
+                      start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+        """Прогнать правило по сохраненным трекам камеры за период через анализатор"""
+        payload = {
+            'rule': {
+                'id': str(rule_data.get('id', 'draft')),
+                'rule_type': rule_data['rule_type'],
+                'conditions': rule_data.get('conditions') or {},
+                'schedule': rule_data.get('schedule') or {},
+                'severity': rule_data.get('severity', 'medium'),
+                'zone_id': str(rule_data['zone_id']) if rule_data.get('zone_id') else None,
+                'line_id': str(rule_data['line_id']) if rule_data.get('line_id') else None,
+            },
+            'camera_id': str(camera_id),
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+        }
+        try:
+            response = requests.post(
+                f"{settings.ANALYZER_API_URL.rstrip('/')}/backtest",
+                json=payload,
+                timeout=settings.ANALYZER_API_TIMEOUT
+            )
+        except requests.RequestException as e:
+            raise ConnectionError(f"Analyzer is unavailable: {e}")
+        if response.status_code >= 400:
+            # Ошибки анализатора приходят в JSON, но прокси и сам Flask при сбое отдают HTML
+            try:
+                error = response.json().get('error', 'Backtest failed')
+            except ValueError:
+                error = response.text.strip()[:500] or f'Backtest failed with HTTP {response.status_code}'
+            raise ValueError(error)
+        return response.json()
@@ -0,0 +1,76 @@
+# services/presigned_url_service.py
+from typing import Dict, Iterable, Optional
+from datetime import timedelta
+import threading
+import minio
+from django.conf import settings
+from django.core.cache import cache
+
+
+_clients: Dict[bool, minio.Minio] = {}
+_clients_lock = threading.Lock()
+
+
+def minio_client(public: bool = False) -> minio.Minio:
+    """Клиент MinIO, общий для потоков процесса
+
+    Публичный клиент подписывает ссылки на адрес MinIO, доступный браузеру;
+    регион задан явно, поэтому подпись вычисляется локально без запросов к MinIO.
+    """
+    with _clients_lock:
+        if public not in _clients:
+            _clients[public] = minio.Minio(
+                settings.MINIO_PUBLIC_ENDPOINT if public else settings.MINIO_ENDPOINT,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=settings.MINIO_PUBLIC_SECURE if public else settings.MINIO_SECURE,
+                region=settings.MINIO_REGION
+            )
+        return _clients[public]
+
+
+def reset_minio_clients():
+    """Забыть созданные клиенты: процесс, созданный fork'ом, не должен использовать соединения родителя"""
+    with _clients_lock:
+        _clients.clear()
+
+
+class PresignedUrlService:
+    """Класс сервиса для выдачи подписанных ссылок на объекты MinIO
+
+    Ссылки кэшируются в Redis до тех пор, пока до истечения их срока не
+    останется PRESIGNED_URL_REFRESH_MARGIN секунд, поэтому список из сотни
+    видео обходится одним запросом к кэшу и подписью только новых объектов.
+    """
+
+    @staticmethod
+    def cache_key(object_name: str) -> str:
+        return f'presigned-url:{object_name}'
+
+    @staticmethod
+    def get_url(object_name: str) -> Optional[str]:
+        """Подписанная ссылка на один объект; None для пустого пути"""
+        if not object_name:
+            return None
+        return PresignedUrlService.get_urls([object_name])[object_name]
+
+    @staticmethod
+    def get_urls(object_names: Iterable[str]) -> Dict[str, str]:
+        """Подписанные ссылки на объекты: из кэша, недостающие подписываются и кэшируются"""
+        keys = {PresignedUrlService.cache_key(name): name for name in set(object_names) if name}
+        if not keys:
+            return {}
+        cached = cache.get_many(list(keys))
+
+        expires = settings.PRESIGNED_URL_EXPIRES
+        signed = {}
+        for key, object_name in keys.items():
+            if key not in cached:
+                signed[key] = minio_client(public=True).presigned_get_object(
+                    settings.MINIO_BUCKET_NAME, object_name, expires=timedelta(seconds=expires)
+                )
+        if signed:
+            cache.set_many(signed, timeout=max(expires - settings.PRESIGNED_URL_REFRESH_MARGIN, 1))
+
+        cached.update(signed)
+        return {object_name: cached[key] for key, object_name in keys.items()}
@@ -0,0 +1,257 @@
+# services/preview_service.py
+from typing import Dict, Any, Optional, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import io
+import json
+import math
+import multiprocessing
+import av
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.db.models import Q, OuterRef, Subquery
+from cameras.models import Camera
+from videos.models import VideoFile, Clip
+from .presigned_url_service import reset_minio_clients
+from .retention_service import RetentionService
+from .video_cut_service import VideoCutService
+
+
+class PreviewService:
+    """Класс сервиса для миниатюр клипов, снимков камер и спрайтов записей
+
+    Декодируются только нужные ключевые кадры: по индексу ключевых кадров
+    из MinIO читаются заголовок сегмента и фрагменты этих кадров, а не
+    весь файл. Кадры декодируются в пуле процессов, готовые изображения
+    сохраняются в хранилище пулом потоков, и строки каждой таблицы
+    обновляются одним bulk_update.
+    """
+
+    @staticmethod
+    def create_pool(workers: int = None) -> ProcessPoolExecutor:
+        """Пул процессов декодирования
+
+        Процессы создаются fork'ом, поэтому соединения с базой закрываются
+        заранее, а клиенты MinIO в дочерних процессах создаются заново.
+        """
+        connections.close_all()
+        return ProcessPoolExecutor(
+            workers or settings.PREVIEW_WORKERS,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=reset_minio_clients
+        )
+
+    @staticmethod
+    def generate(pool: ProcessPoolExecutor, batch_size: int = None,
+                 failed: Optional[Set[Tuple[str, Any]]] = None) -> Dict[str, int]:
+        """Один проход: до batch_size миниатюр клипов и спрайтов записей и снимки камер
+
+        Ключи задач, которые не удалось выполнить, добавляются в failed и в
+        следующих проходах с тем же множеством пропускаются.
+        """
+        if batch_size is None:
+            batch_size = settings.PREVIEW_BATCH_SIZE
+        if failed is None:
+            failed = set()
+        targets = {}
+        tasks = []
+        for key, target, task in PreviewService.pending(batch_size, failed):
+            targets[key] = target
+            tasks.append(dict(task, key=key))
+        if not tasks:
+            return {'thumbnails': 0, 'sprites': 0, 'snapshots': 0, 'failed': 0}
+
+        rendered = []
+        for result in pool.map(render_preview, tasks):
+            if 'error' in result:
+                print(f"Не удалось построить превью {result['key']}: {result['error']}")
+                failed.add(result['key'])
+            else:
+                rendered.append(result)
+
+        with ThreadPoolExecutor(settings.PREVIEW_UPLOAD_WORKERS) as uploads:
+            saved = list(uploads.map(
+                lambda result: PreviewService.save_image(*targets[result['key']][:3], result['image']),
+                rendered
+            ))
+
+        updated = {'clip': [], 'sprite': [], 'snapshot': []}
+        replaced = []
+        for result, name in zip(rendered, saved):
+            kind = result['key'][0]
+            obj, field_name, _, old_name = targets[result['key']]
+            setattr(obj, field_name, name)
+            if kind == 'sprite':
+                obj.sprite_info = result['info']
+            if old_name and old_name != name:
+                replaced.append(old_name)
+            updated[kind].append(obj)
+        Clip.objects.bulk_update(updated['clip'], ['thumbnail'], batch_size=500)
+        VideoFile.objects.bulk_update(updated['sprite'], ['sprite', 'sprite_info'], batch_size=500)
+        Camera.objects.bulk_update(updated['snapshot'], ['snapshot'], batch_size=500)
+        snapshot_storage = Camera._meta.get_field('snapshot').storage
+        RetentionService.delete_files((snapshot_storage, name) for name in replaced)
+
+        return {
+            'thumbnails': len(updated['clip']),
+            'sprites': len(updated['sprite']),
+            'snapshots': len(updated['snapshot']),
+            'failed': len(tasks) - len(rendered)
+        }
+
+    @staticmethod
+    def pending(batch_size: int, failed: Set[Tuple[str, Any]]):
+        """(ключ, (объект, поле, имя файла, прежний файл), задача) для всего, что еще без превью"""
+        clips = Clip.objects.filter(
+            Q(thumbnail='') | Q(thumbnail__isnull=True)
+        ).exclude(
+            id__in=[key[1] for key in failed if key[0] == 'clip']
+        ).select_related('video_file').order_by('-created_at')[:batch_size]
+        for clip in clips:
+            # Кадр из середины клипа
+            yield ('clip', clip.id), (clip, 'thumbnail', f'{clip.id}.jpg', None), {
+                'storage_path': clip.video_file.storage_path,
+                'index_path': clip.video_file.index_path,
+                'seconds': (clip.start_offset + clip.end_offset) / 2,
+                'width': settings.PREVIEW_THUMBNAIL_WIDTH
+            }
+
+        video_files = VideoFile.objects.filter(
+            Q(sprite='') | Q(sprite__isnull=True)
+        ).exclude(index_path='').exclude(
+            id__in=[key[1] for key in failed if key[0] == 'sprite']
+        ).order_by('-start_time')[:batch_size]
+        for video_file in video_files:
+            yield ('sprite', video_file.id), (video_file, 'sprite', f'{video_file.id}.jpg', None), {
+                'storage_path': video_file.storage_path,
+                'index_path': video_file.index_path,
+                'duration': video_file.duration,
+                'interval': settings.PREVIEW_SPRITE_INTERVAL,
+                'columns': settings.PREVIEW_SPRITE_COLUMNS,
+                'width': settings.PREVIEW_SPRITE_TILE_WIDTH
+            }
+
+        # Снимок камеры - последний ключевой кадр ее последнего записанного сегмента
+        latest = VideoFile.objects.filter(camera=OuterRef('pk')).exclude(index_path='').order_by('-start_time')
+        cameras = list(Camera.objects.annotate(
+            latest_video_file=Subquery(latest.values('id')[:1])
+        ).filter(latest_video_file__isnull=False))
+        video_files = VideoFile.objects.in_bulk([camera.latest_video_file for camera in cameras])
+        snapshot_field = Camera._meta.get_field('snapshot')
+        for camera in cameras:
+            video_file = video_files[camera.latest_video_file]
+            file_name = f'{camera.id}_{video_file.id}.jpg'
+            key = ('snapshot', video_file.id)
+            if camera.snapshot.name == snapshot_field.generate_filename(camera, file_name) or key in failed:
+                continue
+            yield key, (camera, 'snapshot', file_name, camera.snapshot.name), {
+                'storage_path': video_file.storage_path,
+                'index_path': video_file.index_path,
+                'seconds': video_file.duration,
+                'width': settings.PREVIEW_THUMBNAIL_WIDTH
+            }
+
+    @staticmethod
+    def save_image(obj, field_name: str, file_name: str, data: bytes) -> str:
+        """Сохранить JPEG в хранилище поля под именем по upload_to; возвращает имя файла"""
+        field = obj._meta.get_field(field_name)
+        name = field.generate_filename(obj, file_name)
+        # Перезапись: файл мог остаться от прохода, не дошедшего до bulk_update
+        if field.storage.exists(name):
+            field.storage.delete(name)
+        return field.storage.save(name, ContentFile(data))
+
+
+def render_preview(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Построить превью задачи (выполняется в процессе пула); {'key', 'image', 'info'} или {'key', 'error'}"""
+    try:
+        index = None
+        if task['index_path']:
+            index = json.loads(VideoCutService.read_object(task['index_path']))
+        if task['key'][0] == 'sprite':
+            image, info = render_sprite(task['storage_path'], index, task['duration'],
+                                        task['interval'], task['columns'], task['width'])
+        else:
+            image, info = scale(keyframe_at(task['storage_path'], index, task['seconds']), task['width']), None
+        return {'key': task['key'], 'image': encode_jpeg(image), 'info': info}
+    except Exception as e:
+        return {'key': task['key'], 'error': str(e)}
+
+
+def keyframe_at(storage_path: str, index: Optional[Dict[str, Any]], seconds: float,
+                header: Optional[bytes] = None) -> Image.Image:
+    """Ключевой кадр не позже seconds от начала файла
+
+    С индексом из MinIO читаются заголовок (если не передан) и один
+    фрагмент, без индекса - файл целиком.
+    """
+    if index is None:
+        return decode_keyframe(VideoCutService.read_object(storage_path), seconds)
+    found = VideoCutService.byte_range(index, seconds, seconds)
+    if found is None:
+        raise ValueError('в индексе нет ключевых кадров')
+    _, range_start, range_end = found
+    if header is None:
+        header = VideoCutService.read_object(storage_path, 0, index['init_size'])
+    return decode_keyframe(header + VideoCutService.read_object(storage_path, range_start, range_end - range_start))
+
+
+def decode_keyframe(data: bytes, seconds: float = 0.0) -> Image.Image:
+    """Первый ключевой кадр MP4 не раньше ближайшего к seconds; остальные кадры не декодируются"""
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = 'NONKEY'
+        if seconds > 0:
+            container.seek(int(seconds / stream.time_base), stream=stream)
+        for frame in container.decode(stream):
+            return frame.to_image()
+    raise ValueError('в файле нет ключевых кадров')
+
+
+def render_sprite(storage_path: str, index: Optional[Dict[str, Any]], duration: float,
+                  interval: float, columns: int, width: int) -> Tuple[Image.Image, Dict[str, Any]]:
+    """Сетка кадров через каждые interval секунд файла и ее параметры для плеера
+
+    Кадр для момента t - ключевой кадр не позже t, поэтому соседние кадры
+    сетки могут совпадать; каждый ключевой кадр декодируется один раз.
+    """
+    if index is None:
+        raise ValueError('спрайт строится только по индексу ключевых кадров')
+    header = VideoCutService.read_object(storage_path, 0, index['init_size'])
+    count = max(math.ceil(duration / interval), 1)
+    frames = {}
+    tiles = []
+    for i in range(count):
+        keyframe_offset = VideoCutService.byte_range(index, i * interval, i * interval)[1]
+        if keyframe_offset not in frames:
+            frames[keyframe_offset] = scale(keyframe_at(storage_path, index, i * interval, header), width)
+        tiles.append(frames[keyframe_offset])
+
+    tile_width, tile_height = tiles[0].size
+    columns = min(columns, count)
+    rows = math.ceil(count / columns)
+    sprite = Image.new('RGB', (columns * tile_width, rows * tile_height))
+    for i, tile in enumerate(tiles):
+        sprite.paste(tile, ((i % columns) * tile_width, (i // columns) * tile_height))
+    return sprite, {
+        'interval': interval,
+        'count': count,
+        'columns': columns,
+        'rows': rows,
+        'tile_width': tile_width,
+        'tile_height': tile_height
+    }
+
+
+def scale(image: Image.Image, width: int) -> Image.Image:
+    """Уменьшить кадр до ширины width с сохранением пропорций"""
+    if image.width <= width:
+        return image
+    return image.resize((width, max(round(image.height * width / image.width), 1)), Image.BILINEAR)
+
+
+def encode_jpeg(image: Image.Image, quality: int = 80) -> bytes:
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
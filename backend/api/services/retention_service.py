@@ -0,0 +1,162 @@
+# services/retention_service.py
+from typing import List, Dict, Any, Iterable, Set, Optional, Tuple
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.files.storage import Storage
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet, Count, Sum
+from django.utils import timezone
+from minio.deleteobjects import DeleteObject
+from cameras.models import Camera
+from events.models import Event
+from videos.models import VideoFile, Clip, VideoAnnotation
+from .presigned_url_service import minio_client
+
+
+class RetentionService:
+    """Класс сервиса для удаления записей камер старше срока хранения
+
+    Устаревшие файлы находятся по индексу VideoFile (камера, время), а не
+    обходом бакета. Удаление идет порциями: объекты порции удаляются из
+    MinIO пакетными запросами, затем ее строки VideoFile и Clip удаляются
+    отдельной короткой транзакцией, так что база никогда не удаляет
+    миллионы строк каскадом за один раз.
+    """
+
+    @staticmethod
+    def expired_video_files(camera: Camera, now: Optional[datetime] = None) -> QuerySet[VideoFile]:
+        """Файлы камеры, закончившиеся раньше срока хранения, от самых старых"""
+        cutoff = (now or timezone.now()) - timedelta(days=camera.retention_days)
+        # Условие на start_time ограничивает просмотр индексом (камера, start_time):
+        # файл, закончившийся до cutoff, и начался раньше него
+        video_files = VideoFile.objects.filter(camera=camera, start_time__lt=cutoff, end_time__lt=cutoff)
+        if camera.retention_keep_events:
+            # Клипы событий и сегменты записи, на время которых пришлось событие
+            video_files = video_files.exclude(
+                Exists(Event.objects.filter(clip__video_file=OuterRef('pk')))
+            ).exclude(
+                Exists(Event.objects.filter(
+                    camera=OuterRef('camera'),
+                    timestamp__gte=OuterRef('start_time'),
+                    timestamp__lte=OuterRef('end_time')
+                ))
+            )
+        return video_files.order_by('start_time')
+
+    @staticmethod
+    def sweep(chunk_size: int = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Удалить устаревшие записи всех камер с ограниченным сроком хранения"""
+        totals = {'files': 0, 'bytes': 0, 'failed': 0}
+        for camera in Camera.objects.filter(retention_days__gt=0):
+            result = RetentionService.sweep_camera(camera, chunk_size, dry_run)
+            for key in totals:
+                totals[key] += result[key]
+        return totals
+
+    @staticmethod
+    def sweep_camera(camera: Camera, chunk_size: int = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Удалить устаревшие записи камеры порциями по chunk_size файлов
+
+        Файлы, объекты которых не удалось удалить, остаются в базе до
+        следующего обхода; если не удалась целая порция, обход камеры
+        прекращается.
+        """
+        if chunk_size is None:
+            chunk_size = settings.RETENTION_CHUNK_SIZE
+        expired = RetentionService.expired_video_files(camera)
+        if dry_run:
+            stats = expired.aggregate(files=Count('id'), bytes=Sum('file_size'))
+            return {'files': stats['files'], 'bytes': stats['bytes'] or 0, 'failed': 0}
+
+        result = {'files': 0, 'bytes': 0, 'failed': 0}
+        failed_ids: Set = set()
+        while True:
+            chunk = list(
+                expired.exclude(id__in=failed_ids).values_list(
+                    'id', 'storage_path', 'index_path', 'file_size'
+                )[:chunk_size]
+            )
+            if not chunk:
+                break
+            # Сначала объекты: строка без объекта удалится повторно, а объект без строки потеряется.
+            # Сегмент и его индекс ключевых кадров удаляются одним пакетным запросом
+            failed_paths = RetentionService.remove_objects(
+                path for _, storage_path, index_path, _ in chunk for path in (storage_path, index_path) if path
+            )
+            removed = []
+            for video_file_id, storage_path, index_path, size in chunk:
+                if storage_path in failed_paths or index_path in failed_paths:
+                    failed_ids.add(video_file_id)
+                else:
+                    removed.append((video_file_id, size))
+            result['failed'] += len(chunk) - len(removed)
+            if not removed:
+                break
+
+            RetentionService.delete_rows([video_file_id for video_file_id, _ in removed])
+            result['files'] += len(removed)
+            result['bytes'] += sum(size for _, size in removed)
+        return result
+
+    @staticmethod
+    def remove_objects(object_names: Iterable[str]) -> Set[str]:
+        """Удалить объекты из MinIO пакетами до 1000 имен на запрос; возвращает не удаленные"""
+        object_names = list(object_names)
+        if not object_names:
+            return set()
+        try:
+            errors = minio_client().remove_objects(
+                settings.MINIO_BUCKET_NAME, (DeleteObject(name) for name in object_names)
+            )
+            failed = set()
+            for error in errors:
+                print(f"Не удалось удалить объект {error.name}: {error.code} {error.message}")
+                failed.add(error.name)
+            return failed
+        except Exception as e:
+            print(f"Ошибка удаления {len(object_names)} объектов из MinIO: {e}")
+            return set(object_names)
+
+    @staticmethod
+    def delete_files(files: Iterable[Tuple[Storage, str]]) -> Set[str]:
+        """Удалить файлы (хранилище, имя), не прерываясь на ошибках; возвращает не удаленные
+
+        У хранилищ Django нет пакетного удаления, поэтому файлы удаляются
+        по одному, а ошибка одного файла только записывается в журнал.
+        """
+        failed = set()
+        for storage, name in files:
+            if not name:
+                continue
+            try:
+                storage.delete(name)
+            except Exception as e:
+                print(f"Не удалось удалить файл {name}: {e}")
+                failed.add(name)
+        if failed:
+            print(f"Не удалось удалить файлов: {len(failed)}")
+        return failed
+
+    @staticmethod
+    def delete_rows(video_file_ids: List):
+        """Удалить строки файлов и их клипов одной короткой транзакцией
+
+        Зависимые строки удаляются явно, по одному запросу на таблицу,
+        вместо каскада ORM по каждому клипу. Имена файлов превью (спрайтов
+        и миниатюр клипов) собираются в той же транзакции до удаления
+        строк, а сами файлы удаляются после ее фиксации.
+        """
+        with transaction.atomic():
+            sprites = VideoFile.objects.filter(id__in=video_file_ids).exclude(sprite='').values_list(
+                'sprite', flat=True
+            )
+            thumbnails = Clip.objects.filter(video_file_id__in=video_file_ids).exclude(thumbnail='').values_list(
+                'thumbnail', flat=True
+            )
+            previews = [(VideoFile._meta.get_field('sprite').storage, name) for name in sprites] + \
+                [(Clip._meta.get_field('thumbnail').storage, name) for name in thumbnails]
+            VideoAnnotation.objects.filter(clip__video_file_id__in=video_file_ids).delete()
+            Event.objects.filter(clip__video_file_id__in=video_file_ids).update(clip=None)
+            Clip.objects.filter(video_file_id__in=video_file_ids).delete()
+            VideoFile.objects.filter(id__in=video_file_ids).delete()
+        RetentionService.delete_files(previews)
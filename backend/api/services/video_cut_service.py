@@ -0,0 +1,150 @@
+# services/video_cut_service.py
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime
+import json
+import struct
+from django.conf import settings
+from django.core.cache import cache
+from videos.models import VideoFile
+from .presigned_url_service import minio_client
+
+
+class VideoCutService:
+    """Класс сервиса для вырезки фрагментов записи без перекодирования
+
+    Сегменты записи хранятся во фрагментированном MP4 (заголовок и по
+    фрагменту moof+mdat на каждый ключевой кадр) вместе с индексом
+    ключевых кадров, который сопоставляет время кадра со смещением его
+    фрагмента в файле. Фрагмент за любой промежуток времени - это заголовок
+    и непрерывный диапазон байт от ключевого кадра до следующего за концом
+    промежутка, поэтому из MinIO читаются только они, а не весь сегмент.
+    """
+
+    @staticmethod
+    def get_index(video_file: VideoFile) -> Optional[Dict[str, Any]]:
+        """Индекс ключевых кадров файла; None, если индекса нет или он недоступен
+
+        Индекс не меняется после загрузки, поэтому кэшируется надолго.
+        """
+        if not video_file.index_path:
+            return None
+        key = f'keyframe-index:{video_file.index_path}'
+        index = cache.get(key)
+        if index is None:
+            try:
+                index = json.loads(VideoCutService.read_object(video_file.index_path))
+            except Exception as e:
+                print(f"Ошибка чтения индекса ключевых кадров {video_file.index_path}: {e}")
+                return None
+            cache.set(key, index, timeout=settings.KEYFRAME_INDEX_CACHE_TIMEOUT)
+        return index
+
+    @staticmethod
+    def recording_at(camera_id, timestamp: datetime) -> Optional[VideoFile]:
+        """Проиндексированный сегмент записи камеры, на время которого приходится timestamp"""
+        return VideoFile.objects.filter(
+            camera_id=camera_id, start_time__lte=timestamp, end_time__gte=timestamp
+        ).exclude(index_path='').order_by('-start_time').first()
+
+    @staticmethod
+    def read_object(object_name: str, offset: int = 0, length: int = 0) -> bytes:
+        """Прочитать объект MinIO целиком или диапазон байт [offset, offset + length)"""
+        response = minio_client().get_object(settings.MINIO_BUCKET_NAME, object_name, offset=offset, length=length)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    @staticmethod
+    def byte_range(index: Dict[str, Any], start: float, end: float) -> Optional[Tuple[float, int, int]]:
+        """(время первого ключевого кадра, начало, конец) диапазона байт, покрывающего [start, end] с
+
+        Диапазон начинается с последнего ключевого кадра не позже start и
+        заканчивается перед первым ключевым кадром после end.
+        """
+        keyframes = index['keyframes']
+        if not keyframes:
+            return None
+        first = 0
+        for i, (seconds, _) in enumerate(keyframes):
+            if seconds <= start:
+                first = i
+            else:
+                break
+        range_end = index['data_end']
+        for seconds, offset in keyframes[first + 1:]:
+            if seconds > end:
+                range_end = offset
+                break
+        return keyframes[first][0], keyframes[first][1], range_end
+
+    @staticmethod
+    def cut(video_file: VideoFile, start: float, end: float) -> Optional[Dict[str, Any]]:
+        """Фрагмент файла за [start, end] секунд от его начала в виде MP4
+
+        Возвращает {'data', 'start'}, где start - фактическое начало фрагмента
+        (ближайший предшествующий ключевой кадр) в секундах от начала файла,
+        или None, если у файла нет индекса ключевых кадров.
+        """
+        index = VideoCutService.get_index(video_file)
+        if index is None:
+            return None
+        start = max(start, 0.0)
+        end = min(end, start + settings.VIDEO_CUT_MAX_DURATION)
+        found = VideoCutService.byte_range(index, start, end)
+        if found is None:
+            return None
+        cut_start, range_start, range_end = found
+
+        header = VideoCutService.read_object(video_file.storage_path, 0, index['init_size'])
+        fragments = VideoCutService.read_object(video_file.storage_path, range_start, range_end - range_start)
+        return {
+            'data': header + rebase_fragments(fragments),
+            'start': cut_start
+        }
+
+
+def _boxes(data: bytearray, start: int, end: int):
+    """(тип, начало содержимого, конец) MP4-боксов в data[start:end]"""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            return
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def rebase_fragments(data: bytes) -> bytes:
+    """Сдвинуть время фрагментов MP4 так, чтобы первый фрагмент каждой дорожки начинался с нуля
+
+    Время начала фрагмента задано в tfdt (moof/traf/tfdt), остальные
+    смещения в фрагменте относительны (default-base-is-moof), поэтому
+    вырезанный диапазон фрагментов остается корректным после заголовка.
+    """
+    data = bytearray(data)
+    bases = {}
+    for box_type, moof_start, moof_end in _boxes(data, 0, len(data)):
+        if box_type != b'moof':
+            continue
+        for traf_type, traf_start, traf_end in _boxes(data, moof_start, moof_end):
+            if traf_type != b'traf':
+                continue
+            track_id = None
+            for child_type, child_start, _ in _boxes(data, traf_start, traf_end):
+                if child_type == b'tfhd':
+                    track_id = struct.unpack_from('>I', data, child_start + 4)[0]
+                elif child_type == b'tfdt':
+                    # Версия 1 - 64-битное время, версия 0 - 32-битное
+                    time_format = '>Q' if data[child_start] == 1 else '>I'
+                    decode_time = struct.unpack_from(time_format, data, child_start + 4)[0]
+                    base = bases.setdefault(track_id, decode_time)
+                    struct.pack_into(time_format, data, child_start + 4, max(decode_time - base, 0))
+    return bytes(data)
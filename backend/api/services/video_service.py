@@ -6,6 +6,7 @@ from datetime import datetime
 from videos.models import VideoFile, Clip, VideoAnnotation
 from cameras.models import Camera
 from events.models import Event
+from .presigned_url_service import PresignedUrlService
 
 
 class VideoService:
@@ -19,7 +20,7 @@ class VideoService:
     @staticmethod
     def get_video_clips(video_file_id: int) -> QuerySet[Clip]:
         """Получить клипы для определенного видео файла"""
-        return Clip.objects.filter(video_file_id=video_file_id)
+        return Clip.objects.filter(video_file_id=video_file_id).select_related('video_file')
     
     @staticmethod
     def get_clip_annotations(clip_id: int) -> QuerySet[VideoAnnotation]:
@@ -103,7 +104,7 @@ class VideoService:
             video_file = VideoFile.objects.get(id=video_file_id)
             result = {
                 'video_id': video_file_id,
-                'download_url': video_file.storage_path,
+                'download_url': PresignedUrlService.get_url(video_file.storage_path),
                 'file_name': f"{video_file.camera.name}_{video_file.start_time}.mp4",
                 'file_size': video_file.file_size
             }
@@ -115,10 +116,10 @@ class VideoService:
     def get_clip_download_info(clip_id: int) -> Dict[str, Any]:
         """Получить информацию для скачивания клипа"""
         try:
-            clip = Clip.objects.get(id=clip_id)
+            clip = Clip.objects.select_related('video_file').get(id=clip_id)
             result = {
                 'clip_id': clip_id,
-                'download_url': clip.download_url,
+                'download_url': clip.download_url or PresignedUrlService.get_url(clip.video_file.storage_path),
                 'file_name': f"clip_{clip.id}.mp4",
                 'start_offset': clip.start_offset,
                 'end_offset': clip.end_offset
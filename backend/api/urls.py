@@ -28,14 +28,16 @@ from .views import (
     HealthCheckView,
     # Camera-specific views
     CameraZonesView, CameraLinesView, CameraRulesView, CameraEventsView, CameraVideoFilesView,
+    # Zone-specific views
+    ZoneOccupancyView,
     # Rule-specific views
-    RuleEventsView, RuleTestView,
+    RuleEventsView, RuleTestView, RuleDraftTestView,
     # Event-specific views
-    EventResolveView, EventClipView,
+    EventResolveView, EventClipView, EventPlaybackView,
     # Video file-specific views
     VideoFileClipsView, VideoFileDownloadView,
     # Clip-specific views
-    ClipAnnotationsView, ClipDownloadView
+    ClipAnnotationsView, ClipDownloadView, ClipStreamView
 )
 
 def get_camera_viewset():
@@ -134,13 +136,18 @@ urlpatterns += [
     path('cameras/<uuid:pk>/events/', CameraEventsView, name='camera-events'),
     path('cameras/<uuid:pk>/video-files/', CameraVideoFilesView, name='camera-video-files'),
     
+    # Zone-specific endpoints
+    path('zones/<uuid:pk>/occupancy/', ZoneOccupancyView, name='zone-occupancy'),
+    
     # Rule-specific endpoints
     path('rules/<uuid:pk>/events/', RuleEventsView, name='rule-events'),
     path('rules/<uuid:pk>/test/', RuleTestView, name='rule-test'),
+    path('rules-test/', RuleDraftTestView, name='rule-draft-test'),
     
     # Event-specific endpoints
     path('events/<uuid:pk>/resolve/', EventResolveView, name='event-resolve'),
     path('events/<uuid:pk>/clip/', EventClipView, name='event-clip'),
+    path('events/<uuid:pk>/playback/', EventPlaybackView, name='event-playback'),
     
     # Video file-specific endpoints
     path('video-files/<uuid:pk>/clips/', VideoFileClipsView, name='videofile-clips'),
@@ -149,4 +156,5 @@ urlpatterns += [
     # Clip-specific endpoints
     path('clips/<uuid:pk>/annotations/', ClipAnnotationsView, name='clip-annotations'),
     path('clips/<uuid:pk>/download/', ClipDownloadView, name='clip-download'),
+    path('clips/<uuid:pk>/stream/', ClipStreamView, name='clip-stream'),
 ]
\ No newline at end of file
@@ -7,6 +7,9 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
 
 from cameras.models import Camera, Zone, Line
 from events.models import Rule
@@ -14,9 +17,10 @@ from videos.models import VideoFile, Clip
 from events.models import Event
 
 from ..serializers.camera_serializers import (
-    CameraSerializer, ZoneSerializer, LineSerializer,
-    RuleSerializer, VideoFileSerializer, ClipSerializer
+    CameraSerializer, ZoneSerializer, LineSerializer, ZoneOccupancySerializer,
+    RuleSerializer
 )
+from ..serializers.video_serializers import VideoFileSerializer, ClipSerializer
 from ..services.camera_service import CameraService
 
 
@@ -60,6 +64,22 @@ def CameraZonesView(request, pk):
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ZoneOccupancyView(request, pk):
+    """Временной ряд заполненности зоны (по умолчанию за последний час)"""
+    get_object_or_404(Zone, pk=pk)
+    params = request.query_params
+    end_time = parse_datetime(params['end_time']) if params.get('end_time') else timezone.now()
+    start_time = parse_datetime(params['start_time']) if params.get('start_time') else end_time - timedelta(hours=1)
+    if start_time is None or end_time is None:
+        return Response({'error': 'start_time and end_time must be ISO 8601 timestamps'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    occupancy = CameraService.get_zone_occupancy(pk, start_time, end_time)
+    serializer = ZoneOccupancySerializer(occupancy, many=True)
+    return Response(serializer.data)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def CameraLinesView(request, pk):
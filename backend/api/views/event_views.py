@@ -5,13 +5,19 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.http import HttpResponseRedirect
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
+import math
 
 from events.models import Event, Rule
 from ..serializers.event_serializers import EventSerializer
-from ..serializers.camera_serializers import RuleSerializer
+from ..serializers.camera_serializers import RuleSerializer, RuleDraftSerializer
 from ..services.event_service import EventService
+from ..services.video_cut_service import VideoCutService
+from ..services.presigned_url_service import PresignedUrlService
+from .video_views import mp4_response
 
 
 class RuleViewSet(viewsets.ModelViewSet):
@@ -78,6 +84,47 @@ def EventClipView(request, pk):
         return Response({'error': 'Event not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def EventPlaybackView(request, pk):
+    """Видео события: before секунд до него и after после из сегмента непрерывной записи
+
+    Из MinIO читаются только нужные фрагменты сегмента. Если проиндексированной
+    записи на время события нет - перенаправление на клип события.
+    Фрагмент не выходит за границы одного сегмента записи.
+    """
+    try:
+        event = Event.objects.select_related('clip__video_file').get(id=pk)
+    except Event.DoesNotExist:
+        return Response({'error': 'Event not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        before = float(request.query_params.get('before', 10))
+        after = float(request.query_params.get('after', 10))
+        # nan проходит через max() и отключает ограничение длины фрагмента
+        if not (math.isfinite(before) and math.isfinite(after)):
+            raise ValueError
+        before = max(before, 0.0)
+        after = max(after, 0.0)
+    except ValueError:
+        return Response({'error': 'before and after must be finite numbers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    video_file = VideoCutService.recording_at(event.camera_id, event.timestamp)
+    if video_file is not None:
+        offset = (event.timestamp - video_file.start_time).total_seconds()
+        try:
+            result = VideoCutService.cut(video_file, offset - before, offset + after)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        if result is not None:
+            response = mp4_response(result, f"event_{event.id}.mp4")
+            response['X-Event-Offset'] = f"{offset - result['start']:.3f}"
+            return response
+
+    if event.clip and event.clip.video_file.storage_path:
+        return HttpResponseRedirect(PresignedUrlService.get_url(event.clip.video_file.storage_path))
+    return Response({'error': 'No video available for this event'}, status=status.HTTP_404_NOT_FOUND)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def RuleEventsView(request, pk):
@@ -90,20 +137,68 @@ def RuleEventsView(request, pk):
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _get_backtest_range(data):
+    """Период бэктеста из запроса (по умолчанию последние 24 часа)"""
+    end_time = parse_datetime(data['end_time']) if data.get('end_time') else timezone.now()
+    start_time = parse_datetime(data['start_time']) if data.get('start_time') else end_time - timedelta(hours=24)
+    if start_time is None or end_time is None:
+        raise ValueError('start_time and end_time must be ISO 8601 timestamps')
+    if start_time >= end_time:
+        raise ValueError('start_time must be before end_time')
+    return start_time, end_time
+
+
+def _run_backtest(rule_data, camera_id, data):
+    try:
+        start_time, end_time = _get_backtest_range(data)
+        result = EventService.backtest_rule(rule_data, camera_id, start_time, end_time)
+        return Response(result)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except ConnectionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def RuleTestView(request, pk):
-    """Тестирование правила"""
+    """Бэктест сохраненного правила по записанным трекам камеры
+
+    Поля rule_type, conditions, schedule и severity в запросе заменяют сохраненные
+    значения, что позволяет подбирать пороги без сохранения правила.
+    """
     try:
-        from events.models import Rule
         rule = Rule.objects.get(id=pk)
-        # Здесь будет реализована логика тестирования правила
-        result = {
-            'rule_id': pk,
-            'rule_name': rule.name,
-            'test_result': 'passed',  # или 'failed'
-            'conditions': rule.conditions
-        }
-        return Response(result)
     except Rule.DoesNotExist:
-        return Response({'error': 'Rule not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        return Response({'error': 'Rule not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    rule_data = {
+        'id': rule.id,
+        'rule_type': request.data.get('rule_type', rule.rule_type),
+        'conditions': request.data.get('conditions', rule.conditions),
+        'schedule': request.data.get('schedule', rule.schedule),
+        'severity': request.data.get('severity', rule.severity),
+        'zone_id': rule.zone_id,
+        'line_id': rule.line_id,
+    }
+    return _run_backtest(rule_data, rule.camera_id, request.data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def RuleDraftTestView(request):
+    """Бэктест черновика правила, не сохраненного в базе"""
+    serializer = RuleDraftSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    draft = serializer.validated_data
+    rule_data = {
+        'rule_type': draft['rule_type'],
+        'conditions': draft.get('conditions', {}),
+        'schedule': draft.get('schedule', {}),
+        'severity': draft.get('severity', 'medium'),
+        'zone_id': draft['zone'].id if draft.get('zone') else None,
+        'line_id': draft['line'].id if draft.get('line') else None,
+    }
+    return _run_backtest(rule_data, draft['camera'].id, request.data)
@@ -2,9 +2,10 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import viewsets
+from rest_framework import viewsets, status
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.http import HttpResponse, HttpResponseRedirect
 from django.utils import timezone
 from datetime import timedelta
 
@@ -13,6 +14,16 @@ from ..serializers.video_serializers import (
     VideoFileSerializer, ClipSerializer, VideoAnnotationSerializer
 )
 from ..services.video_service import VideoService
+from ..services.video_cut_service import VideoCutService
+from ..services.presigned_url_service import PresignedUrlService
+
+
+def mp4_response(result, file_name: str) -> HttpResponse:
+    """Ответ с вырезанным фрагментом MP4; X-Cut-Start - начало фрагмента в секундах от начала файла"""
+    response = HttpResponse(result['data'], content_type='video/mp4')
+    response['Content-Disposition'] = f'inline; filename="{file_name}"'
+    response['X-Cut-Start'] = f"{result['start']:.3f}"
+    return response
 
 
 class VideoFileViewSet(viewsets.ModelViewSet):
@@ -26,7 +37,8 @@ class VideoFileViewSet(viewsets.ModelViewSet):
 
 
 class ClipViewSet(viewsets.ModelViewSet):
-    queryset = Clip.objects.all()
+    # Путь к файлу клипа нужен для подписанной ссылки
+    queryset = Clip.objects.select_related('video_file')
     serializer_class = ClipSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['video_file', 'is_annotated']
@@ -166,4 +178,29 @@ def ClipDownloadView(request, pk):
         result = VideoService.get_clip_download_info(pk)
         return Response(result)
     except ValueError as e:
-        return Response({'error': str(e)}, status=404)
\ No newline at end of file
+        return Response({'error': str(e)}, status=404)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ClipStreamView(request, pk):
+    """Видео клипа: только его фрагменты записи, прочитанные из MinIO по индексу ключевых кадров
+
+    Для файлов без индекса (клипы событий, старые записи) - перенаправление
+    на подписанную ссылку на файл с границами клипа во фрагменте URL.
+    """
+    try:
+        clip = Clip.objects.select_related('video_file').get(id=pk)
+    except Clip.DoesNotExist:
+        return Response({'error': 'Clip not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        result = VideoCutService.cut(clip.video_file, clip.start_offset, clip.end_offset)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+    if result is not None:
+        return mp4_response(result, f"clip_{clip.id}.mp4")
+
+    url = PresignedUrlService.get_url(clip.video_file.storage_path)
+    if not url:
+        return Response({'error': 'No video available for this clip'}, status=status.HTTP_404_NOT_FOUND)
+    return HttpResponseRedirect(f"{url}#t={clip.start_offset},{clip.end_offset}")
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.db.models import JSONField
 from django.forms import widgets
-from .models import Camera, Zone, Line
+from .models import Camera, Zone, Line, ZoneOccupancy
 
 
 class PrettyJSONWidget(widgets.Textarea):
@@ -39,10 +39,10 @@ class CameraAdmin(admin.ModelAdmin):
             'fields': ('name', 'location', 'vendor', 'status')
         }),
         ('Подключение', {
-            'fields': ('rtsp_url',)
+            'fields': ('rtsp_url', 'analysis_url')
         }),
         ('Настройки', {
-            'fields': ('stream_settings', 'snapshot'),
+            'fields': ('stream_settings', 'ground_calibration', 'snapshot', 'retention_days', 'retention_keep_events'),
             'classes': ('collapse',)
         }),
         ('Временные метки', {
@@ -109,4 +109,12 @@ class ZoneAdmin(admin.ModelAdmin):
     )
     formfield_overrides = {
         JSONField: {'widget': PrettyJSONWidget},
-    }
\ No newline at end of file
+    }
+
+
+@admin.register(ZoneOccupancy)
+class ZoneOccupancyAdmin(admin.ModelAdmin):
+    list_display = ['zone', 'camera', 'timestamp', 'max_count', 'avg_count']
+    list_filter = ['camera', 'zone']
+    date_hierarchy = 'timestamp'
+    readonly_fields = ['zone', 'camera', 'timestamp', 'max_count', 'avg_count', 'samples']
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cameras", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="camera",
+            name="ground_calibration",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Калибровка плоскости земли для измерения скорости: {'image_points': [{'x': 0, 'y': 0}, ...], 'world_points': [{'x': 0, 'y': 0}, ...]} (не менее 4 точек, метры) или {'homography': [[...], [...], [...]]}",
+            ),
+        ),
+    ]
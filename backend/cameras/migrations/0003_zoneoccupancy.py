@@ -0,0 +1,56 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cameras", "0002_camera_ground_calibration"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ZoneOccupancy",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("timestamp", models.DateTimeField(help_text="Начало интервала")),
+                ("max_count", models.PositiveIntegerField(default=0)),
+                ("avg_count", models.FloatField(default=0.0)),
+                (
+                    "samples",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Количество кадров в интервале"
+                    ),
+                ),
+                (
+                    "camera",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="zone_occupancy",
+                        to="cameras.camera",
+                    ),
+                ),
+                (
+                    "zone",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy",
+                        to="cameras.zone",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "cameras_zone_occupancy",
+                "indexes": [
+                    models.Index(
+                        fields=["zone", "timestamp"], name="cam_zone_occ_zone_ts_idx"
+                    ),
+                    models.Index(
+                        fields=["camera", "timestamp"], name="cam_zone_occ_cam_ts_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
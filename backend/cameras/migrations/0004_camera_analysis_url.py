@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cameras", "0003_zoneoccupancy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="camera",
+            name="analysis_url",
+            field=models.URLField(
+                blank=True,
+                help_text="Дополнительный поток низкого разрешения, который декодируется для детекции; основной поток (RTSP URL) только записывается. Пусто - анализируется основной поток",
+                max_length=500,
+                verbose_name="URL потока для анализа",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cameras", "0004_camera_analysis_url"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="camera",
+            name="retention_days",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Сколько дней хранить записи и клипы камеры (0 = хранить всегда)",
+                verbose_name="Срок хранения записей",
+            ),
+        ),
+        migrations.AddField(
+            model_name="camera",
+            name="retention_keep_events",
+            field=models.BooleanField(
+                default=True,
+                help_text="Не удалять клипы событий и сегменты записи, на которые приходятся события",
+                verbose_name="Хранить записи событий",
+            ),
+        ),
+    ]
@@ -15,6 +15,13 @@ class Camera(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255, verbose_name="Название")
     rtsp_url = models.URLField(max_length=500)
+    analysis_url = models.URLField(
+        max_length=500,
+        blank=True,
+        help_text="Дополнительный поток низкого разрешения, который декодируется для детекции; "
+                  "основной поток (RTSP URL) только записывается. Пусто - анализируется основной поток",
+        verbose_name="URL потока для анализа"
+    )
     location = models.CharField(max_length=500, blank=True, verbose_name="Местоположение")
     status = models.CharField(
         max_length=20,
@@ -30,6 +37,23 @@ class Camera(models.Model):
     snapshot = models.ImageField(upload_to='camera_snapshots/', blank=True, null=True, verbose_name="Снимок")
     vendor = models.CharField(max_length=100, blank=True, verbose_name="Производитель")
     stream_settings = models.JSONField(default=dict, blank=True, verbose_name="Настройки потока")
+    ground_calibration = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Калибровка плоскости земли для измерения скорости: {'image_points': [{'x': 0, 'y': 0}, ...], "
+                  "'world_points': [{'x': 0, 'y': 0}, ...]} (не менее 4 точек, метры) или {'homography': [[...], [...], [...]]}",
+        verbose_name="Калибровка плоскости земли"
+    )
+    retention_days = models.PositiveIntegerField(
+        default=0,
+        help_text="Сколько дней хранить записи и клипы камеры (0 = хранить всегда)",
+        verbose_name="Срок хранения записей"
+    )
+    retention_keep_events = models.BooleanField(
+        default=True,
+        help_text="Не удалять клипы событий и сегменты записи, на которые приходятся события",
+        verbose_name="Хранить записи событий"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
@@ -184,4 +208,31 @@ class Line(models.Model):
         for choice_key, choice_value in DIRECTION_CHOICES:
             if choice_key == self.direction:
                 return choice_value
-        return self.direction
\ No newline at end of file
+        return self.direction
+
+
+class ZoneOccupancy(models.Model):
+    """
+    Заполненность зоны за интервал времени (записывается анализатором пакетами)
+    """
+    verbose_name = "Заполненность зоны"
+    verbose_name_plural = "Заполненность зон"
+    id = models.BigAutoField(primary_key=True)
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='occupancy', verbose_name="Зона")
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name='zone_occupancy', verbose_name="Камера")
+    timestamp = models.DateTimeField(help_text="Начало интервала", verbose_name="Время")
+    max_count = models.PositiveIntegerField(default=0, verbose_name="Максимум объектов")
+    avg_count = models.FloatField(default=0.0, verbose_name="Среднее количество объектов")
+    samples = models.PositiveIntegerField(default=0, help_text="Количество кадров в интервале", verbose_name="Кадров")
+    
+    class Meta:
+        db_table = 'cameras_zone_occupancy'
+        verbose_name = "Заполненность зоны"
+        verbose_name_plural = "Заполненность зон"
+        indexes = [
+            models.Index(fields=['zone', 'timestamp'], name='cam_zone_occ_zone_ts_idx'),
+            models.Index(fields=['camera', 'timestamp'], name='cam_zone_occ_cam_ts_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.zone.name} - {self.timestamp}: {self.max_count}"
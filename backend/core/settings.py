@@ -188,6 +188,12 @@ CELERY_TIMEZONE = 'UTC'
 # Конфигурация Kafka
 KAFKA_BOOTSTRAP_SERVERS = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092').split(',')
 KAFKA_TOPIC_PREFIX = os.getenv('KAFKA_TOPIC_PREFIX', 'insightcore')
+KAFKA_EVENTS_TOPIC = os.getenv('KAFKA_EVENTS_TOPIC', f'{KAFKA_TOPIC_PREFIX}-events')
+# Прием событий анализатора (manage.py ingest_events): группа потребителей, размер пачки
+# и размер, начиная с которого пачка пишется через COPY
+EVENT_INGEST_GROUP = os.getenv('EVENT_INGEST_GROUP', f'{KAFKA_TOPIC_PREFIX}-event-ingest')
+EVENT_INGEST_BATCH_SIZE = int(os.getenv('EVENT_INGEST_BATCH_SIZE', 500))
+EVENT_INGEST_COPY_THRESHOLD = int(os.getenv('EVENT_INGEST_COPY_THRESHOLD', 2000))
 
 
 # Конфигурация MinIO
@@ -196,6 +202,37 @@ MINIO_ACCESS_KEY = os.getenv('MINIO_ACCESS_KEY', 'minioadmin')
 MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY', 'minioadmin')
 MINIO_SECURE = os.getenv('MINIO_SECURE', 'False').lower() == 'true'
 MINIO_BUCKET_NAME = os.getenv('MINIO_BUCKET_NAME', 'insightcore-videos')
+# Адрес MinIO, доступный браузеру: на него подписываются ссылки на видео
+MINIO_PUBLIC_ENDPOINT = os.getenv('MINIO_PUBLIC_ENDPOINT', MINIO_ENDPOINT)
+MINIO_PUBLIC_SECURE = os.getenv('MINIO_PUBLIC_SECURE', str(MINIO_SECURE)).lower() == 'true'
+MINIO_REGION = os.getenv('MINIO_REGION', 'us-east-1')
+# Срок действия подписанных ссылок и запас, за который они подписываются заново, с
+PRESIGNED_URL_EXPIRES = int(os.getenv('PRESIGNED_URL_EXPIRES', 6 * 3600))
+PRESIGNED_URL_REFRESH_MARGIN = int(os.getenv('PRESIGNED_URL_REFRESH_MARGIN', 15 * 60))
+
+# Удаление старых записей (manage.py sweep_retention): файлов за одну транзакцию и пауза между обходами, с
+RETENTION_CHUNK_SIZE = int(os.getenv('RETENTION_CHUNK_SIZE', 500))
+RETENTION_SWEEP_INTERVAL = int(os.getenv('RETENTION_SWEEP_INTERVAL', 3600))
+
+# Вырезка фрагментов записи по индексу ключевых кадров: срок кэширования индексов
+# и наибольшая длительность фрагмента, с
+KEYFRAME_INDEX_CACHE_TIMEOUT = int(os.getenv('KEYFRAME_INDEX_CACHE_TIMEOUT', 24 * 3600))
+VIDEO_CUT_MAX_DURATION = float(os.getenv('VIDEO_CUT_MAX_DURATION', 600))
+
+# Превью (manage.py generate_previews): процессов декодирования, потоков сохранения, объектов за проход,
+# ширина миниатюр и снимков камер, интервал между кадрами спрайта (с), ширина кадра и колонок спрайта
+PREVIEW_WORKERS = int(os.getenv('PREVIEW_WORKERS', os.cpu_count() or 1))
+PREVIEW_UPLOAD_WORKERS = int(os.getenv('PREVIEW_UPLOAD_WORKERS', 8))
+PREVIEW_BATCH_SIZE = int(os.getenv('PREVIEW_BATCH_SIZE', 100))
+PREVIEW_THUMBNAIL_WIDTH = int(os.getenv('PREVIEW_THUMBNAIL_WIDTH', 320))
+PREVIEW_SPRITE_INTERVAL = float(os.getenv('PREVIEW_SPRITE_INTERVAL', 5))
+PREVIEW_SPRITE_TILE_WIDTH = int(os.getenv('PREVIEW_SPRITE_TILE_WIDTH', 160))
+PREVIEW_SPRITE_COLUMNS = int(os.getenv('PREVIEW_SPRITE_COLUMNS', 10))
+
+
+# Конфигурация HTTP API анализатора (бэктестинг правил)
+ANALYZER_API_URL = os.getenv('ANALYZER_API_URL', 'http://localhost:8001')
+ANALYZER_API_TIMEOUT = int(os.getenv('ANALYZER_API_TIMEOUT', 60))
 
 
 # Аутентификация JWT
@@ -36,10 +36,10 @@ class RuleAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     fieldsets = (
         ('Основная информация', {
-            'fields': ('name', 'camera', 'rule_type', 'enabled')
+            'fields': ('name', 'camera', 'rule_type', 'enabled', 'disabled_reason')
         }),
         ('Условия', {
-            'fields': ('conditions',)
+            'fields': ('conditions', 'schedule')
         }),
         ('Серьезность', {
             'fields': ('severity',)
@@ -0,0 +1,84 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from kafka import KafkaConsumer
+from api.services.event_ingest_service import EventIngestService
+from events.wire_format import decode_message, WireFormatError
+
+
+def _decode(data):
+    # Некорректное сообщение не должно останавливать прием остальных
+    try:
+        return decode_message(data)
+    except WireFormatError as e:
+        print(f"Не удалось декодировать событие: {e}")
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Read analyzer events from Kafka and write them to the Event table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.EVENT_INGEST_BATCH_SIZE,
+                            help='Maximum number of events per transaction')
+        parser.add_argument('--poll-timeout', type=int, default=1000,
+                            help='How long to wait for a batch to fill up, ms')
+        parser.add_argument('--group', default=settings.EVENT_INGEST_GROUP,
+                            help='Kafka consumer group')
+        parser.add_argument('--retry-delay', type=float, default=5.0,
+                            help='Pause before retrying a failed write, s')
+
+    def handle(self, *args, **options):
+        consumer = KafkaConsumer(
+            settings.KAFKA_EVENTS_TOPIC,
+            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+            group_id=options['group'],
+            enable_auto_commit=False,
+            auto_offset_reset='earliest',
+            max_poll_records=options['batch_size'],
+            value_deserializer=_decode
+        )
+        self.stdout.write(f"Ingesting events from {settings.KAFKA_EVENTS_TOPIC} as group {options['group']}")
+
+        try:
+            while True:
+                batches = consumer.poll(timeout_ms=options['poll_timeout'], max_records=options['batch_size'])
+                if not batches:
+                    continue
+                records = [
+                    (message.topic, message.partition, message.offset, message.value)
+                    for messages in batches.values() for message in messages
+                    if message.value is not None
+                ]
+
+                started = time.perf_counter()
+                close_old_connections()
+                try:
+                    # Event clips and recorded segments share the topic with the events
+                    kinds = {'clip': [], 'video_file': [], None: []}
+                    for record in records:
+                        kinds.get(record[3].get('type'), kinds[None]).append(record)
+                    events, skipped = EventIngestService.build_events(kinds[None])
+                    clips = EventIngestService.build_clips(kinds['clip'])
+                    video_files = EventIngestService.build_video_files(kinds['video_file'])
+                    written = EventIngestService.write_events(events, clips=clips, video_files=video_files)
+                except DatabaseError as e:
+                    # Offsets stay uncommitted: rewind and read the same batch again
+                    self.stderr.write(f"Error writing {len(records)} events, retrying: {e}")
+                    for partition, messages in batches.items():
+                        consumer.seek(partition, messages[0].offset)
+                    time.sleep(options['retry_delay'])
+                    continue
+
+                # Offsets are committed only once the rows are durable
+                consumer.commit()
+                self.stdout.write(
+                    f"Wrote {written} events ({skipped} skipped), {len(clips)} clips "
+                    f"and {len(video_files)} recorded segments "
+                    f"in {time.perf_counter() - started:.3f}s"
+                )
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping event ingestion')
+        finally:
+            consumer.close(autocommit=False)
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rule",
+            name="schedule",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Расписание активности правила: {'timezone': 'Europe/Moscow', 'windows': [{'days': [0, 1, 2, 3, 4], 'start': '22:00', 'end': '06:00'}]} (дни 0 - понедельник ... 6 - воскресенье; окно с концом раньше начала переходит через полночь). Пустое - правило активно всегда",
+                verbose_name="Расписание",
+            ),
+        ),
+    ]
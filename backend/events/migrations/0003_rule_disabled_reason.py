@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0002_rule_schedule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rule",
+            name="disabled_reason",
+            field=models.TextField(
+                blank=True,
+                help_text="Заполняется анализатором при автоматическом отключении правила",
+                verbose_name="Причина отключения",
+            ),
+        ),
+    ]
@@ -35,6 +35,14 @@ class Rule(models.Model):
     zone = models.ForeignKey('cameras.Zone', on_delete=models.SET_NULL, null=True, blank=True, related_name='events_rules', verbose_name="Зона")
     line = models.ForeignKey('cameras.Line', on_delete=models.SET_NULL, null=True, blank=True, related_name='events_rules', verbose_name="Линия")
     conditions = models.JSONField(default=dict, help_text="Условия срабатывания правила", verbose_name="Условия")
+    schedule = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Расписание активности правила: {'timezone': 'Europe/Moscow', 'windows': [{'days': [0, 1, 2, 3, 4], "
+                  "'start': '22:00', 'end': '06:00'}]} (дни 0 - понедельник ... 6 - воскресенье; окно с концом раньше "
+                  "начала переходит через полночь). Пустое - правило активно всегда",
+        verbose_name="Расписание"
+    )
     severity = models.CharField(
         max_length=20,
         choices=[
@@ -47,6 +55,11 @@ class Rule(models.Model):
         verbose_name="Уровень серьезности"
     )
     enabled = models.BooleanField(default=True, verbose_name="Активно")
+    disabled_reason = models.TextField(
+        blank=True,
+        help_text="Заполняется анализатором при автоматическом отключении правила",
+        verbose_name="Причина отключения"
+    )
     description = models.TextField(blank=True, verbose_name="Описание")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
@@ -64,6 +77,15 @@ class Rule(models.Model):
     def __str__(self):
         return f"{self.name} - {self.camera.name}"
     
+    def save(self, *args, **kwargs):
+        # Включенное снова правило больше не отключено анализатором
+        if self.enabled and self.disabled_reason:
+            self.disabled_reason = ''
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'disabled_reason' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['disabled_reason']
+        super().save(*args, **kwargs)
+    
     def get_rule_type_display(self):
         RULE_TYPE_CHOICES = [
             ('line_crossing', 'Пересечение линии'),
@@ -0,0 +1,177 @@
+"""
+Декодирование сообщений анализатора из Kafka.
+
+Анализатор публикует события и состояния треков в бинарном формате
+(analyzer/services/wire_format.py): заголовок из 4 байт (b'IC', версия
+схемы, тип сообщения), числовые поля в фиксированной раскладке struct
+(little-endian), UUID в виде 16 байт, время в микросекундах. Раскладки
+здесь должны совпадать с анализатором; JSON-сообщения тоже принимаются.
+"""
+from datetime import datetime, timedelta, timezone
+import json
+import struct
+import uuid
+import numpy as np
+
+
+MAGIC = b'IC'
+VERSION = 1
+
+EVENT = 1
+TRACK_STATE = 2
+TRACK_STATE_END = 3
+
+HEADER = struct.Struct('<2sBB')
+EVENT_FIXED = struct.Struct('<qhq4ffBBB')
+TRACK_STATE_FIXED = struct.Struct('<qhIH')
+TRACK_ROW = np.dtype([('track_id', '<i8'), ('class_index', '<u2'), ('confidence', '<f4'), ('bbox', '<f4', (4,))])
+STATIC_ROW = np.dtype([('object_id', '<i8'), ('bbox', '<f4', (4,)), ('first_seen', '<i8'), ('score', '<f4'),
+                       ('owner_track_id', '<i8'), ('owner_class_index', '<i2')])
+
+SEVERITIES = ['low', 'medium', 'high', 'critical']
+RULE_TYPES = ['line_crossing', 'zone_violation', 'behavior_detection', 'loitering', 'object_left_behind',
+              'speed_detection', 'counting', 'custom']
+UNKNOWN = 255
+NAIVE = -32768
+NO_TRACK = 1
+TAG_NONE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_TRUE, TAG_FALSE = range(6)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class WireFormatError(ValueError):
+    """Сообщение не удалось декодировать"""
+
+
+def _unpack_time(micros, offset):
+    moment = EPOCH + timedelta(microseconds=micros)
+    if offset == NAIVE:
+        return moment.replace(tzinfo=None)
+    return moment.astimezone(timezone(timedelta(minutes=offset)))
+
+
+def _unpack_str(data, offset):
+    (length,) = struct.unpack_from('<H', data, offset)
+    offset += 2
+    return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+def _unpack_id(data, offset):
+    if data[offset] == 1:
+        return str(uuid.UUID(bytes=bytes(data[offset + 1:offset + 17]))), offset + 17
+    return _unpack_str(data, offset + 1)
+
+
+def _unpack_value(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == TAG_NONE:
+        return None, offset
+    if tag in (TAG_TRUE, TAG_FALSE):
+        return tag == TAG_TRUE, offset
+    if tag == TAG_INT:
+        return struct.unpack_from('<q', data, offset)[0], offset + 8
+    if tag == TAG_FLOAT:
+        return struct.unpack_from('<d', data, offset)[0], offset + 8
+    return _unpack_str(data, offset)
+
+
+def decode_event(data):
+    """
+    Событие правила: словарь с теми же ключами, что и JSON-событие анализатора
+    """
+    offset = HEADER.size
+    micros, utc_offset, track_id, x1, y1, x2, y2, confidence, severity, rule_type, flags = \
+        EVENT_FIXED.unpack_from(data, offset)
+    offset += EVENT_FIXED.size
+    rule_id, offset = _unpack_id(data, offset)
+    camera_id, offset = _unpack_id(data, offset)
+    object_class, offset = _unpack_str(data, offset)
+    message, offset = _unpack_str(data, offset)
+    event = {
+        'rule_id': rule_id,
+        'camera_id': camera_id,
+        'timestamp': _unpack_time(micros, utc_offset).isoformat(),
+        'object_class': object_class,
+        'track_id': None if flags & NO_TRACK else track_id,
+        'bbox': [round(x1, 2), round(y1, 2), round(x2, 2), round(y2, 2)],
+        'confidence': round(confidence, 4),
+        'severity': SEVERITIES[severity] if severity != UNKNOWN else None,
+        'rule_type': RULE_TYPES[rule_type] if rule_type != UNKNOWN else None,
+        'message': message,
+    }
+    count = data[offset]
+    offset += 1
+    for _ in range(count):
+        key, offset = _unpack_str(data, offset)
+        event[key], offset = _unpack_value(data, offset)
+    return event
+
+
+def decode_track_state(data):
+    """
+    Состояние треков кадра: {'type': 'frame', 'camera_id', 'time', 'tracks': [[id, класс, уверенность, x1, y1, x2, y2], ...]}
+    или {'type': 'end', 'camera_id'} в конце потока
+    """
+    offset = HEADER.size
+    if data[3] == TRACK_STATE_END:
+        camera_id, _ = _unpack_id(data, offset)
+        return {'type': 'end', 'camera_id': camera_id}
+
+    micros, utc_offset, track_count, static_count = TRACK_STATE_FIXED.unpack_from(data, offset)
+    offset += TRACK_STATE_FIXED.size
+    camera_id, offset = _unpack_id(data, offset)
+    class_count = data[offset]
+    offset += 1
+    class_names = []
+    for _ in range(class_count):
+        name, offset = _unpack_str(data, offset)
+        class_names.append(name)
+
+    track_rows = np.frombuffer(data, dtype=TRACK_ROW, count=track_count, offset=offset)
+    offset += track_rows.nbytes
+    state = {
+        'type': 'frame',
+        'camera_id': camera_id,
+        'time': _unpack_time(micros, utc_offset).isoformat(),
+        'tracks': [
+            [track_id, class_names[class_index], confidence, *bbox]
+            for track_id, class_index, confidence, bbox in zip(
+                track_rows['track_id'].tolist(), track_rows['class_index'].tolist(),
+                np.round(track_rows['confidence'].astype(np.float64), 3).tolist(),
+                np.round(track_rows['bbox'].astype(np.float64), 1).tolist()
+            )
+        ]
+    }
+    if static_count != 0xFFFF:
+        static_rows = np.frombuffer(data, dtype=STATIC_ROW, count=static_count, offset=offset)
+        state['static_objects'] = [
+            [object_id, *bbox, _unpack_time(first_seen, utc_offset).isoformat(), score,
+             None if owner_track_id < 0 else owner_track_id,
+             None if owner_class_index < 0 else class_names[owner_class_index]]
+            for object_id, bbox, first_seen, score, owner_track_id, owner_class_index in zip(
+                static_rows['object_id'].tolist(), np.round(static_rows['bbox'].astype(np.float64), 1).tolist(),
+                static_rows['first_seen'].tolist(), np.round(static_rows['score'].astype(np.float64), 3).tolist(),
+                static_rows['owner_track_id'].tolist(), static_rows['owner_class_index'].tolist()
+            )
+        ]
+    return state
+
+
+def decode_message(data):
+    """
+    Декодировать сообщение Kafka анализатора (бинарное или JSON)
+    """
+    try:
+        if data[:2] != MAGIC:
+            return json.loads(bytes(data).decode('utf-8'))
+        if data[2] != VERSION:
+            raise WireFormatError(f"Неподдерживаемая версия формата {data[2]}")
+        if data[3] == EVENT:
+            return decode_event(data)
+        if data[3] in (TRACK_STATE, TRACK_STATE_END):
+            return decode_track_state(data)
+    except (struct.error, UnicodeDecodeError, IndexError, ValueError) as e:
+        if isinstance(e, WireFormatError):
+            raise
+        raise WireFormatError(f"Некорректное сообщение: {e}") from e
+    raise WireFormatError(f"Неизвестный тип сообщения {data[3]}")
@@ -0,0 +1,47 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from api.services.preview_service import PreviewService
+
+
+class Command(BaseCommand):
+    help = 'Generate clip thumbnails, camera snapshots and recording scrub sprites from keyframes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PREVIEW_BATCH_SIZE,
+                            help='Clips and recordings rendered per pass')
+        parser.add_argument('--workers', type=int, default=settings.PREVIEW_WORKERS,
+                            help='Decoding processes')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Once done, look for new clips and recordings every INTERVAL seconds; 0 exits')
+
+    def handle(self, *args, **options):
+        pool = PreviewService.create_pool(options['workers'])
+        # Previews that failed are not retried by this process
+        failed = set()
+        try:
+            while True:
+                started = time.perf_counter()
+                close_old_connections()
+                try:
+                    result = PreviewService.generate(pool, options['batch_size'], failed)
+                except DatabaseError as e:
+                    self.stderr.write(f"Preview generation failed: {e}")
+                    result = None
+                else:
+                    self.stdout.write(
+                        f"Generated {result['thumbnails']} thumbnails, {result['sprites']} sprites "
+                        f"and {result['snapshots']} snapshots, {result['failed']} failed, "
+                        f"in {time.perf_counter() - started:.1f}s"
+                    )
+                # Until a pass finds nothing left to render, the next one starts right away
+                if result is not None and any(result.values()):
+                    continue
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping preview generation')
+        finally:
+            pool.shutdown(cancel_futures=True)
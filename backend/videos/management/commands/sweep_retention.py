@@ -0,0 +1,38 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from api.services.retention_service import RetentionService
+
+
+class Command(BaseCommand):
+    help = 'Delete recordings and clips older than their camera\'s retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.RETENTION_CHUNK_SIZE,
+                            help='Video files deleted per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Sweep again every INTERVAL seconds; 0 sweeps once')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                started = time.perf_counter()
+                close_old_connections()
+                try:
+                    result = RetentionService.sweep(options['chunk_size'], options['dry_run'])
+                except DatabaseError as e:
+                    self.stderr.write(f"Retention sweep failed: {e}")
+                else:
+                    action = 'Would delete' if options['dry_run'] else 'Deleted'
+                    self.stdout.write(
+                        f"{action} {result['files']} video files ({result['bytes'] / 1e9:.2f} GB), "
+                        f"{result['failed']} failed, in {time.perf_counter() - started:.1f}s"
+                    )
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping retention sweeps')
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videofile",
+            name="index_path",
+            field=models.CharField(
+                blank=True,
+                help_text="Путь к индексу ключевых кадров в MinIO (пусто, если индекса нет)",
+                max_length=500,
+                verbose_name="Индекс ключевых кадров",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0002_videofile_index_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="videofile",
+            name="sprite",
+            field=models.ImageField(
+                blank=True,
+                help_text="Сетка кадров для превью при перемотке",
+                null=True,
+                upload_to="video_sprites/",
+                verbose_name="Спрайт превью",
+            ),
+        ),
+        migrations.AddField(
+            model_name="videofile",
+            name="sprite_info",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Интервал между кадрами спрайта, число колонок и строк, размер кадра",
+                verbose_name="Параметры спрайта",
+            ),
+        ),
+    ]
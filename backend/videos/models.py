@@ -19,9 +19,12 @@ class VideoFile(models.Model):
     end_time = models.DateTimeField(verbose_name="Время окончания")
     duration = models.FloatField(help_text="Длительность в секундах", verbose_name="Длительность")
     storage_path = models.CharField(max_length=500, help_text="Путь к файлу в MinIO", verbose_name="Путь к файлу")
+    index_path = models.CharField(max_length=500, blank=True, help_text="Путь к индексу ключевых кадров в MinIO (пусто, если индекса нет)", verbose_name="Индекс ключевых кадров")
     file_size = models.BigIntegerField(help_text="Размер файла в байтах", verbose_name="Размер файла")
     fps = models.FloatField(help_text="Кадры в секунду", verbose_name="Кадры в секунду")
     resolution = models.CharField(max_length=20, help_text="Разрешение (например, 1920x1080)", verbose_name="Разрешение")
+    sprite = models.ImageField(upload_to='video_sprites/', blank=True, null=True, help_text="Сетка кадров для превью при перемотке", verbose_name="Спрайт превью")
+    sprite_info = models.JSONField(default=dict, blank=True, help_text="Интервал между кадрами спрайта, число колонок и строк, размер кадра", verbose_name="Параметры спрайта")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     